@@ -6,18 +6,21 @@ load_dotenv()
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-DATA_DIR = BASE_DIR / "data"
+DATA_DIR = Path(os.getenv("DATA_DIR", str(BASE_DIR / "data")))
 RAW_DIR = DATA_DIR / "raw"
 PROCESSED_DIR = DATA_DIR / "processed"
 INDEX_DIR = DATA_DIR / "index"
+MODEL_CACHE_DIR = DATA_DIR / "models"
 
 
 RAW_DIR.mkdir(parents=True, exist_ok=True)
 PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
 INDEX_DIR.mkdir(parents=True, exist_ok=True)
+MODEL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "")  # Override to point at a local fake server
 LLM_MODEL = os.getenv("LLM_MODEL", "llama3-8b-8192")
 RERANKING_MODEL = os.getenv("RERANKING_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "512"))
@@ -27,3 +30,101 @@ RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "3"))
 CONTEXT_MAX_LENGTH = int(os.getenv("CONTEXT_MAX_LENGTH", "4000"))
 CONTEXT_COMPRESSION_RATIO = float(os.getenv("CONTEXT_COMPRESSION_RATIO", "0.7"))
 
+# Vector storage: float32 | float16 | int8 | binary
+VECTOR_STORAGE = os.getenv("VECTOR_STORAGE", "float32")
+VECTOR_RESCORE = os.getenv("VECTOR_RESCORE", "true").lower() == "true"
+RESCORE_FACTOR = int(os.getenv("RESCORE_FACTOR", "4"))
+
+# Inference backend for the embedder and reranker: torch | onnx | onnx-int8
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+INFERENCE_INTRA_OP_THREADS = int(os.getenv("INFERENCE_INTRA_OP_THREADS", "0"))  # 0 = library default
+INFERENCE_INTER_OP_THREADS = int(os.getenv("INFERENCE_INTER_OP_THREADS", "0"))
+ONNX_QUANTIZATION_CONFIG = os.getenv("ONNX_QUANTIZATION_CONFIG", "avx512_vnni")  # arm64 | avx2 | avx512 | avx512_vnni
+
+# In-process latency metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "1024"))  # Samples kept per stage
+
+# LLM call resilience
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))  # Default deadline (s) when an agent sets none
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.25"))
+LLM_HEDGING = os.getenv("LLM_HEDGING", "false").lower() == "true"
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))  # Used until enough p95 data exists
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_LATENCY_P95 = float(os.getenv("BREAKER_LATENCY_P95", "10"))  # Seconds
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "30"))
+
+# Query routing: rules | centroid | hybrid (rules first, centroid when no domain keyword matches)
+ROUTER_MODE = os.getenv("ROUTER_MODE", "rules")
+ROUTER_CENTROID_MARGIN = float(os.getenv("ROUTER_CENTROID_MARGIN", "0.05"))
+
+# Adaptive retrieval depth and reranker skipping
+ADAPTIVE_RETRIEVAL = os.getenv("ADAPTIVE_RETRIEVAL", "false").lower() == "true"
+ADAPTIVE_MIN_CANDIDATES = int(os.getenv("ADAPTIVE_MIN_CANDIDATES", "10"))
+ADAPTIVE_MAX_CANDIDATES = int(os.getenv("ADAPTIVE_MAX_CANDIDATES", "50"))
+ADAPTIVE_AGREEMENT = float(os.getenv("ADAPTIVE_AGREEMENT", "0.6"))  # BM25/vector top-k overlap to skip reranking
+ADAPTIVE_AMBIGUOUS_AGREEMENT = float(os.getenv("ADAPTIVE_AMBIGUOUS_AGREEMENT", "0.2"))  # Below this, widen
+ADAPTIVE_SKIP_MARGIN = float(os.getenv("ADAPTIVE_SKIP_MARGIN", "0.15"))  # Fused score gap after the k-th result
+ADAPTIVE_SCORE_BAND = float(os.getenv("ADAPTIVE_SCORE_BAND", "0.2"))  # Fused score band treated as competitive
+
+# Cascade reranking: a cheap first stage prunes candidates before the full cross-encoder
+RERANK_CASCADE = os.getenv("RERANK_CASCADE", "false").lower() == "true"
+RERANK_FIRST_STAGE = os.getenv("RERANK_FIRST_STAGE", "embedding")  # "embedding" or a small cross-encoder model
+RERANK_FIRST_STAGE_KEEP = int(os.getenv("RERANK_FIRST_STAGE_KEEP", "8"))  # Survivors sent to RERANKING_MODEL
+
+# Tool-calling agent
+TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", "4"))
+TOOL_RESULT_MAX_TOKENS = int(os.getenv("TOOL_RESULT_MAX_TOKENS", "800"))
+AGENT_HISTORY_MAX_TOKENS = int(os.getenv("AGENT_HISTORY_MAX_TOKENS", "3000"))
+AGENT_HISTORY_KEEP_RECENT = int(os.getenv("AGENT_HISTORY_KEEP_RECENT", "1"))  # Tool rounds never compacted
+AGENT_SNIPPET_TOKENS = int(os.getenv("AGENT_SNIPPET_TOKENS", "60"))  # Size of a compacted tool result
+
+# Health checks
+READINESS_CACHE_TTL = float(os.getenv("READINESS_CACHE_TTL", "5"))  # Seconds
+DATA_STATS_TTL = float(os.getenv("DATA_STATS_TTL", "60"))  # Seconds between data directory scans
+
+# Multi-process serving: search/answer run in N worker processes sharing a read-only mmap'd index
+SERVING_WORKERS = int(os.getenv("SERVING_WORKERS", "0"))  # 0 serves everything in the MCP process
+INDEX_KEEP_VERSIONS = int(os.getenv("INDEX_KEEP_VERSIONS", "2"))  # Published index versions kept on disk
+
+# Asynchronous ingest: documents from many calls are embedded and committed together
+INGEST_FLUSH_WINDOW = float(os.getenv("INGEST_FLUSH_WINDOW", "0.5"))  # Seconds to gather jobs after the first
+INGEST_MAX_BATCH_CHUNKS = int(os.getenv("INGEST_MAX_BATCH_CHUNKS", "4096"))
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "1000"))  # Finished jobs kept for ingest_status
+
+# Dynamic micro-batching of concurrent model calls
+EMBED_BATCHING = os.getenv("EMBED_BATCHING", "true").lower() == "true"
+EMBED_BATCH_MAX = int(os.getenv("EMBED_BATCH_MAX", "32"))  # Queries per forward pass
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "2"))
+RERANK_BATCHING = os.getenv("RERANK_BATCHING", "false").lower() == "true"
+RERANK_BATCH_MAX = int(os.getenv("RERANK_BATCH_MAX", "8"))  # Rerank requests merged per predict call
+RERANK_BATCH_WINDOW_MS = float(os.getenv("RERANK_BATCH_WINDOW_MS", "5"))
+
+# Small-to-big retrieval: index small child chunks, answer from their parent sections
+SMALL_TO_BIG = os.getenv("SMALL_TO_BIG", "false").lower() == "true"
+CHILD_CHUNK_SIZE = int(os.getenv("CHILD_CHUNK_SIZE", "128"))  # Words per indexed child; parents use CHUNK_SIZE
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))  # Estimated tokens of expanded context
+
+# Model residency: keep models within a memory budget and unload idle ones until next use
+MODEL_MEMORY_BUDGET_MB = float(os.getenv("MODEL_MEMORY_BUDGET_MB", "0"))  # 0 = unlimited
+MODEL_IDLE_UNLOAD_SECONDS = float(os.getenv("MODEL_IDLE_UNLOAD_SECONDS", "0"))  # 0 = never unload
+MODEL_PINNED = os.getenv("MODEL_PINNED", "embedder")  # Comma-separated components never unloaded
+
+# Named collections: each has its own index under INDEX_DIR/collections/<name>
+COLLECTION_MEMORY_BUDGET_MB = float(os.getenv("COLLECTION_MEMORY_BUDGET_MB", "0"))  # 0 = keep all loaded
+
+# Latency-budget-aware LLM selection
+LLM_MODEL_LADDER = os.getenv("LLM_MODEL_LADDER", "llama3-70b-8192,llama3-8b-8192")  # Largest first
+LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", "50"))  # Recent calls per model used for estimates
+LLM_PRIOR_TOKENS_PER_SECOND = float(os.getenv("LLM_PRIOR_TOKENS_PER_SECOND", "150"))  # Until measured
+LLM_PRIOR_OVERHEAD = float(os.getenv("LLM_PRIOR_OVERHEAD", "0.5"))  # Seconds before the first token, until measured
+LLM_MIN_ANSWER_TOKENS = int(os.getenv("LLM_MIN_ANSWER_TOKENS", "128"))  # A model must fit this many in the budget
+LLM_LATENCY_SAFETY = float(os.getenv("LLM_LATENCY_SAFETY", "1.2"))  # Multiplier on predicted latency
+
+# Pipelined answer path: stages run concurrently on a shared thread pool
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "16"))
+LLM_PREWARM = os.getenv("LLM_PREWARM", "true").lower() == "true"  # Open the LLM connection during retrieval
+LLM_PREWARM_IDLE_SECONDS = float(os.getenv("LLM_PREWARM_IDLE_SECONDS", "4"))  # Below the client's keep-alive expiry
+LLM_PREWARM_TIMEOUT = float(os.getenv("LLM_PREWARM_TIMEOUT", "1"))
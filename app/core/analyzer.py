@@ -0,0 +1,113 @@
+import re
+import sys
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+
+# Id 0 never names a term: it separates sentences inside a chunk's token array
+SENTENCE_BREAK = 0
+# Bumped whenever tokenization or stemming changes, so stored token arrays are re-analyzed
+ANALYZER_VERSION = 2
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+SENTENCE_PATTERN = re.compile(r"[.!?]+")
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have
+having he her here hers herself him himself his how i if in into is it its itself just me more most
+my myself no nor not now of off on once only or other our ours ourselves out over own same she
+should so some such than that the their theirs them themselves then there these they this those
+through to too under until up very was we were what when where which while who whom why will with
+would you your yours yourself yourselves
+""".split())
+
+@lru_cache(maxsize=65536)
+def stem(term: str) -> str:
+    """Light suffix stripping: plurals, then -ing/-ed when a reasonable stem remains.
+
+    A final silent "e" is dropped too, so "cache", "caches", "cached" and
+    "caching" all reduce to "cach".
+    """
+    if len(term) <= 3 or not term.isalpha():
+        return term
+    if term.endswith("ies") and not term.endswith(("eies", "aies")):
+        term = term[:-3] + "y"
+    elif term.endswith("zzes"):
+        term = term[:-3]
+    elif term.endswith(("ses", "xes", "zes", "ches", "shes")):
+        # "processes" -> "process", "indexes" -> "index", "matches" -> "match"
+        term = term[:-2]
+    elif term.endswith("s") and not term.endswith(("us", "ss")):
+        term = term[:-1]
+
+    for suffix in ("ing", "ed"):
+        if term.endswith(suffix) and len(term) - len(suffix) >= 4:
+            term = term[:-len(suffix)]
+            # "embedding" -> "embedd" -> "embed"
+            if term[-1] == term[-2] and term[-1] not in "lsz":
+                term = term[:-1]
+            break
+    else:
+        if term.endswith("e") and not term.endswith("ee") and len(term) >= 4:
+            term = term[:-1]
+    return term
+
+class Vocabulary:
+    """Interned term <-> integer id mapping; ids are append-only and stable."""
+
+    def __init__(self, terms: Iterable[str] = ()):
+        self.terms: List[str] = ["<s>"]
+        self.ids: Dict[str, int] = {}
+        for term in terms:
+            self.add(term)
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def add(self, term: str) -> int:
+        term_id = self.ids.get(term)
+        if term_id is None:
+            term_id = len(self.terms)
+            term = sys.intern(term)
+            self.terms.append(term)
+            self.ids[term] = term_id
+        return term_id
+
+    def get(self, term: str) -> Optional[int]:
+        return self.ids.get(term)
+
+class Analyzer:
+    """The one tokenizer shared by BM25, compression and ingest.
+
+    Text is lowercased, split on a compiled word pattern, stripped of
+    stopwords and lightly stemmed. Stored chunks are encoded once at ingest
+    into uint32 term ids, with SENTENCE_BREAK between sentences, so query-time
+    code works on integer arrays instead of re-tokenizing stored text.
+    """
+
+    def terms(self, text: str) -> List[str]:
+        return [stem(token) for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+    def sentences(self, text: str) -> List[str]:
+        return [s.strip() for s in SENTENCE_PATTERN.split(text) if s.strip()]
+
+    def encode(self, text: str, vocabulary: Vocabulary, grow: bool = True) -> np.ndarray:
+        """Term ids of every sentence, separated by SENTENCE_BREAK; unknown terms are dropped unless grow."""
+        ids: List[int] = []
+        for i, sentence in enumerate(self.sentences(text)):
+            if i:
+                ids.append(SENTENCE_BREAK)
+            for term in self.terms(sentence):
+                term_id = vocabulary.add(term) if grow else vocabulary.get(term)
+                if term_id is not None:
+                    ids.append(term_id)
+        return np.asarray(ids, dtype="uint32")
+
+    def query_ids(self, text: str, vocabulary: Vocabulary) -> np.ndarray:
+        """Ids of the query terms the corpus knows, duplicates kept; never grows the vocabulary."""
+        ids = [vocabulary.get(term) for term in self.terms(text)]
+        return np.asarray([i for i in ids if i is not None], dtype="uint32")
+
+# Shared analyzer
+analyzer = Analyzer()
@@ -0,0 +1,166 @@
+import argparse
+import json
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from app.config import VECTOR_RESCORE, RESCORE_FACTOR
+from app.core import quantization
+from app.core.collection import DEFAULT_COLLECTION, collection_dir, validate_name
+from app.core.vector_store import MANIFEST_FILE, current_version_dir, load_full_vectors
+from app.utils.lazy import lazy_import
+from app.utils.ytils import load_json_file, write_json_atomic
+
+faiss = lazy_import("faiss")
+
+NPROBES = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+EF_SEARCHES = (16, 32, 64, 128, 256, 512)
+HNSW_M = (16, 32)
+# Inverted lists and PQ codebooks need this many training vectors per centroid
+MIN_POINTS_PER_CENTROID = 39
+
+def candidate_indexes(count: int, dim: int) -> List[Tuple[str, Optional[str], Sequence[Any]]]:
+    """(factory, runtime parameter, values to sweep) worth trying on `count` vectors of `dim` dimensions."""
+    candidates: List[Tuple[str, Optional[str], Sequence[Any]]] = [("Flat", None, (None,))]
+    for m in HNSW_M:
+        candidates.append((f"HNSW{m}", "efSearch", EF_SEARCHES))
+
+    # nlist around 4 * sqrt(N), with enough vectors to train each list
+    base = 2 ** int(round(np.log2(max(4 * np.sqrt(count), 2))))
+    nlists = sorted({nlist for nlist in (base // 2, base, base * 2)
+                     if 2 <= nlist <= count // MIN_POINTS_PER_CENTROID})
+    pq_sizes = [m for m in (dim // 4, dim // 8, dim // 16) if m >= 4 and dim % m == 0]
+    for nlist in nlists:
+        nprobes = [p for p in NPROBES if p <= nlist]
+        candidates.append((f"IVF{nlist},Flat", "nprobe", nprobes))
+        if count >= 256 * MIN_POINTS_PER_CENTROID:
+            candidates.extend((f"IVF{nlist},PQ{m}", "nprobe", nprobes) for m in pq_sizes)
+    return candidates
+
+def _ground_truth(vectors: np.ndarray, queries: np.ndarray, top_k: int) -> List[set]:
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, top_k)
+    return [set(int(i) for i in row if i >= 0) for row in truth]
+
+def _measure(index, factory: str, queries: np.ndarray, truth: List[set], top_k: int,
+             vectors: np.ndarray) -> Dict[str, float]:
+    """Search one query at a time, as the server does, through the same rescoring path."""
+    lossy = factory != "Flat" and quantization.is_lossy(factory)
+    rescore_factor = RESCORE_FACTOR if VECTOR_RESCORE and lossy else 1
+    latencies = []
+    recalls = []
+    for qi in range(len(queries)):
+        start = time.perf_counter_ns()
+        results = quantization.search_index(
+            "float32", index, queries[qi:qi + 1], top_k,
+            full_vectors=vectors if rescore_factor > 1 else None, rescore_factor=rescore_factor
+        )[0]
+        latencies.append(time.perf_counter_ns() - start)
+        recalls.append(len(truth[qi] & {i for i, _ in results}) / max(len(truth[qi]), 1))
+    latencies_ms = np.asarray(latencies) / 1e6
+    return {
+        "recall": round(float(np.mean(recalls)), 4),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 4),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 4),
+    }
+
+def sweep(vectors: np.ndarray, queries: np.ndarray, top_k: int = 10) -> List[Dict[str, Any]]:
+    """Build every candidate index and measure recall@k and latency across its runtime parameter."""
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    queries = np.ascontiguousarray(queries, dtype="float32")
+    truth = _ground_truth(vectors, queries, top_k)
+
+    report = []
+    for factory, param, values in candidate_indexes(len(vectors), vectors.shape[1]):
+        start = time.perf_counter()
+        try:
+            index = quantization.build_index("float32", vectors, None if factory == "Flat" else factory)
+        except RuntimeError as e:
+            report.append({"factory": factory, "error": str(e)})
+            continue
+        build_seconds = round(time.perf_counter() - start, 3)
+        bytes_per_vector = round(len(faiss.serialize_index(index)) / len(vectors), 1)
+
+        for value in values:
+            params = f"{param}={value}" if param is not None else None
+            quantization.set_search_params(index, params)
+            report.append({
+                "factory": factory,
+                "params": params,
+                **_measure(index, factory, queries, truth, top_k, vectors),
+                "bytes_per_vector": bytes_per_vector,
+                "build_seconds": build_seconds,
+            })
+    return report
+
+def pareto_front(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Configurations no other beats on recall, p99 latency and memory all at once."""
+    points = [r for r in results if "error" not in r]
+
+    def dominates(a, b):
+        no_worse = (a["recall"] >= b["recall"] and a["p99_ms"] <= b["p99_ms"]
+                    and a["bytes_per_vector"] <= b["bytes_per_vector"])
+        better = (a["recall"] > b["recall"] or a["p99_ms"] < b["p99_ms"]
+                  or a["bytes_per_vector"] < b["bytes_per_vector"])
+        return no_worse and better
+
+    return [p for p in points if not any(dominates(q, p) for q in points)]
+
+def choose(front: List[Dict[str, Any]], target_recall: float, prefer: str = "latency") -> Optional[Dict[str, Any]]:
+    """The fastest (or smallest) Pareto-optimal configuration that meets the recall target."""
+    eligible = [p for p in front if p["recall"] >= target_recall]
+    if not eligible:
+        return None
+    if prefer == "memory":
+        return min(eligible, key=lambda p: (p["bytes_per_vector"], p["p50_ms"]))
+    return min(eligible, key=lambda p: (p["p50_ms"], p["bytes_per_vector"]))
+
+def main():
+    """Tune the ANN index of a collection against a recall target and record the result in its manifest."""
+    parser = argparse.ArgumentParser(description="Choose ANN index parameters that meet a recall target")
+    parser.add_argument("--collection", default=DEFAULT_COLLECTION)
+    parser.add_argument("--queries", type=int, default=200, help="Number of stored vectors to sample as queries")
+    parser.add_argument("--k", type=int, default=10, help="Recall cut-off")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--prefer", choices=("latency", "memory"), default="latency",
+                        help="Tie-break among configurations that meet the target")
+    parser.add_argument("--dry-run", action="store_true", help="Report without writing the manifest")
+    args = parser.parse_args()
+
+    path = current_version_dir(collection_dir(validate_name(args.collection)))
+    vectors = load_full_vectors(path) if path is not None else None
+    if vectors is None or len(vectors) == 0:
+        print(json.dumps({"error": "No full-precision vectors found; ingest documents first"}))
+        return
+    manifest = load_json_file(path / MANIFEST_FILE)
+    if manifest.get("storage", "float32") != "float32":
+        print(json.dumps({"error": f"ANN indexes replace float32 storage; index uses {manifest['storage']}"}))
+        return
+
+    vectors = np.asarray(vectors, dtype="float32")
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    results = sweep(vectors, vectors[sample], args.k)
+    front = pareto_front(results)
+    chosen = choose(front, args.target_recall, args.prefer)
+
+    output = {"vectors": len(vectors), "queries": len(sample), "k": args.k,
+              "target_recall": args.target_recall, "chosen": chosen, "pareto": front, "results": results}
+    if chosen is not None and not args.dry_run:
+        # Picked up by the writer on its next open, which rebuilds the index from vectors.f32
+        manifest["ann"] = {
+            "factory": chosen["factory"],
+            "params": chosen["params"],
+            f"recall@{args.k}": chosen["recall"],
+            "target_recall": args.target_recall,
+            "p50_ms": chosen["p50_ms"],
+            "p99_ms": chosen["p99_ms"],
+            "tuned_on": len(vectors),
+            "tuned_at": time.time(),
+        }
+        write_json_atomic(path / MANIFEST_FILE, manifest)
+        output["manifest"] = str(path / MANIFEST_FILE)
+    print(json.dumps(output, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+from typing import List, Tuple
+import numpy as np
+from app.core.analyzer import SENTENCE_BREAK, Vocabulary, analyzer
+
+class BM25Index:
+    """Okapi BM25 over precomputed uint32 term-id arrays.
+
+    Postings are stored CSR-style (term -> row ids) with each posting's BM25
+    weight precomputed, since it depends only on the term, the row and corpus
+    statistics. Scoring a query is then a scatter-add of a few posting slices.
+    Uses the non-negative idf log(1 + (N - df + 0.5) / (df + 0.5)).
+    """
+
+    def __init__(self, ids: np.ndarray, starts: np.ndarray, vocabulary: Vocabulary, k1: float = 1.5, b: float = 0.75):
+        self.vocabulary = vocabulary
+        self.rows = len(starts)
+        lengths = np.diff(np.append(starts, len(ids)))
+        row_of = np.repeat(np.arange(self.rows, dtype="int64"), lengths)
+        terms = np.asarray(ids, dtype="int64")
+        keep = terms != SENTENCE_BREAK
+        terms, row_of = terms[keep], row_of[keep]
+
+        # One (term, row) pair per posting, sorted by term then row, with its term frequency
+        pairs, tf = np.unique(terms * max(self.rows, 1) + row_of, return_counts=True)
+        posting_terms = pairs // max(self.rows, 1)
+        self.postings = (pairs % max(self.rows, 1)).astype("int32")
+        df = np.bincount(posting_terms, minlength=len(vocabulary))
+        self.indptr = np.concatenate([[0], np.cumsum(df)]).astype("int64")
+
+        doc_lengths = np.bincount(row_of, minlength=self.rows).astype("float32")
+        avg_length = float(doc_lengths.mean()) if self.rows and doc_lengths.sum() else 1.0
+        idf = np.log1p((self.rows - df + 0.5) / (df + 0.5)).astype("float32")
+        norm = k1 * (1 - b + b * doc_lengths[self.postings] / avg_length)
+        self.weights = (idf[posting_terms] * tf * (k1 + 1) / (tf + norm)).astype("float32")
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def memory_bytes(self) -> int:
+        """Postings plus a rough allowance for the vocabulary's term dict."""
+        arrays = self.postings.nbytes + self.weights.nbytes + self.indptr.nbytes
+        return arrays + 100 * len(self.vocabulary)
+
+    def query_ids(self, query: str) -> np.ndarray:
+        return analyzer.query_ids(query, self.vocabulary)
+
+    def scores(self, query_ids: np.ndarray) -> np.ndarray:
+        scores = np.zeros(self.rows, dtype="float32")
+        for term in query_ids:
+            term = int(term)
+            if term + 1 >= len(self.indptr):
+                continue
+            start, end = self.indptr[term], self.indptr[term + 1]
+            # Rows are unique within one term's postings, so plain fancy-index += is safe
+            scores[self.postings[start:end]] += self.weights[start:end]
+        return scores
+
+    def top_k(self, query_ids: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        scores = self.scores(query_ids)
+        if k < len(scores):
+            candidates = np.argpartition(-scores, k)[:k]
+        else:
+            candidates = np.arange(len(scores))
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(idx), float(scores[idx])) for idx in order if scores[idx] > 0]
@@ -8,4 +8,35 @@ def chunk_text(text: str, chunk_size: int, overlap: int) -> list[str]:
         chunk = words[start:end]
         chunks.append(" ".join(chunk))
         start = end - overlap
-    return chunks
\ No newline at end of file
+    return chunks
+
+def chunk_documents(texts: list[str], chunk_size: int, overlap: int,
+                    child_size: int = 0) -> tuple[list[str], list[dict]]:
+    """Chunk a batch of documents, returning the chunks and their metadata.
+
+    With child_size > 0 each chunk becomes a parent section split into
+    non-overlapping children of child_size words; only the children are
+    returned for indexing. A parent's children are emitted contiguously and
+    carry parent_id, child_index and child_count, so the parent can be
+    rebuilt from neighbouring metadata rows without storing it twice.
+    """
+    chunks = []
+    metadatas = []
+    for i, text in enumerate(texts):
+        for j, chunk in enumerate(chunk_text(text, chunk_size, overlap)):
+            if child_size <= 0:
+                chunks.append(chunk)
+                metadatas.append({"source": f"doc_{i}", "text": chunk})
+                continue
+
+            children = chunk_text(chunk, child_size, 0)
+            for k, child in enumerate(children):
+                chunks.append(child)
+                metadatas.append({
+                    "source": f"doc_{i}",
+                    "text": child,
+                    "parent_id": f"doc_{i}:{j}",
+                    "child_index": k,
+                    "child_count": len(children),
+                })
+    return chunks, metadatas
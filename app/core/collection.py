@@ -0,0 +1,85 @@
+import re
+import threading
+from pathlib import Path
+from typing import Callable, List, Optional
+from app.config import INDEX_DIR
+from app.core.retriever import Retriever
+from app.core.vector_store import VectorStore
+
+DEFAULT_COLLECTION = "default"
+COLLECTIONS_DIR = "collections"
+NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+
+def validate_name(name: Optional[str]) -> str:
+    name = name or DEFAULT_COLLECTION
+    if not NAME_PATTERN.match(name):
+        raise ValueError(f"Invalid collection name {name!r}: use up to 64 letters, digits, '.', '_' or '-'")
+    return name
+
+def collection_dir(name: str) -> Path:
+    """The default collection keeps the top-level index directory, so existing indexes stay where they are."""
+    return INDEX_DIR if name == DEFAULT_COLLECTION else INDEX_DIR / COLLECTIONS_DIR / name
+
+def list_collections() -> List[str]:
+    root = INDEX_DIR / COLLECTIONS_DIR
+    names = sorted(p.name for p in root.iterdir() if p.is_dir()) if root.exists() else []
+    return [DEFAULT_COLLECTION] + names
+
+class Collection:
+    """A named corpus with its own vector store, BM25 index and stats.
+
+    Models are shared between collections; only the store and the retriever
+    built on it are per collection. The collection registry loads and unloads
+    these through the same residency interface as models.
+    """
+
+    def __init__(self, name: str, open_store: Callable[[str, Path], VectorStore],
+                 build_retriever: Callable[[VectorStore], Retriever]):
+        self.name = name
+        self.path = collection_dir(name)
+        self._open_store = open_store
+        self._build_retriever = build_retriever
+        self.vector_store: Optional[VectorStore] = None
+        self._retriever: Optional[Retriever] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self.vector_store is not None
+
+    def load(self):
+        # A retriever left from before an unload is bound to the old store
+        self._retriever = None
+        self.vector_store = self._open_store(self.name, self.path)
+
+    def unload(self):
+        self.vector_store = None
+        self._retriever = None
+
+    @property
+    def retriever(self) -> Retriever:
+        """Built on first use: plain searches and ingests only need the store."""
+        if self._retriever is None:
+            with self._lock:
+                if self._retriever is None:
+                    store = self.vector_store
+                    if store is None:
+                        raise RuntimeError(f"Collection {self.name!r} is not loaded; use it through use_collection()")
+                    self._retriever = self._build_retriever(store)
+        return self._retriever
+
+    def refresh(self):
+        """Rebuild derived indexes (BM25) after the store changed."""
+        retriever = self._retriever
+        if retriever is not None:
+            retriever.hybrid_search.refresh()
+
+    def memory_bytes(self) -> int:
+        store = self.vector_store
+        if store is None:
+            return 0
+        size = store.memory_bytes()
+        retriever = self._retriever
+        if retriever is not None and retriever.hybrid_search.bm25 is not None:
+            size += retriever.hybrid_search.bm25.memory_bytes()
+        return size
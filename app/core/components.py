@@ -0,0 +1,243 @@
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Any, Iterator, Optional, Union
+from app.core.collection import Collection, DEFAULT_COLLECTION, validate_name
+from app.core.embeddings import EmbeddingModel
+from app.core.vector_store import VectorStore
+from app.core.reranker import Reranker, CascadeReranker
+from app.core.retriever import Retriever
+from app.core.router import QueryRouter
+from app.core.residency import residency, ResidencyManager
+from app.resources.stats import load_index_stats
+from app.config import ROUTER_MODE, RERANK_CASCADE, READINESS_CACHE_TTL, COLLECTION_MEMORY_BUDGET_MB
+from app.utils.logger import logger
+
+# Shared, lazily constructed retrieval components. Models and the index are
+# expensive to load, so every tool reuses the same instances.
+_lock = threading.RLock()
+_embedder: Optional[EmbeddingModel] = None
+_vector_store: Optional[VectorStore] = None
+_reranker: Optional[Union[Reranker, CascadeReranker]] = None
+_retriever: Optional[Retriever] = None
+_router: Optional[QueryRouter] = None
+# Serving workers open the index read-only and follow versions published by the writer
+_read_only = False
+# Named collections, loaded on first use and evicted least recently used first
+_collections = ResidencyManager(COLLECTION_MEMORY_BUDGET_MB, idle_timeout=0,
+                                pinned=DEFAULT_COLLECTION, prefix="collection")
+_collections_lock = threading.Lock()
+
+_readiness: Dict[str, Any] = {
+    "status": "starting",
+    "components": {},
+    "error": None,
+    "started_at": time.time(),
+    "ready_at": None,
+}
+_readiness_cache: Dict[str, Any] = {"at": 0.0, "report": None}
+
+def _set_status(status: str, error: Optional[str] = None):
+    _readiness["status"] = status
+    _readiness["error"] = error
+    _readiness_cache["report"] = None
+
+def _mark_loaded(name: str, started: float):
+    _readiness["components"][name] = {
+        "loaded": True,
+        "load_seconds": round(time.perf_counter() - started, 3),
+    }
+    _readiness_cache["report"] = None
+
+def get_embedder() -> EmbeddingModel:
+    global _embedder
+    if _embedder is None:
+        with _lock:
+            if _embedder is None:
+                started = time.perf_counter()
+                _embedder = EmbeddingModel()
+                _mark_loaded("embedder", started)
+    return _embedder
+
+def get_vector_store() -> VectorStore:
+    global _vector_store
+    if _vector_store is None:
+        with _lock:
+            if _vector_store is None:
+                dim = get_embedder().dimension
+                started = time.perf_counter()
+                _vector_store = VectorStore(dim, read_only=_read_only)
+                # Counted but never unloaded: the writer holds the index on the heap to clone each
+                # next version from it, and searches read it without residency.use()
+                residency.track("vector_store", _vector_store.memory_bytes)
+                _mark_loaded("vector_store", started)
+    return _vector_store
+
+def get_reranker() -> Union[Reranker, CascadeReranker]:
+    global _reranker
+    if _reranker is None:
+        with _lock:
+            if _reranker is None:
+                started = time.perf_counter()
+                if RERANK_CASCADE:
+                    _reranker = CascadeReranker(Reranker(), get_vector_store())
+                else:
+                    _reranker = Reranker()
+                _mark_loaded("reranker", started)
+    return _reranker
+
+def get_retriever() -> Retriever:
+    global _retriever
+    if _retriever is None:
+        with _lock:
+            if _retriever is None:
+                store = get_vector_store()
+                embedder = get_embedder()
+                reranker = get_reranker()
+                started = time.perf_counter()
+                _retriever = Retriever(store, embedder, reranker)
+                _mark_loaded("retriever", started)
+    return _retriever
+
+def get_router() -> QueryRouter:
+    """Shared router; builds the embedding-centroid classifier when ROUTER_MODE uses it."""
+    global _router
+    if _router is None:
+        with _lock:
+            if _router is None:
+                _router = QueryRouter(get_embedder() if ROUTER_MODE != "rules" else None)
+    return _router
+
+def _open_collection_store(name: str, path: Path) -> VectorStore:
+    if name == DEFAULT_COLLECTION:
+        return get_vector_store()
+    return VectorStore(get_embedder().dimension, read_only=_read_only, index_dir=path)
+
+def _build_collection_retriever(store: VectorStore) -> Retriever:
+    if store is _vector_store:
+        return get_retriever()
+    reranker = get_reranker()
+    if isinstance(reranker, CascadeReranker):
+        reranker = reranker.for_store(store)
+    return Retriever(store, get_embedder(), reranker)
+
+@contextmanager
+def use_collection(name: Optional[str] = DEFAULT_COLLECTION) -> Iterator[Collection]:
+    """Load a collection if needed and keep it from being evicted while in use."""
+    name = validate_name(name)
+    if name not in _collections:
+        with _collections_lock:
+            if name not in _collections:
+                _collections.register(name, Collection(name, _open_collection_store, _build_collection_retriever))
+    try:
+        with _collections.use(name) as collection:
+            yield collection
+    finally:
+        # Its footprint grows as the retriever is built and documents are added
+        _collections.refresh(name)
+
+def get_collection_retriever(name: Optional[str] = DEFAULT_COLLECTION) -> Retriever:
+    """A collection's retriever, resolved while the collection is held in use.
+
+    The retriever references the collection's store, so readers may keep using
+    it after the collection is evicted. Writers use use_collection().
+    """
+    with use_collection(name) as collection:
+        return collection.retriever
+
+def collection_stats() -> Dict[str, Any]:
+    return _collections.stats()
+
+def use_read_only_index():
+    """Open the index read-only (memory-mapped) in this process; call before anything loads it."""
+    global _read_only
+    _read_only = True
+
+def sync_index():
+    """In read-only processes, switch to a newer index version if one has been published."""
+    store = _vector_store
+    if store is not None and store.read_only and store.reload_if_changed():
+        notify_index_updated()
+    for name in _collections.names():
+        collection = _collections.get(name)
+        store = collection.vector_store
+        if name != DEFAULT_COLLECTION and store is not None and store.read_only and store.reload_if_changed():
+            notify_index_updated(name)
+
+def batcher_stats() -> Dict[str, Any]:
+    """Queue depth and batch sizes of the model micro-batchers that have been built."""
+    stats = {}
+    if _embedder is not None and _embedder.batcher is not None:
+        stats["embed"] = _embedder.batcher.stats()
+    reranker = getattr(_reranker, "reranker", _reranker)
+    if reranker is not None and reranker.batcher is not None:
+        stats["rerank"] = reranker.batcher.stats()
+    return stats
+
+def notify_index_updated(name: str = DEFAULT_COLLECTION):
+    """Refresh derived indexes (BM25) after documents were added to a collection's store."""
+    if name == DEFAULT_COLLECTION:
+        with _lock:
+            if _retriever is not None:
+                _retriever.hybrid_search.refresh()
+        residency.refresh("vector_store")
+    else:
+        collection = _collections.get(name)
+        if collection is not None:
+            collection.refresh()
+    _collections.refresh(name)
+
+def warm_up(pool=None):
+    """Load models, the index and the LLM client so the first request doesn't pay for it.
+
+    With a serving worker pool the models live in the workers, so warming them
+    replaces loading the retrieval components in this process.
+    """
+    from app.core.llm import get_client
+
+    _set_status("warming")
+    started = time.perf_counter()
+    try:
+        if pool is not None:
+            pool.warm_up()
+            _mark_loaded("workers", started)
+        else:
+            get_retriever()
+            get_router()
+        get_client()
+        _readiness["ready_at"] = time.time()
+        _set_status("ready")
+        logger.info(f"Warm-up completed in {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        _set_status("degraded", str(e))
+        logger.error(f"Warm-up failed: {e}")
+
+def liveness() -> Dict[str, Any]:
+    """Constant-time check that the process is up; touches no models, files or locks."""
+    return {
+        "status": "alive",
+        "uptime_seconds": round(time.time() - _readiness["started_at"], 3),
+    }
+
+def readiness() -> Dict[str, Any]:
+    """Report whether models and the index are loaded yet, cached for READINESS_CACHE_TTL seconds."""
+    report = _readiness_cache["report"]
+    if report is not None and time.monotonic() - _readiness_cache["at"] < READINESS_CACHE_TTL:
+        return report
+
+    index = load_index_stats()
+    report = {
+        "status": _readiness["status"],
+        "ready": _readiness["status"] == "ready",
+        "components": dict(_readiness["components"]),
+        "index": {
+            "chunks": index.get("chunks", 0),
+            "storage": index.get("storage"),
+            "last_ingest_at": index.get("last_ingest_at"),
+        },
+        "error": _readiness["error"],
+        "uptime_seconds": round(time.time() - _readiness["started_at"], 3),
+    }
+    _readiness_cache.update(at=time.monotonic(), report=report)
+    return report
@@ -1,14 +1,22 @@
+import numpy as np
 from typing import List, Dict, Any, Optional
+from app.core.analyzer import SENTENCE_BREAK, Vocabulary, analyzer
 from app.core.llm import generate_answer
+from app.core.pipeline import parallel_map
 from app.core.router import AgentType
 from app.config import CONTEXT_MAX_LENGTH, CONTEXT_COMPRESSION_RATIO
 from app.utils.logger import logger
+from app.utils.metrics import metrics
 
 class ContextCompressor:
-    def __init__(self, max_context_length: int = CONTEXT_MAX_LENGTH, compression_ratio: float = CONTEXT_COMPRESSION_RATIO):
+    def __init__(self, max_context_length: int = CONTEXT_MAX_LENGTH, compression_ratio: float = CONTEXT_COMPRESSION_RATIO,
+                 vector_store=None):
         self.max_context_length = max_context_length
         self.compression_ratio = compression_ratio
+        # Source of the token ids computed at ingest; without it documents are analyzed here
+        self.vector_store = vector_store
 
+    @metrics.timed("compress.total")
     def compress_context(self, query: str, documents: List[Dict[str, Any]]) -> str:
         """Compress retrieved documents to fit within context limits."""
         if not documents:
@@ -25,50 +33,59 @@ class ContextCompressor:
         logger.info(f"Compressing context: {total_length} chars -> ~{int(total_length * self.compression_ratio)}")
 
         # Method 1: Extractive compression (select most relevant parts)
-        compressed_docs = self._extractive_compression(query, documents)
+        with metrics.timer("compress.extractive"):
+            compressed_docs = self._extractive_compression(query, documents)
 
         # If still too long, use abstractive compression
         compressed_text = self._format_documents(compressed_docs)
         if len(compressed_text) > self.max_context_length:
-            compressed_text = self._abstractive_compression(query, compressed_docs)
+            with metrics.timer("compress.abstractive"):
+                compressed_text = self._abstractive_compression(query, compressed_docs)
 
+        metrics.incr("compress.chars_in", total_length)
+        metrics.incr("compress.chars_out", len(compressed_text))
         return compressed_text
 
     def _extractive_compression(self, query: str, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Extract most relevant sentences/sections from documents."""
-        compressed_docs = []
-
-        for doc in documents:
-            text = doc.get('text', '')
-            if not text:
-                continue
-
-            # Simple sentence-based extraction
-            sentences = self._split_into_sentences(text)
-
-            # Score sentences by relevance to query
-            query_words = set(query.lower().split())
-            scored_sentences = []
-
-            for sentence in sentences:
-                sentence_words = set(sentence.lower().split())
-                # Simple overlap score
-                score = len(query_words.intersection(sentence_words))
-                scored_sentences.append((sentence, score))
-
-            # Select top sentences
-            scored_sentences.sort(key=lambda x: x[1], reverse=True)
-            top_sentences = [s[0] for s in scored_sentences[:3]]  # Top 3 sentences
-
-            compressed_text = ' '.join(top_sentences)
-            if len(compressed_text) > 100:  # Minimum length threshold
-                compressed_docs.append({
-                    'text': compressed_text,
-                    'source': doc.get('source', 'compressed'),
-                    'compressed': True
-                })
-
-        return compressed_docs
+        """Extract most relevant sentences/sections from documents.
+
+        Documents are independent, so each is extracted on the pipeline pool.
+        """
+        tokens = getattr(self.vector_store, "tokens", None)
+        vocabulary = tokens.vocabulary if tokens is not None else Vocabulary(analyzer.terms(query))
+        query_ids = np.unique(analyzer.query_ids(query, vocabulary))
+
+        extracted = parallel_map(lambda doc: self._extract_document(doc, query_ids, vocabulary, tokens), documents)
+        return [doc for doc in extracted if doc is not None]
+
+    def _extract_document(self, doc: Dict[str, Any], query_ids: np.ndarray, vocabulary: Vocabulary,
+                          tokens) -> Optional[Dict[str, Any]]:
+        text = doc.get('text', '')
+        if not text:
+            return None
+
+        # Simple sentence-based extraction
+        sentences = self._split_into_sentences(text)
+
+        # Score sentences by how many distinct query terms they contain
+        ids = self._token_ids(doc, tokens, len(sentences))
+        if ids is None:
+            ids = analyzer.encode(text, vocabulary, grow=False)
+        scores = self._overlap_scores(ids, query_ids, len(sentences))
+        scored_sentences = list(zip(sentences, scores.tolist()))
+
+        # Select top sentences
+        scored_sentences.sort(key=lambda x: x[1], reverse=True)
+        top_sentences = [s[0] for s in scored_sentences[:3]]  # Top 3 sentences
+
+        compressed_text = ' '.join(top_sentences)
+        if len(compressed_text) <= 100:  # Minimum length threshold
+            return None
+        return {
+            'text': compressed_text,
+            'source': doc.get('source', 'compressed'),
+            'compressed': True
+        }
 
     def _abstractive_compression(self, query: str, documents: List[Dict[str, Any]]) -> str:
         """Use LLM to generate compressed summary of documents."""
@@ -99,11 +116,29 @@ class ContextCompressor:
             # Fallback to extractive
             return self._format_documents(self._extractive_compression(query, documents))
 
+    @staticmethod
+    def _token_ids(doc: Dict[str, Any], tokens, sentence_count: int) -> Optional[np.ndarray]:
+        """Token ids stored at ingest for a plain chunk, if they line up with its sentences."""
+        chunk_id = doc.get('chunk_id')
+        if tokens is None or chunk_id is None or 'window' in doc or chunk_id >= len(tokens):
+            return None
+        ids = tokens[chunk_id]
+        if int(np.count_nonzero(ids == SENTENCE_BREAK)) + 1 != sentence_count:
+            return None
+        return ids
+
+    @staticmethod
+    def _overlap_scores(ids: np.ndarray, query_ids: np.ndarray, sentence_count: int) -> np.ndarray:
+        """Distinct query terms per sentence, from one pass over the chunk's id array."""
+        sentence_of = np.cumsum(ids == SENTENCE_BREAK)
+        hits = np.isin(ids, query_ids)
+        stride = int(ids.max()) + 1 if len(ids) else 1
+        matches = np.unique(sentence_of[hits].astype("int64") * stride + ids[hits])
+        return np.bincount(matches // stride, minlength=sentence_count)[:sentence_count]
+
     def _split_into_sentences(self, text: str) -> List[str]:
-        """Simple sentence splitting."""
-        import re
-        sentences = re.split(r'[.!?]+', text)
-        return [s.strip() for s in sentences if s.strip()]
+        """Sentence splitting shared with the analyzer, so stored token ids line up."""
+        return analyzer.sentences(text)
 
     def _format_documents(self, documents: List[Dict[str, Any]]) -> str:
         """Format documents into context string."""
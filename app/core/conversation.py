@@ -0,0 +1,114 @@
+import json
+from typing import List, Dict, Any, Optional
+from app.config import AGENT_HISTORY_MAX_TOKENS, AGENT_HISTORY_KEEP_RECENT, AGENT_SNIPPET_TOKENS
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+from app.utils.tokens import estimate_tokens, truncate_to_tokens
+
+class ConversationHistory:
+    """Message history for the tool-calling loop, kept within a token budget.
+
+    Every message carries a token estimate. When the total exceeds the budget,
+    the oldest tool results (outside the most recent rounds) are replaced by a
+    compact reference with a short extracted snippet; the full output stays
+    available through `full_result`. The system prompt is never touched and a
+    compacted message is never rewritten again, so the prompt prefix sent to the
+    provider stays byte-identical between turns and prompt caching can apply.
+    """
+
+    def __init__(self, system_prompt: str, max_tokens: int = AGENT_HISTORY_MAX_TOKENS,
+                 keep_recent_rounds: int = AGENT_HISTORY_KEEP_RECENT):
+        self.max_tokens = max_tokens
+        self.keep_recent_rounds = keep_recent_rounds
+        self._entries: List[Dict[str, Any]] = []
+        self._archive: Dict[str, str] = {}
+        self._tool_names: Dict[str, str] = {}
+        self._round = 0
+        self.add({"role": "system", "content": system_prompt})
+
+    @property
+    def tokens(self) -> int:
+        return sum(entry["tokens"] for entry in self._entries)
+
+    @property
+    def messages(self) -> List[Dict[str, Any]]:
+        """Messages in the format expected by the chat completions API."""
+        return [entry["message"] for entry in self._entries]
+
+    def add(self, message: Dict[str, Any]):
+        self._entries.append({
+            "message": message,
+            "tokens": self._count_tokens(message),
+            "round": self._round,
+            "compacted": False,
+        })
+
+    def add_tool_round(self, assistant_message: Dict[str, Any], tool_messages: List[Dict[str, Any]]):
+        """Record an assistant tool-call turn and its results, then enforce the budget."""
+        self._round += 1
+        for tool_call in assistant_message.get("tool_calls") or []:
+            self._tool_names[tool_call["id"]] = tool_call["function"]["name"]
+        self.add(assistant_message)
+        for tool_message in tool_messages:
+            self.add(tool_message)
+        self.compact()
+
+    def full_result(self, tool_call_id: str) -> Optional[str]:
+        """Original content of a tool result that has been compacted."""
+        return self._archive.get(tool_call_id)
+
+    def compact(self):
+        """Replace the oldest tool outputs with references until the history fits the budget."""
+        before = self.tokens
+        if before <= self.max_tokens:
+            return
+
+        protected_from = self._round - self.keep_recent_rounds + 1
+        for entry in self._entries:
+            if self.tokens <= self.max_tokens:
+                break
+            message = entry["message"]
+            if message.get("role") != "tool" or entry["compacted"] or entry["round"] >= protected_from:
+                continue
+
+            tool_call_id = message.get("tool_call_id", "")
+            self._archive[tool_call_id] = message.get("content", "")
+            compacted = dict(message, content=self._reference(tool_call_id, message.get("content", "")))
+            entry.update(message=compacted, tokens=self._count_tokens(compacted), compacted=True)
+            metrics.incr("agent.history_compacted")
+
+        logger.info(f"Compacted conversation history: ~{before} -> ~{self.tokens} tokens")
+
+    def _reference(self, tool_call_id: str, content: str) -> str:
+        name = self._tool_names.get(tool_call_id, "tool")
+        return (f"[Earlier {name} result {tool_call_id} compacted from ~{estimate_tokens(content)} tokens] "
+                f"{self._snippet(content)}")
+
+    def _snippet(self, content: str) -> str:
+        """Pull the most useful part out of a tool result."""
+        try:
+            data = json.loads(content)
+        except (TypeError, ValueError):
+            return truncate_to_tokens(content, AGENT_SNIPPET_TOKENS)
+
+        if isinstance(data, dict):
+            if "answer" in data:
+                return truncate_to_tokens(str(data["answer"]), AGENT_SNIPPET_TOKENS)
+            if isinstance(data.get("results"), list):
+                per_result = max(AGENT_SNIPPET_TOKENS // 2, 10)
+                parts = [
+                    f"({item.get('source', '?')}) {truncate_to_tokens(str(item.get('text', '')), per_result)}"
+                    for item in data["results"][:2] if isinstance(item, dict)
+                ]
+                return " | ".join(parts)
+            if "error" in data:
+                return f"error: {truncate_to_tokens(str(data['error']), AGENT_SNIPPET_TOKENS)}"
+        return truncate_to_tokens(content, AGENT_SNIPPET_TOKENS)
+
+    @staticmethod
+    def _count_tokens(message: Dict[str, Any]) -> int:
+        tokens = estimate_tokens(message.get("content") or "")
+        if message.get("tool_calls"):
+            tokens += estimate_tokens(json.dumps(message["tool_calls"]))
+        # Per-message framing overhead
+        return tokens + 4
@@ -1,13 +1,47 @@
-from sentence_transformers import SentenceTransformer
 import numpy as np
-from app.config import EMBEDDING_MODEL
+from app.config import EMBEDDING_MODEL, EMBED_BATCHING, EMBED_BATCH_MAX, EMBED_BATCH_WINDOW_MS
+from app.core.inference import load_sentence_transformer
+from app.core.residency import residency, module_bytes
+from app.utils.batcher import MicroBatcher
 
 class EmbeddingModel:
     def __init__(self):
-        self.model = SentenceTransformer(EMBEDDING_MODEL)
+        self.model = None
+        # Loads the model; it may be unloaded while idle and reloaded on the next call
+        residency.register("embedder", self)
+        self._dimension = self.model.get_sentence_embedding_dimension()
+        # Concurrent queries share one forward pass instead of encoding one at a time
+        self.batcher = MicroBatcher(
+            "embed", self._encode_queries, EMBED_BATCH_MAX, EMBED_BATCH_WINDOW_MS / 1000
+        ) if EMBED_BATCHING else None
+
+    @property
+    def loaded(self) -> bool:
+        return self.model is not None
+
+    def load(self):
+        self.model = load_sentence_transformer(EMBEDDING_MODEL)
+
+    def unload(self):
+        self.model = None
+
+    def memory_bytes(self) -> int:
+        return module_bytes(self.model) if self.model is not None else 0
+
+    @property
+    def dimension(self) -> int:
+        return self._dimension
 
     def embed_documents(self, texts: list[str]) -> np.ndarray:
-        return np.array(self.model.encode(texts, show_progress_bar=False))
+        with residency.use("embedder"):
+            return np.array(self.model.encode(texts, show_progress_bar=False))
 
     def embed_query(self, query: str) -> np.ndarray:
-        return np.array(self.model.encode([query]))[0]
+        if self.batcher is not None:
+            return self.batcher(query)
+        with residency.use("embedder"):
+            return np.array(self.model.encode([query]))[0]
+
+    def _encode_queries(self, queries: list[str]) -> list[np.ndarray]:
+        with residency.use("embedder"):
+            return list(np.array(self.model.encode(queries, batch_size=len(queries), show_progress_bar=False)))
@@ -1,59 +1,79 @@
-from rank_bm25 import BM25Okapi
 import numpy as np
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional
+from app.core.analyzer import Vocabulary
+from app.core.bm25 import BM25Index
 from app.core.embeddings import EmbeddingModel
+from app.core.pipeline import Fork
+from app.core.token_store import encode_corpus
 from app.core.vector_store import VectorStore
 from app.core.reranker import Reranker
-from app.config import TOP_K, RERANK_TOP_K
+from app.config import (
+    TOP_K, RERANK_TOP_K, ADAPTIVE_RETRIEVAL, ADAPTIVE_MIN_CANDIDATES, ADAPTIVE_MAX_CANDIDATES,
+    ADAPTIVE_AGREEMENT, ADAPTIVE_AMBIGUOUS_AGREEMENT, ADAPTIVE_SKIP_MARGIN, ADAPTIVE_SCORE_BAND
+)
 from app.utils.logger import logger
+from app.utils.metrics import metrics
+from app.utils.singleflight import SingleFlight, normalize_key
 
 class HybridSearch:
-    def __init__(self, vector_store: VectorStore):
+    def __init__(self, vector_store: VectorStore, embedder: Optional[EmbeddingModel] = None,
+                 reranker: Optional[Reranker] = None):
+        # Defaults are the shared models: constructing new ones would replace their residency entries
+        from app.core.components import get_embedder, get_reranker
+
         self.vector_store = vector_store
-        self.embedder = EmbeddingModel()
-        self.reranker = Reranker()
-        self.bm25 = None
-        self.documents = []
+        self.embedder = embedder or get_embedder()
+        self.reranker = reranker or get_reranker()
+        self.bm25: Optional[BM25Index] = None
+        self.flight = SingleFlight("search")
+        self._load_bm25_index()
+
+    def refresh(self):
+        """Rebuild the BM25 index after the vector store has changed."""
         self._load_bm25_index()
 
     def _load_bm25_index(self):
-        """Load or create BM25 index from stored documents."""
+        """Build the BM25 index from the token ids stored with the current index version."""
         try:
-            # Get all documents from vector store metadata
-            if hasattr(self.vector_store, 'metadata') and self.vector_store.metadata:
-                self.documents = [doc.get('text', '') for doc in self.vector_store.metadata]
-                if self.documents:
-                    # Tokenize documents for BM25
-                    tokenized_docs = [doc.lower().split() for doc in self.documents]
-                    self.bm25 = BM25Okapi(tokenized_docs)
-                    logger.info(f"Initialized BM25 index with {len(self.documents)} documents")
+            with self.vector_store.pin() as snapshot:
+                if not snapshot.rows:
+                    return
+                if snapshot.tokens is not None:
+                    vocabulary = snapshot.tokens.vocabulary
+                    ids, starts = snapshot.tokens.arrays()
+                else:
+                    # A read-only replica of an index written before token arrays were kept
+                    vocabulary = Vocabulary()
+                    ids, starts = encode_corpus([doc.get('text', '') for doc in snapshot.metadata], vocabulary)
+                with metrics.timer("bm25.build"):
+                    self.bm25 = BM25Index(ids, starts, vocabulary)
+            logger.info(f"Initialized BM25 index with {len(self.bm25)} documents, {len(vocabulary)} terms")
         except Exception as e:
             logger.warning(f"Failed to initialize BM25 index: {e}")
             self.bm25 = None
 
     def _bm25_search(self, query: str, top_k: int) -> List[Tuple[int, float]]:
         """Perform BM25 search and return (doc_index, score) pairs."""
-        if not self.bm25 or not self.documents:
+        bm25 = self.bm25
+        if bm25 is None or not len(bm25):
             return []
 
         try:
-            tokenized_query = query.lower().split()
-            scores = self.bm25.get_scores(tokenized_query)
-
-            # Get top-k results with scores
-            top_indices = np.argsort(scores)[::-1][:top_k]
-            return [(int(idx), float(scores[idx])) for idx in top_indices if scores[idx] > 0]
+            return bm25.top_k(bm25.query_ids(query), top_k)
         except Exception as e:
             logger.error(f"BM25 search failed: {e}")
             return []
 
-    def _vector_search(self, query: str, top_k: int) -> List[Tuple[int, float]]:
+    def _vector_search(self, query: str, top_k: int, query_vector: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
         """Perform vector search and return (doc_index, score) pairs."""
         try:
-            query_vector = self.embedder.embed_query(query)
-            # Note: FAISS doesn't return meaningful scores, so we'll use dummy scores
-            results = self.vector_store.search(query_vector, top_k)
-            return [(i, 1.0 - (i * 0.1)) for i in range(len(results))]  # Decreasing dummy scores
+            if query_vector is None:
+                with metrics.timer("search.embed"):
+                    query_vector = self.embedder.embed_query(query)
+            with metrics.timer("search.faiss"):
+                results = self.vector_store.search_with_scores(query_vector, top_k)
+            # FAISS returns distances (lower is closer); negate so higher is better like BM25
+            return [(idx, -distance) for idx, distance in results]
         except Exception as e:
             logger.error(f"Vector search failed: {e}")
             return []
@@ -91,38 +111,144 @@ class HybridSearch:
         # Sort by combined score
         return sorted(combined_scores.items(), key=lambda x: x[1], reverse=True)
 
-    def search(self, query: str, top_k: int = TOP_K) -> List[Dict[str, Any]]:
-        """Perform hybrid search combining BM25, vector search, and reranking."""
-        try:
-            # Get more candidates for better reranking
-            search_top_k = max(top_k * 3, 15)
+    def _fork_bm25(self, query: str, top_k: int) -> Fork:
+        """Start BM25 on the pipeline pool; it needs only the query text, so it overlaps embedding and FAISS."""
+        def search():
+            with metrics.timer("search.bm25"):
+                return self._bm25_search(query, top_k)
+        return Fork(search)
 
-            # Perform BM25 and vector search
-            bm25_results = self._bm25_search(query, search_top_k)
-            vector_results = self._vector_search(query, search_top_k)
+    def _retrieve_candidates(self, query: str, search_top_k: int, query_vector: np.ndarray, bm25: Fork,
+                             stats: Optional[Dict[str, Any]] = None) -> List[Tuple[int, float]]:
+        """Run vector search, join the forked BM25 search and fuse their scores.
 
-            # Combine scores
+        `bm25` may have been started with a larger k than search_top_k; its ranking
+        is exact, so its head is the smaller search's result.
+        """
+        vector_results = self._vector_search(query, search_top_k, query_vector)
+        bm25_results = bm25.join()[:search_top_k]
+
+        with metrics.timer("search.fusion"):
             combined_results = self._combine_scores(bm25_results, vector_results)
 
-            # Get documents for reranking
-            candidate_docs = []
-            for idx, score in combined_results[:search_top_k]:
-                if idx < len(self.vector_store.metadata):
-                    doc = self.vector_store.metadata[idx].copy()
-                    doc['hybrid_score'] = score
-                    candidate_docs.append(doc)
+        if stats is not None:
+            stats["bm25"] = bm25_results
+            stats["vector"] = vector_results
+        return combined_results
+
+    def _candidate_docs(self, scored: List[Tuple[int, float]]) -> List[Dict[str, Any]]:
+        """Look up metadata for (doc_index, score) pairs, attaching the fused score."""
+        candidate_docs = []
+        for idx, score in scored:
+            if idx < len(self.vector_store.metadata):
+                doc = self.vector_store.metadata[idx].copy()
+                doc['chunk_id'] = idx
+                doc['hybrid_score'] = score
+                candidate_docs.append(doc)
+        return candidate_docs
+
+    @staticmethod
+    def _bm25_depth(top_k: int) -> int:
+        """The most BM25 candidates any pass of a search can ask for."""
+        if ADAPTIVE_RETRIEVAL:
+            return max(top_k * 2, ADAPTIVE_MIN_CANDIDATES, ADAPTIVE_MAX_CANDIDATES)
+        return max(top_k * 3, 15)
+
+    def _adaptive_search(self, query: str, top_k: int, query_vector: np.ndarray, bm25: Fork) -> List[Dict[str, Any]]:
+        """Size the candidate pool and reranking effort from how confident the first pass is.
+
+        - confident: BM25 and vector search agree on the top results and the fused
+          scores separate the top-k from the rest, so the cross-encoder is skipped.
+        - moderate: only candidates competitive with the top-k are reranked.
+        - ambiguous: the retrievers disagree or the scores are flat, so the pool is
+          widened and fully reranked.
+        """
+        pool = max(top_k * 2, ADAPTIVE_MIN_CANDIDATES)
+        stats: Dict[str, Any] = {}
+        combined = self._retrieve_candidates(query, pool, query_vector, bm25, stats)
+
+        bm25_top = {idx for idx, _ in stats["bm25"][:top_k]}
+        vector_top = {idx for idx, _ in stats["vector"][:top_k]}
+        # Agreement is only meaningful when both retrievers returned something
+        agreement = len(bm25_top & vector_top) / top_k if bm25_top and vector_top else None
+
+        scores = [score for _, score in combined]
+        kth = scores[top_k - 1] if len(scores) >= top_k else (scores[-1] if scores else 0.0)
+        margin = kth - scores[top_k] if len(scores) > top_k else 1.0
+        # Candidates within ADAPTIVE_SCORE_BAND of the k-th score could still make the top-k after reranking
+        competitive = sum(1 for score in scores if score >= kth - ADAPTIVE_SCORE_BAND)
+
+        if (agreement is not None and agreement >= ADAPTIVE_AGREEMENT
+                and margin >= ADAPTIVE_SKIP_MARGIN):
+            decision = "skip_rerank"
+            reranked_docs = self._candidate_docs(combined[:top_k])
+            rerank_pool = 0
+        elif (agreement is not None and agreement < ADAPTIVE_AMBIGUOUS_AGREEMENT) or competitive >= pool:
+            decision = "widen"
+            rerank_pool = max(pool, ADAPTIVE_MAX_CANDIDATES)
+            combined = self._retrieve_candidates(query, rerank_pool, query_vector, bm25)
+            candidate_docs = self._candidate_docs(combined[:rerank_pool])
+            with metrics.timer("search.rerank"):
+                reranked_docs = self.reranker.rerank(query, candidate_docs, top_k, query_vector=query_vector)
+        else:
+            decision = "shrink_rerank"
+            rerank_pool = min(max(competitive, top_k + 1), pool)
+            candidate_docs = self._candidate_docs(combined[:rerank_pool])
+            with metrics.timer("search.rerank"):
+                reranked_docs = self.reranker.rerank(query, candidate_docs, top_k, query_vector=query_vector)
+
+        metrics.incr(f"search.adaptive.{decision}")
+        metrics.incr("search.candidates", rerank_pool)
+        agreement_text = f"{agreement:.2f}" if agreement is not None else "n/a"
+        logger.info(f"Adaptive retrieval: decision={decision} agreement={agreement_text} "
+                    f"margin={margin:.3f} competitive={competitive} pool={pool} reranked={rerank_pool}")
+        return reranked_docs
+
+    def search(self, query: str, top_k: int = TOP_K, query_vector: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """Perform hybrid search combining BM25, vector search, and reranking.
+
+        Pass query_vector when the query was already embedded (e.g. for routing) to skip re-embedding.
+        """
+        # Concurrent identical queries share one search; each caller gets its own list
+        return list(self.flight.do((normalize_key(query), top_k), lambda: self._search(query, top_k, query_vector)))
+
+    async def search_async(self, query: str, top_k: int = TOP_K, query_vector: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """Async variant of search that runs off the event loop."""
+        return list(await self.flight.do_async((normalize_key(query), top_k),
+                                               lambda: self._search(query, top_k, query_vector)))
+
+    def _search(self, query: str, top_k: int, query_vector: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        try:
+            with metrics.timer("search.total"):
+                bm25 = self._fork_bm25(query, self._bm25_depth(top_k))
+                if query_vector is None:
+                    with metrics.timer("search.embed"):
+                        query_vector = self.embedder.embed_query(query)
+
+                if ADAPTIVE_RETRIEVAL:
+                    reranked_docs = self._adaptive_search(query, top_k, query_vector, bm25)
+                else:
+                    # Get more candidates for better reranking
+                    search_top_k = max(top_k * 3, 15)
+                    combined_results = self._retrieve_candidates(query, search_top_k, query_vector, bm25)
+                    candidate_docs = self._candidate_docs(combined_results[:search_top_k])
 
-            # Rerank the combined results
-            reranked_docs = self.reranker.rerank(query, candidate_docs, top_k)
+                    # Rerank the combined results
+                    with metrics.timer("search.rerank"):
+                        reranked_docs = self.reranker.rerank(query, candidate_docs, top_k, query_vector=query_vector)
+                    metrics.incr("search.candidates", len(candidate_docs))
 
+            metrics.incr("search.queries")
             logger.info(f"Hybrid search found {len(reranked_docs)} results for query: {query[:50]}...")
             return reranked_docs
 
         except Exception as e:
             logger.error(f"Hybrid search failed: {e}")
+            metrics.incr("search.fallbacks")
             # Fallback to vector search only
             try:
-                query_vector = self.embedder.embed_query(query)
+                if query_vector is None:
+                    query_vector = self.embedder.embed_query(query)
                 results = self.vector_store.search(query_vector, top_k)
                 return results
             except Exception as e2:
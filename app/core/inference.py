@@ -0,0 +1,96 @@
+from pathlib import Path
+from typing import Dict, Any, Optional
+from app.config import (
+    MODEL_CACHE_DIR, INFERENCE_BACKEND, INFERENCE_INTRA_OP_THREADS,
+    INFERENCE_INTER_OP_THREADS, ONNX_QUANTIZATION_CONFIG
+)
+from app.utils.logger import logger
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+_threads_configured = False
+
+def configure_torch_threads():
+    """Apply the configured intra/inter-op thread counts to PyTorch once per process."""
+    global _threads_configured
+    if _threads_configured:
+        return
+    _threads_configured = True
+
+    import torch
+    if INFERENCE_INTRA_OP_THREADS > 0:
+        torch.set_num_threads(INFERENCE_INTRA_OP_THREADS)
+    if INFERENCE_INTER_OP_THREADS > 0:
+        try:
+            torch.set_num_interop_threads(INFERENCE_INTER_OP_THREADS)
+        except RuntimeError as e:
+            # Can only be set before the first parallel region runs
+            logger.warning(f"Could not set inter-op threads: {e}")
+
+def onnx_session_options():
+    """Build ONNX Runtime session options with the configured thread counts."""
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if INFERENCE_INTRA_OP_THREADS > 0:
+        options.intra_op_num_threads = INFERENCE_INTRA_OP_THREADS
+    if INFERENCE_INTER_OP_THREADS > 0:
+        options.inter_op_num_threads = INFERENCE_INTER_OP_THREADS
+    return options
+
+def cache_path(model_name: str, backend: str) -> Path:
+    """Directory holding the exported copy of a model for a backend."""
+    return MODEL_CACHE_DIR / backend / model_name.replace("/", "__")
+
+def onnx_file_name(backend: str) -> str:
+    if backend == "onnx-int8":
+        return f"onnx/model_qint8_{ONNX_QUANTIZATION_CONFIG}.onnx"
+    return "onnx/model.onnx"
+
+def export_model(model_cls, model_name: str, backend: str) -> Path:
+    """Export a model to ONNX (and optionally quantise it) once, caching it under DATA_DIR."""
+    path = cache_path(model_name, backend)
+    if (path / onnx_file_name(backend)).exists():
+        return path
+
+    logger.info(f"Exporting {model_name} for the {backend} backend to {path}")
+    # Loading with backend="onnx" converts the Hugging Face checkpoint on the fly
+    model = model_cls(model_name, backend="onnx")
+    model.save_pretrained(str(path))
+
+    if backend == "onnx-int8":
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+        export_dynamic_quantized_onnx_model(model, ONNX_QUANTIZATION_CONFIG, str(path))
+
+    return path
+
+def load_model(model_cls, model_name: str, backend: Optional[str] = None):
+    """Load a SentenceTransformer or CrossEncoder on the requested inference backend."""
+    backend = backend or INFERENCE_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}', expected one of {BACKENDS}")
+
+    if backend != "torch":
+        try:
+            path = export_model(model_cls, model_name, backend)
+            model_kwargs: Dict[str, Any] = {
+                "file_name": onnx_file_name(backend),
+                "provider": "CPUExecutionProvider",
+                "session_options": onnx_session_options(),
+            }
+            model = model_cls(str(path), backend="onnx", model_kwargs=model_kwargs)
+            logger.info(f"Loaded {model_name} with {backend} backend")
+            return model
+        except Exception as e:
+            logger.warning(f"Failed to load {model_name} with {backend} backend: {e}. Falling back to torch.")
+
+    configure_torch_threads()
+    return model_cls(model_name)
+
+def load_sentence_transformer(model_name: str, backend: Optional[str] = None):
+    from sentence_transformers import SentenceTransformer
+    return load_model(SentenceTransformer, model_name, backend)
+
+def load_cross_encoder(model_name: str, backend: Optional[str] = None):
+    from sentence_transformers import CrossEncoder
+    return load_model(CrossEncoder, model_name, backend)
@@ -0,0 +1,219 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional
+from app.config import (
+    CHUNK_SIZE, CHUNK_OVERLAP, CHILD_CHUNK_SIZE, SMALL_TO_BIG,
+    INGEST_FLUSH_WINDOW, INGEST_MAX_BATCH_CHUNKS, INGEST_JOB_HISTORY
+)
+from app.core.chunking import chunk_documents
+from app.core.collection import DEFAULT_COLLECTION, validate_name
+from app.schemas.ingest import IngestJobResponse
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+class IngestJob:
+    def __init__(self, texts: List[str], collection: str):
+        self.id = uuid.uuid4().hex
+        self.collection = collection
+        self.documents = len(texts)
+        self.chunks, self.metadatas = chunk_documents(
+            texts, CHUNK_SIZE, CHUNK_OVERLAP, CHILD_CHUNK_SIZE if SMALL_TO_BIG else 0
+        )
+        self.chunk_count = len(self.chunks)
+        self.status = "queued"
+        self.batch_size = 0
+        self.error: Optional[str] = None
+        self.submitted_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    def response(self) -> IngestJobResponse:
+        return IngestJobResponse(
+            job_id=self.id,
+            collection=self.collection,
+            status=self.status,
+            documents=self.documents,
+            chunks=self.chunk_count,
+            batch_size=self.batch_size,
+            error=self.error,
+            submitted_at=self.submitted_at,
+            finished_at=self.finished_at,
+        )
+
+class IngestQueue:
+    """Background ingest worker that coalesces many small ingest calls.
+
+    After the first job arrives the worker waits up to `flush_window` for more,
+    then embeds every pending chunk in one batch and commits it as a single
+    new index version per collection. Callers get a job id immediately and
+    poll `status`.
+    """
+
+    def __init__(self, flush_window: float = INGEST_FLUSH_WINDOW, max_batch_chunks: int = INGEST_MAX_BATCH_CHUNKS,
+                 history: int = INGEST_JOB_HISTORY):
+        self.flush_window = flush_window
+        self.max_batch_chunks = max_batch_chunks
+        self.history = history
+        self._pending: Deque[IngestJob] = deque()
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._pending_chunks = 0
+        self._cond = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+        self._busy = False
+
+    def submit(self, texts: List[str], collection: str = DEFAULT_COLLECTION) -> IngestJobResponse:
+        job = IngestJob(texts, validate_name(collection))
+        with self._cond:
+            self._jobs[job.id] = job
+            self._pending.append(job)
+            self._pending_chunks += job.chunk_count
+            self._ensure_worker()
+            self._cond.notify_all()
+        metrics.incr("ingest.jobs")
+        return job.response()
+
+    def status(self, job_id: str) -> IngestJobResponse:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return IngestJobResponse(job_id=job_id, status="unknown")
+            return job.response()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "pending_jobs": len(self._pending),
+                "pending_chunks": self._pending_chunks,
+                "busy": self._busy,
+            }
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every queued job has been committed; False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._busy:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="ingest-worker", daemon=True)
+            self._worker.start()
+
+    def _next_batch(self) -> List[IngestJob]:
+        """Wait for work, then gather jobs for up to flush_window or max_batch_chunks."""
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            deadline = time.monotonic() + self.flush_window
+            while self._pending_chunks < self.max_batch_chunks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = []
+            chunks = 0
+            while self._pending and (not batch or chunks + self._pending[0].chunk_count <= self.max_batch_chunks):
+                job = self._pending.popleft()
+                chunks += job.chunk_count
+                batch.append(job)
+            self._pending_chunks -= chunks
+            self._busy = True
+            for job in batch:
+                job.status = "running"
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                errors = self._commit(batch)
+            except Exception as e:
+                logger.error(f"Ingest batch of {len(batch)} jobs failed: {e}")
+                metrics.incr("ingest.failed_batches")
+                errors = {job.collection: str(e) for job in batch}
+
+            with self._cond:
+                finished_at = time.time()
+                for job in batch:
+                    # Jobs of collections that were published are done even if another collection failed
+                    job.error = errors.get(job.collection)
+                    job.status = "failed" if job.error is not None else "done"
+                    job.finished_at = finished_at
+                    # Only the counts are kept for status polling
+                    job.chunks = []
+                    job.metadatas = []
+                self._busy = False
+                self._trim_history()
+                self._cond.notify_all()
+
+    def _commit(self, batch: List[IngestJob]) -> Dict[str, str]:
+        """Embed the batch and publish it per collection; returns the error of each collection that failed."""
+        from app.core.components import get_embedder, use_collection, notify_index_updated
+
+        groups = self._by_collection(batch)
+        # Chunks in collection order, so each collection's vectors are one contiguous slice
+        chunks = [chunk for jobs in groups.values() for job in jobs for chunk in job.chunks]
+        documents = sum(job.documents for job in batch)
+        for job in batch:
+            job.batch_size = documents
+
+        errors: Dict[str, str] = {}
+        if chunks:
+            with metrics.timer("ingest.batch"):
+                # One embedding pass for every collection in the batch, then one version per collection
+                vectors = get_embedder().embed_documents(chunks)
+                start = 0
+                for name, jobs in groups.items():
+                    metadatas = [metadata for job in jobs for metadata in job.metadatas]
+                    end = start + len(metadatas)
+                    if metadatas:
+                        try:
+                            with use_collection(name) as collection:
+                                collection.vector_store.add(vectors[start:end], metadatas,
+                                                            documents=sum(job.documents for job in jobs))
+                        except Exception as e:
+                            # Collections are published independently; the others still commit
+                            logger.error(f"Ingest into collection {name} failed: {e}")
+                            metrics.incr("ingest.failed_collections")
+                            errors[name] = str(e)
+                        else:
+                            try:
+                                notify_index_updated(name)
+                            except Exception as e:
+                                # The version is already published, so its jobs are still done
+                                logger.warning(f"Refreshing collection {name} after ingest failed: {e}")
+                    start = end
+        metrics.incr("ingest.batches")
+        metrics.incr("ingest.chunks", len(chunks))
+        logger.info(f"Committed ingest batch: {len(batch)} jobs, {documents} documents, {len(chunks)} chunks, "
+                    f"{len(groups) - len(errors)}/{len(groups)} collections")
+        return errors
+
+    @staticmethod
+    def _by_collection(batch: List[IngestJob]) -> "OrderedDict[str, List[IngestJob]]":
+        groups: "OrderedDict[str, List[IngestJob]]" = OrderedDict()
+        for job in batch:
+            groups.setdefault(job.collection, []).append(job)
+        return groups
+
+    def _trim_history(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in ("done", "failed")]
+        for job_id in finished[:max(len(finished) - self.history, 0)]:
+            del self._jobs[job_id]
+
+_queue: Optional[IngestQueue] = None
+_queue_lock = threading.Lock()
+
+def get_ingest_queue() -> IngestQueue:
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = IngestQueue()
+    return _queue
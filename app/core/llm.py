@@ -1,29 +1,137 @@
-from groq import Groq
-from app.config import GROQ_API_KEY, LLM_MODEL
+from app.config import (
+    GROQ_API_KEY, GROQ_BASE_URL, LLM_MODEL, LLM_TIMEOUT, LLM_PREWARM, LLM_PREWARM_IDLE_SECONDS, LLM_PREWARM_TIMEOUT
+)
 from app.core.router import AgentType, AgentConfig
+from app.core.resilience import call_with_retries, get_breaker
+from app.core.model_selection import get_latency
 from app.utils.logger import logger
+from app.utils.metrics import metrics
+from app.utils.singleflight import SingleFlight, normalize_key
 import asyncio
-from typing import AsyncGenerator, Optional
+import threading
+import time
+from typing import Any, AsyncGenerator, Dict, Optional
 
-client = Groq(api_key=GROQ_API_KEY)
+_client = None
+_client_lock = threading.Lock()
+# time.monotonic() of the last request sent on the shared client
+_last_request = 0.0
 
-def generate_answer(context: str, question: str, agent_type: AgentType = AgentType.GENERAL_QA) -> str:
-    """Generate answer using the appropriate agent configuration."""
+# Shares one in-flight completion between concurrent identical requests
+answer_flight = SingleFlight("llm")
+
+def get_client():
+    """Return the shared Groq client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from groq import Groq
+                # Retries are handled by app.core.resilience so they respect the call deadline
+                _client = Groq(api_key=GROQ_API_KEY, base_url=GROQ_BASE_URL or None, max_retries=0)
+    return _client
+
+def warm_client():
+    """Get the LLM connection ready while the rest of a request is still running.
+
+    Creates the client (importing groq is slow the first time) and, when its
+    pooled connection has probably expired, lists models so the TCP and TLS
+    handshakes are done before the completion is sent. Failures are ignored:
+    the completion will simply connect itself.
+    """
+    global _last_request
+    if not LLM_PREWARM:
+        return
     try:
-        config = AgentConfig.get_agent_config(agent_type)
+        client = get_client()
+        if time.monotonic() - _last_request < LLM_PREWARM_IDLE_SECONDS:
+            return
+        _last_request = time.monotonic()
+        with metrics.timer("llm.prewarm"):
+            client.models.list(timeout=LLM_PREWARM_TIMEOUT)
+    except Exception as e:
+        logger.debug(f"LLM connection warm-up failed: {e}")
 
-        # Use agent-specific model if available, otherwise fall back to default
-        model = config.get("model", LLM_MODEL)
-        temperature = config.get("temperature", 0.2)
-        max_tokens = config.get("max_tokens", 1000)
-        system_prompt = config.get("system_prompt", "Answer using the provided context only.")
+def _record_call(model: str, response, started_ns: int):
+    """Record latency and token usage for a completed completion call."""
+    elapsed = time.perf_counter_ns() - started_ns
+    metrics.observe("llm.generate", elapsed)
+    metrics.observe(f"llm.model.{model}", elapsed)
+    metrics.incr("llm.calls")
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        metrics.incr("llm.prompt_tokens", getattr(usage, "prompt_tokens", 0) or 0)
+        metrics.incr("llm.completion_tokens", completion_tokens)
+        get_latency(model).record(elapsed / 1e9, completion_tokens)
+
+def _answer_key(context: str, question: str, config: Dict[str, Any]) -> tuple:
+    """Coalescing key: normalized prompt, model, temperature and answer length."""
+    prompt = f"{config.get('system_prompt', '')}\n{context}\n{question}"
+    return (normalize_key(prompt), config.get("model", LLM_MODEL), config.get("temperature", 0.2),
+            config.get("max_tokens", 1000))
+
+def generate_answer(context: str, question: str, agent_type: AgentType = AgentType.GENERAL_QA,
+                    deadline: Optional[float] = None, quality: Optional[str] = None) -> str:
+    """Generate answer using the appropriate agent configuration.
+
+    `deadline` (time.monotonic()) and `quality` let the model and max_tokens
+    adapt to the caller's latency budget; see AgentConfig.for_request.
+    """
+    config = AgentConfig.for_request(agent_type, deadline, quality)
+    return answer_flight.do(
+        _answer_key(context, question, config),
+        lambda: _generate_answer(context, question, agent_type, config)
+    )
 
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
+async def generate_answer_async(context: str, question: str, agent_type: AgentType = AgentType.GENERAL_QA,
+                                deadline: Optional[float] = None, quality: Optional[str] = None) -> str:
+    """Async variant of generate_answer that doesn't block the event loop."""
+    config = AgentConfig.for_request(agent_type, deadline, quality)
+    return await answer_flight.do_async(
+        _answer_key(context, question, config),
+        lambda: _generate_answer(context, question, agent_type, config)
+    )
+
+def _select_model(model: str) -> str:
+    """Route away from a model whose circuit breaker is open."""
+    if model != LLM_MODEL and not get_breaker(model).allow():
+        metrics.incr("llm.breaker_rerouted")
+        logger.warning(f"Circuit open for {model}, using fallback model {LLM_MODEL}")
+        return LLM_MODEL
+    return model
+
+def _complete(model: str, messages: list, deadline: float, **params):
+    """Run a chat completion with retries, optional hedging and the remaining deadline as timeout."""
+    global _last_request
+    _last_request = time.monotonic()
+    started = time.perf_counter_ns()
+    response = call_with_retries(
+        model,
+        lambda timeout: get_client().chat.completions.create(
+            model=model, messages=messages, timeout=timeout, **params
+        ),
+        deadline
+    )
+    _record_call(model, response, started)
+    return response
+
+def _generate_answer(context: str, question: str, agent_type: AgentType, config: Dict[str, Any]) -> str:
+    # Use the model chosen for this request, otherwise fall back to default
+    model = _select_model(config.get("model", LLM_MODEL))
+    temperature = config.get("temperature", 0.2)
+    max_tokens = config.get("max_tokens", 1000)
+    system_prompt = config.get("system_prompt", "Answer using the provided context only.")
+    deadline = time.monotonic() + config.get("timeout", LLM_TIMEOUT)
+
+    try:
+        response = _complete(
+            model,
+            [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": f"Context:\n{context}\n\nQuestion:\n{question}"}
             ],
+            deadline,
             temperature=temperature,
             max_tokens=max_tokens
         )
@@ -33,51 +141,82 @@ def generate_answer(context: str, question: str, agent_type: AgentType = AgentTy
 
     except Exception as e:
         logger.error(f"Error generating answer with {agent_type.value}: {e}")
-        # Fallback to default model
-        response = client.chat.completions.create(
-            model=LLM_MODEL,
-            messages=[
+        metrics.incr("llm.errors")
+        # Only fall back to the default model if it's a different model and time remains
+        if model == LLM_MODEL or deadline - time.monotonic() <= 0:
+            raise
+        metrics.incr("llm.fallbacks")
+        response = _complete(
+            LLM_MODEL,
+            [
                 {"role": "system", "content": "Answer using the provided context only."},
                 {"role": "user", "content": f"Context:\n{context}\n\nQuestion:\n{question}"}
             ],
-            temperature=0.2
+            deadline,
+            temperature=0.2,
+            max_tokens=max_tokens
         )
         return response.choices[0].message.content
 
-async def generate_answer_stream(context: str, question: str, agent_type: AgentType = AgentType.GENERAL_QA) -> AsyncGenerator[str, None]:
+async def generate_answer_stream(context: str, question: str, agent_type: AgentType = AgentType.GENERAL_QA,
+                                 deadline: Optional[float] = None, quality: Optional[str] = None) -> AsyncGenerator[str, None]:
     """Generate streaming answer using the appropriate agent configuration."""
+    global _last_request
     try:
-        config = AgentConfig.get_agent_config(agent_type)
+        config = AgentConfig.for_request(agent_type, deadline, quality)
 
-        model = config.get("model", LLM_MODEL)
+        model = _select_model(config.get("model", LLM_MODEL))
         temperature = config.get("temperature", 0.2)
         max_tokens = config.get("max_tokens", 1000)
         system_prompt = config.get("system_prompt", "Answer using the provided context only.")
+        call_deadline = time.monotonic() + config.get("timeout", LLM_TIMEOUT)
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"Context:\n{context}\n\nQuestion:\n{question}"}
+        ]
 
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Context:\n{context}\n\nQuestion:\n{question}"}
-            ],
-            temperature=temperature,
-            max_tokens=max_tokens,
-            stream=True
+        _last_request = time.monotonic()
+        started = time.perf_counter_ns()
+        # Opening the stream is retried and fed to the breaker like any completion; it is not
+        # hedged, since a second stream would generate the whole answer again
+        response = await asyncio.to_thread(
+            call_with_retries,
+            model,
+            lambda timeout: get_client().chat.completions.create(
+                model=model, messages=messages, temperature=temperature, max_tokens=max_tokens,
+                stream=True, timeout=timeout
+            ),
+            call_deadline,
+            hedge=False
         )
 
         logger.info(f"Streaming answer using {agent_type.value} agent with model {model}")
 
         full_response = ""
+        first_token = None
+        chunks = 0
         for chunk in response:
             if chunk.choices[0].delta.content:
                 content = chunk.choices[0].delta.content
+                if not full_response:
+                    first_token = time.perf_counter_ns() - started
+                    metrics.observe("llm.stream.first_token", first_token)
                 full_response += content
+                chunks += 1
                 yield content
 
+        elapsed = time.perf_counter_ns() - started
+        metrics.observe("llm.stream", elapsed)
+        metrics.observe(f"llm.model.{model}", elapsed)
+        metrics.incr("llm.calls")
+        if first_token is not None:
+            # Streamed chunks are roughly one token each
+            get_latency(model).record(elapsed / 1e9, chunks, first_token / 1e9)
         logger.info(f"Completed streaming response: {len(full_response)} chars")
 
     except Exception as e:
         logger.error(f"Error in streaming answer with {agent_type.value}: {e}")
+        metrics.incr("llm.errors")
         # Fallback to non-streaming
-        fallback_response = generate_answer(context, question, agent_type)
+        fallback_response = await generate_answer_async(context, question, agent_type, deadline, quality)
         yield fallback_response
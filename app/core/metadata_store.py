@@ -0,0 +1,95 @@
+import json
+import mmap
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+import numpy as np
+
+class MetadataStore:
+    """Chunk metadata as JSON lines plus an int64 offsets file, read through mmap.
+
+    Both files are append-only, so any number of processes can map them and
+    share the page cache instead of each holding a parsed copy. `count` limits
+    the visible rows to what the manifest has published; rows appended after
+    that are ignored until the reader reopens.
+    """
+
+    def __init__(self, path: Path, count: Optional[int] = None):
+        self.path = path
+        self.offsets_path = path.with_suffix(".offsets")
+        self._count = 0
+        self._data = None
+        self._offsets = None
+        self._open(count)
+
+    def _open(self, count: Optional[int] = None):
+        self.close()
+        if not self.path.exists() or not self.offsets_path.exists():
+            self._count = 0
+            return
+
+        available = self.offsets_path.stat().st_size // 8
+        self._count = available if count is None else min(count, available)
+        if self._count == 0:
+            return
+        self._offsets = np.memmap(self.offsets_path, dtype="int64", mode="r", shape=(available,))
+        with open(self.path, "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        if self._data is not None:
+            self._data.close()
+        self._data = None
+        self._offsets = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, idx: int) -> Dict[str, Any]:
+        if idx < 0:
+            idx += self._count
+        if not 0 <= idx < self._count:
+            raise IndexError(f"metadata index {idx} out of range")
+        start = int(self._offsets[idx])
+        end = self._data.find(b"\n", start)
+        return json.loads(self._data[start:end if end != -1 else len(self._data)])
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for idx in range(self._count):
+            yield self[idx]
+
+    def append(self, metadatas: List[Dict[str, Any]]):
+        """Append rows; readers see them once they reopen with the new count."""
+        # Drop rows past the published count left behind by an interrupted write
+        self._truncate(self._count)
+
+        start = self.path.stat().st_size if self.path.exists() else 0
+        lines = [json.dumps(m, ensure_ascii=False).encode("utf-8") + b"\n" for m in metadatas]
+        offsets = np.cumsum([start] + [len(line) for line in lines[:-1]], dtype="int64")
+        with open(self.path, "ab") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.offsets_path, "ab") as f:
+            f.write(offsets.tobytes())
+        self._open()
+
+    def _truncate(self, count: int):
+        if not self.offsets_path.exists():
+            return
+        if self.offsets_path.stat().st_size // 8 > count:
+            end = int(self._offsets[count]) if count and self._offsets is not None else 0
+            self.close()
+            os.truncate(self.offsets_path, count * 8)
+            os.truncate(self.path, end)
+
+    @classmethod
+    def create(cls, path: Path, metadatas: List[Dict[str, Any]]) -> "MetadataStore":
+        """Write a fresh store, e.g. when migrating from metadata.json."""
+        for stale in (path, path.with_suffix(".offsets")):
+            if stale.exists():
+                stale.unlink()
+        store = cls(path)
+        if metadatas:
+            store.append(metadatas)
+        return store
@@ -0,0 +1,125 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.config import (
+    LLM_MODEL, LLM_MODEL_LADDER, LLM_LATENCY_WINDOW, LLM_PRIOR_TOKENS_PER_SECOND, LLM_PRIOR_OVERHEAD,
+    LLM_MIN_ANSWER_TOKENS, LLM_LATENCY_SAFETY
+)
+from app.core.resilience import get_breaker
+from app.utils.metrics import metrics
+
+QUALITY_TIERS = ("fast", "balanced", "best")
+# Calls needed before measurements replace the configured priors
+MIN_SAMPLES = 5
+
+class ModelLatency:
+    """Rolling latency model of one LLM: fixed overhead plus completion tokens / throughput.
+
+    Both terms are fitted by least squares over the last `window` calls, so a
+    provider slowdown shows up within a few requests. With too few samples, or
+    samples that don't vary in length, streamed first-token times or the
+    configured priors fill the gaps.
+    """
+
+    def __init__(self, model: str, window: int = LLM_LATENCY_WINDOW):
+        self.model = model
+        self._samples = deque(maxlen=window)
+        self._first_tokens = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, elapsed: float, completion_tokens: int, first_token: Optional[float] = None):
+        with self._lock:
+            self._samples.append((completion_tokens, elapsed))
+            if first_token is not None:
+                self._first_tokens.append(first_token)
+
+    def estimate(self) -> Tuple[float, float]:
+        """(overhead seconds, tokens per second)."""
+        with self._lock:
+            samples = list(self._samples)
+            first_tokens = list(self._first_tokens)
+
+        # Streamed first-token times only fill in the intercept, and only once there are enough to trust
+        first_token = float(np.median(first_tokens)) if len(first_tokens) >= MIN_SAMPLES else None
+        if len(samples) < MIN_SAMPLES:
+            return (LLM_PRIOR_OVERHEAD if first_token is None else first_token), LLM_PRIOR_TOKENS_PER_SECOND
+
+        tokens, elapsed = np.asarray(samples, dtype="float64").T
+        if tokens.std() > 0:
+            slope, intercept = np.polyfit(tokens, elapsed, 1)
+            if slope > 0:
+                if intercept < 0 and first_token is not None:
+                    intercept = first_token
+                return max(float(intercept), 0.0), 1.0 / float(slope)
+        overhead = LLM_PRIOR_OVERHEAD if first_token is None else first_token
+        decode = elapsed - overhead
+        rates = tokens[decode > 0] / decode[decode > 0]
+        return overhead, float(np.median(rates)) if len(rates) else LLM_PRIOR_TOKENS_PER_SECOND
+
+    def predict(self, max_tokens: int) -> float:
+        overhead, rate = self.estimate()
+        return (overhead + max_tokens / rate) * LLM_LATENCY_SAFETY
+
+    def tokens_within(self, seconds: float) -> int:
+        """Completion tokens expected to fit in `seconds`, after the safety margin."""
+        overhead, rate = self.estimate()
+        return max(int((seconds / LLM_LATENCY_SAFETY - overhead) * rate), 0)
+
+    def stats(self) -> Dict[str, Any]:
+        overhead, rate = self.estimate()
+        return {"samples": len(self._samples), "overhead_seconds": round(overhead, 3),
+                "tokens_per_second": round(rate, 1)}
+
+_latencies: Dict[str, ModelLatency] = {}
+_latencies_lock = threading.Lock()
+
+def get_latency(model: str) -> ModelLatency:
+    with _latencies_lock:
+        if model not in _latencies:
+            _latencies[model] = ModelLatency(model)
+        return _latencies[model]
+
+def latency_stats() -> Dict[str, Any]:
+    with _latencies_lock:
+        return {model: latency.stats() for model, latency in _latencies.items()}
+
+def _ladder(preferred: str, quality: Optional[str]) -> List[str]:
+    """Candidate models, largest first, capped by the quality tier."""
+    ladder = [m.strip() for m in LLM_MODEL_LADDER.split(",") if m.strip()] or [LLM_MODEL]
+    if preferred not in ladder:
+        ladder.insert(0, preferred)
+    if quality == "best":
+        return ladder
+    if quality == "fast":
+        return ladder[-1:]
+    return ladder[ladder.index(preferred):]
+
+def choose_model(preferred: str, max_tokens: int, deadline: Optional[float] = None,
+                 quality: Optional[str] = None) -> Tuple[str, int]:
+    """Pick the largest model expected to answer before `deadline`, and a max_tokens that fits.
+
+    Without a deadline the quality tier alone decides. With one, models with an
+    open circuit are skipped and each candidate must fit at least
+    LLM_MIN_ANSWER_TOKENS in the remaining time; if none does, the fastest is used.
+    """
+    if quality is not None and quality not in QUALITY_TIERS:
+        raise ValueError(f"Unknown quality tier {quality!r}; expected one of {', '.join(QUALITY_TIERS)}")
+    candidates = _ladder(preferred, quality)
+    if deadline is None:
+        return candidates[0], max_tokens
+
+    remaining = deadline - time.monotonic()
+    available = [m for m in candidates if get_breaker(m).state != "open"] or candidates
+    floor = min(LLM_MIN_ANSWER_TOKENS, max_tokens)
+    for model in available:
+        latency = get_latency(model)
+        if latency.predict(floor) <= remaining:
+            if model != candidates[0]:
+                metrics.incr("llm.budget_downgrades")
+            return model, min(max_tokens, max(latency.tokens_within(remaining), floor))
+
+    model = min(available, key=lambda m: get_latency(m).predict(floor))
+    metrics.incr("llm.budget_exceeded")
+    return model, floor
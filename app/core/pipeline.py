@@ -0,0 +1,146 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from app.config import PIPELINE_WORKERS
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ThreadPoolExecutor:
+    """Return the shared pipeline thread pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="pipeline")
+    return _pool
+
+class Fork:
+    """A call started on the pipeline pool that the caller joins later.
+
+    If no worker has picked it up by the time it is joined, the caller runs it
+    itself. Stages can therefore fork from inside the pool without deadlocking
+    it when every worker is busy.
+    """
+
+    def __init__(self, fn: Callable[[], Any]):
+        self._fn = fn
+        self._future: Future = get_pool().submit(fn)
+
+    def join(self) -> Any:
+        if self._future.cancel():
+            self._future = Future()
+            try:
+                self._future.set_result(self._fn())
+            except BaseException as e:
+                self._future.set_exception(e)
+        return self._future.result()
+
+def parallel_map(fn: Callable[[Any], Any], items: Iterable[Any]) -> List[Any]:
+    """map() with every item but the first forked to the pool; the first runs on the calling thread."""
+    items = list(items)
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+    forks = [Fork(lambda item=item: fn(item)) for item in items[1:]]
+    return [fn(items[0])] + [fork.join() for fork in forks]
+
+class PipelineRun:
+    """Results and stage timings of one Pipeline.run()."""
+
+    def __init__(self, name: str, deps: Dict[str, Tuple[str, ...]]):
+        self.name = name
+        self.deps = deps
+        self.results: Dict[str, Any] = {}
+        self.spans: Dict[str, Tuple[int, int]] = {}
+        self.started = time.perf_counter_ns()
+        self.elapsed_ns = 0
+
+    def _run_stage(self, stage: str, fn: Callable, args: List[Any]) -> Any:
+        start = time.perf_counter_ns()
+        try:
+            return fn(*args)
+        finally:
+            self.spans[stage] = (start, time.perf_counter_ns())
+
+    @property
+    def critical_path(self) -> List[str]:
+        """From the last stage to finish back through the dependency that finished last."""
+        if not self.spans:
+            return []
+        stage = max(self.spans, key=lambda s: self.spans[s][1])
+        path = [stage]
+        while self.deps[stage]:
+            stage = max(self.deps[stage], key=lambda d: self.spans[d][1])
+            path.append(stage)
+        return path[::-1]
+
+    def stage_ms(self) -> Dict[str, float]:
+        return {stage: round((end - start) / 1e6, 3) for stage, (start, end) in self.spans.items()}
+
+    def summary(self) -> Dict[str, Any]:
+        stages = self.stage_ms()
+        return {
+            "total_ms": round(self.elapsed_ns / 1e6, 3),
+            "stage_sum_ms": round(sum(stages.values()), 3),
+            "critical_path": self.critical_path,
+            "stages": stages,
+        }
+
+    def _finish(self):
+        self.elapsed_ns = time.perf_counter_ns() - self.started
+        for stage, (start, end) in self.spans.items():
+            metrics.observe(f"{self.name}.stage.{stage}", end - start)
+        metrics.observe(f"{self.name}.critical_path", self.elapsed_ns)
+        metrics.observe(f"{self.name}.stage_sum", sum(end - start for start, end in self.spans.values()))
+        for stage in self.critical_path:
+            metrics.incr(f"{self.name}.critical.{stage}")
+        summary = self.summary()
+        logger.info(f"Pipeline {self.name}: {summary['total_ms']}ms "
+                    f"(stages sum to {summary['stage_sum_ms']}ms), critical path "
+                    + " -> ".join(f"{stage} {summary['stages'][stage]}ms" for stage in summary["critical_path"]))
+
+class Pipeline:
+    """A DAG of named stages, each started on the pipeline pool once its dependencies finish.
+
+    A stage's function receives its dependencies' results positionally, and
+    dependencies must be added first, so the graph cannot have cycles. End-to-end
+    latency is then that of the critical path rather than the sum of all stages;
+    each run records per-stage timings, the critical path's length and how often
+    each stage lies on it.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._stages: Dict[str, Tuple[Callable, Tuple[str, ...]]] = {}
+
+    def stage(self, name: str, fn: Callable, *deps: str) -> "Pipeline":
+        unknown = [dep for dep in deps if dep not in self._stages]
+        if unknown:
+            raise ValueError(f"Stage {name!r} depends on unknown stages: {', '.join(unknown)}")
+        self._stages[name] = (fn, deps)
+        return self
+
+    def run(self) -> PipelineRun:
+        """Run every stage; the first stage error is raised once it is seen."""
+        run = PipelineRun(self.name, {name: deps for name, (_, deps) in self._stages.items()})
+        pending = dict(self._stages)
+        running: Dict[Future, str] = {}
+        try:
+            while pending or running:
+                ready = [name for name, (_, deps) in pending.items() if all(dep in run.results for dep in deps)]
+                for name in ready:
+                    fn, deps = pending.pop(name)
+                    args = [run.results[dep] for dep in deps]
+                    running[get_pool().submit(run._run_stage, name, fn, args)] = name
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    run.results[running.pop(future)] = future.result()
+        except BaseException:
+            for future in running:
+                future.cancel()
+            raise
+        run._finish()
+        return run
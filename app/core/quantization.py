@@ -0,0 +1,213 @@
+import numpy as np
+import json
+import argparse
+import os
+import time
+from typing import List, Dict, Any, Tuple, Optional
+from app.utils.lazy import lazy_import
+from app.utils.logger import logger
+
+faiss = lazy_import("faiss")
+
+STORAGE_TYPES = ("float32", "float16", "int8", "binary")
+
+# Bytes needed to store one component of a vector in each format
+BYTES_PER_DIM = {
+    "float32": 4.0,
+    "float16": 2.0,
+    "int8": 1.0,
+    "binary": 1.0 / 8,
+}
+
+# ANN indexes are trained on at most this many sampled vectors
+MAX_TRAINING_VECTORS = 100_000
+
+def validate_storage(storage: str) -> str:
+    """Validate a storage type name."""
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Unknown vector storage '{storage}', expected one of {STORAGE_TYPES}")
+    return storage
+
+def is_binary(storage: str) -> bool:
+    return storage == "binary"
+
+def create_index(storage: str, dim: int, factory: Optional[str] = None):
+    """Create an empty FAISS index for the given storage type, or an ANN index from a factory string.
+
+    ANN factories ("IVF256,Flat", "HNSW32", "IVF256,PQ16", ...) bring their own
+    codes, so they only replace float32 storage.
+    """
+    validate_storage(storage)
+    if factory is not None:
+        if storage != "float32":
+            raise ValueError(f"ANN index '{factory}' requires float32 storage, not '{storage}'")
+        return faiss.index_factory(dim, factory, faiss.METRIC_L2)
+    if storage == "float16":
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_L2)
+    if storage == "int8":
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+    if storage == "binary":
+        # Binary codes are padded to whole bytes
+        return faiss.IndexBinaryFlat(((dim + 7) // 8) * 8)
+    return faiss.IndexFlatL2(dim)
+
+def encode(storage: str, vectors: np.ndarray) -> np.ndarray:
+    """Convert float vectors into the representation the index expects."""
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    if is_binary(storage):
+        return np.packbits(vectors > 0, axis=1)
+    return vectors
+
+def read_index(storage: str, path: str, mmap: bool = False):
+    """Read an index; with mmap=True it is mapped read-only so processes share its pages."""
+    if mmap:
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+        try:
+            if is_binary(storage):
+                return faiss.read_index_binary(path, flags)
+            return faiss.read_index(path, flags)
+        except RuntimeError as e:
+            # Not every index type (or FAISS build) supports mapping its codes
+            logger.warning(f"Cannot mmap {path}, loading it into memory: {e}")
+    if is_binary(storage):
+        return faiss.read_index_binary(path)
+    return faiss.read_index(path)
+
+def write_index(storage: str, index, path: str):
+    """Write to a temporary file and rename, so processes mapping the old file are unaffected."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if is_binary(storage):
+        faiss.write_index_binary(index, tmp_path)
+    else:
+        faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+def clone_index(storage: str, index):
+    """Deep copy an index so it can be extended without touching readers of the original."""
+    if is_binary(storage):
+        return faiss.clone_binary_index(index)
+    return faiss.clone_index(index)
+
+def bytes_per_vector(storage: str, dim: int) -> float:
+    """Approximate in-memory code size for one vector."""
+    if is_binary(storage):
+        return float((dim + 7) // 8)
+    return BYTES_PER_DIM[storage] * dim
+
+def rescore(query_vector: np.ndarray, candidate_ids: List[int], full_vectors: np.ndarray,
+            top_k: int) -> List[Tuple[int, float]]:
+    """Re-rank candidates by exact L2 distance against full-precision vectors."""
+    if not candidate_ids:
+        return []
+
+    ids = np.asarray(candidate_ids, dtype="int64")
+    candidates = np.asarray(full_vectors[ids], dtype="float32")
+    diffs = candidates - np.asarray(query_vector, dtype="float32")
+    distances = np.einsum("ij,ij->i", diffs, diffs)
+
+    order = np.argsort(distances)[:top_k]
+    return [(int(ids[i]), float(distances[i])) for i in order]
+
+def is_lossy(factory: Optional[str]) -> bool:
+    """Whether an ANN index stores compressed codes, so its distances are worth rescoring."""
+    return factory is not None and any(code in factory for code in ("PQ", "SQ", "LSH"))
+
+def needs_training(factory: Optional[str]) -> bool:
+    """Whether an ANN index learns centroids or codebooks that go stale as the corpus grows."""
+    return factory is not None and any(code in factory for code in ("IVF", "PQ", "SQ"))
+
+def set_search_params(index, params: Optional[str]):
+    """Apply runtime ANN parameters such as "nprobe=16" or "efSearch=64"."""
+    if params:
+        faiss.ParameterSpace().set_index_parameters(index, params)
+
+def build_index(storage: str, vectors: np.ndarray, factory: Optional[str] = None):
+    """Build and populate an index of the given storage type or ANN factory."""
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    index = create_index(storage, vectors.shape[1], factory)
+    if not index.is_trained:
+        training = vectors
+        if factory is not None and len(vectors) > MAX_TRAINING_VECTORS:
+            rows = np.random.default_rng(0).choice(len(vectors), MAX_TRAINING_VECTORS, replace=False)
+            training = vectors[np.sort(rows)]
+        index.train(training)
+    index.add(encode(storage, vectors))
+    return index
+
+def search_index(storage: str, index, queries: np.ndarray, top_k: int,
+                 full_vectors: Optional[np.ndarray] = None,
+                 rescore_factor: int = 1) -> List[List[Tuple[int, float]]]:
+    """Search an index, optionally rescoring an enlarged candidate set exactly."""
+    queries = np.ascontiguousarray(queries, dtype="float32")
+    use_rescore = full_vectors is not None and rescore_factor > 1
+    fetch_k = top_k * rescore_factor if use_rescore else top_k
+
+    D, I = index.search(encode(storage, queries), fetch_k)
+
+    results = []
+    for qi in range(len(queries)):
+        ids = [int(i) for i in I[qi] if i >= 0]
+        if use_rescore:
+            results.append(rescore(queries[qi], ids, full_vectors, top_k))
+        else:
+            results.append([(int(i), float(d)) for i, d in zip(I[qi], D[qi]) if i >= 0][:top_k])
+    return results
+
+def measure_recall(vectors: np.ndarray, queries: np.ndarray, top_k: int = 10,
+                   storages: Tuple[str, ...] = STORAGE_TYPES,
+                   rescore_factor: int = 4) -> List[Dict[str, Any]]:
+    """Report recall@k and memory for each storage type against exact Flat search."""
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    dim = vectors.shape[1]
+
+    exact = faiss.IndexFlatL2(dim)
+    exact.add(vectors)
+    _, truth = exact.search(np.ascontiguousarray(queries, dtype="float32"), top_k)
+    truth_sets = [set(int(i) for i in row if i >= 0) for row in truth]
+
+    report = []
+    for storage in storages:
+        index = build_index(storage, vectors)
+        for factor in sorted({1, rescore_factor}):
+            start = time.perf_counter()
+            results = search_index(storage, index, queries, top_k,
+                                   full_vectors=vectors if factor > 1 else None,
+                                   rescore_factor=factor)
+            elapsed = time.perf_counter() - start
+
+            hits = [len(truth_sets[qi] & {i for i, _ in res}) / max(len(truth_sets[qi]), 1)
+                    for qi, res in enumerate(results)]
+            report.append({
+                "storage": storage,
+                "rescore_factor": factor,
+                f"recall@{top_k}": round(float(np.mean(hits)), 4) if hits else 0.0,
+                "bytes_per_vector": bytes_per_vector(storage, dim),
+                "compression": round(bytes_per_vector("float32", dim) / bytes_per_vector(storage, dim), 1),
+                "ms_per_query": round(elapsed * 1000 / max(len(queries), 1), 3),
+            })
+    return report
+
+def main():
+    """Measure recall loss of each storage type on the persisted corpus."""
+    from app.core.vector_store import load_full_vectors
+
+    parser = argparse.ArgumentParser(description="Measure quantised storage recall against exact search")
+    parser.add_argument("--queries", type=int, default=200, help="Number of stored vectors to sample as queries")
+    parser.add_argument("--k", type=int, default=10, help="Recall cut-off")
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    args = parser.parse_args()
+
+    vectors = load_full_vectors()
+    if vectors is None or len(vectors) == 0:
+        print(json.dumps({"error": "No full-precision vectors found; ingest documents first"}))
+        return
+
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    queries = np.asarray(vectors[sample], dtype="float32")
+
+    report = measure_recall(np.asarray(vectors), queries, args.k, rescore_factor=args.rescore_factor)
+    print(json.dumps({"vectors": len(vectors), "queries": len(queries), "results": report}, indent=2))
+
+if __name__ == "__main__":
+    main()
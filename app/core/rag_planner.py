@@ -1,22 +1,93 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from app.core.router import QueryRouter, AgentType
 from app.core.llm import generate_answer
+from app.core.pipeline import parallel_map
 from app.core.retriever import Retriever
 from app.core.vector_store import VectorStore
 from app.core.context_compressor import ContextCompressor
 from app.utils.logger import logger
+from app.utils.metrics import metrics
+from app.utils.singleflight import normalize_key
+import numpy as np
 import re
 
+def _evidence_rows(doc: Dict[str, Any]) -> Tuple:
+    """Index rows a retrieved doc covers: a parent window's children, its chunk, or its text if it has no id."""
+    if doc.get("chunk_ids"):
+        return tuple(doc["chunk_ids"])
+    if doc.get("chunk_id") is not None:
+        return (doc["chunk_id"],)
+    return (("text", doc.get("text", "")),)
+
+class RetrievalWorkspace:
+    """Retrieval state shared by the sub-queries of one plan.
+
+    Sub-query vectors are embedded together up front, and each distinct
+    (normalized) query is retrieved once, so a repeated sub-query reuses its
+    candidates and rerank scores. Every retrieved chunk enters the evidence
+    pool once, keyed by index row: overlapping results are neither listed
+    twice as sources nor sent twice to synthesis.
+    """
+
+    def __init__(self, retriever: Retriever):
+        self.retriever = retriever
+        self.evidence: List[Dict[str, Any]] = []
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._results: Dict[str, List[Dict[str, Any]]] = {}
+        self._covered = set()
+
+    def embed(self, queries: List[str]):
+        """Embed the queries not seen yet; with query batching on they share one forward pass."""
+        missing: Dict[str, str] = {}
+        for query in queries:
+            key = normalize_key(query)
+            if key not in self._vectors:
+                missing.setdefault(key, query)
+        if not missing:
+            return
+        try:
+            vectors = parallel_map(self.retriever.hybrid_search.embedder.embed_query, list(missing.values()))
+            self._vectors.update(zip(missing, vectors))
+        except Exception as e:
+            # Retrieval embeds the query itself
+            logger.warning(f"Embedding sub-queries failed: {e}")
+
+    def retrieve(self, query: str) -> List[Dict[str, Any]]:
+        key = normalize_key(query)
+        if key in self._results:
+            metrics.incr("planner.workspace.hits")
+            return list(self._results[key])
+        self.embed([query])
+        docs = self.retriever.retrieve(query, self._vectors.get(key))
+        self._results[key] = docs
+        self._add_evidence(docs)
+        return list(docs)
+
+    def _add_evidence(self, docs: List[Dict[str, Any]]):
+        for doc in docs:
+            rows = _evidence_rows(doc)
+            if self._covered.issuperset(rows):
+                metrics.incr("planner.workspace.duplicates")
+                continue
+            self._covered.update(rows)
+            self.evidence.append(doc)
+
 class RAGPlanner:
-    def __init__(self):
+    def __init__(self, vector_store: Optional[VectorStore] = None, deadline: Optional[float] = None,
+                 quality: Optional[str] = None):
         self.router = QueryRouter()
-        self.context_compressor = ContextCompressor()
+        self.context_compressor = ContextCompressor(vector_store=vector_store)
+        # Latency budget of the request; every LLM call in the plan shares it
+        self.deadline = deadline
+        self.quality = quality
 
+    @metrics.timed("planner.total")
     def plan_and_execute(self, query: str, retriever: Retriever) -> Dict[str, Any]:
         """Plan and execute a complex query using multiple agents."""
         try:
             # Analyze query complexity
-            sub_queries = self._decompose_query(query)
+            with metrics.timer("planner.decompose"):
+                sub_queries = self._decompose_query(query)
 
             if len(sub_queries) <= 1:
                 # Simple query - use single agent
@@ -59,7 +130,8 @@ class RAGPlanner:
 
     def _execute_simple_query(self, query: str, retriever: Retriever) -> Dict[str, Any]:
         """Execute a simple query with single agent."""
-        agent_type = self.router.route_query(query)
+        with metrics.timer("planner.route"):
+            agent_type = self.router.route_query(query)
 
         # Retrieve documents
         docs = retriever.retrieve(query)
@@ -68,7 +140,7 @@ class RAGPlanner:
         context = self.context_compressor.compress_context(query, docs)
 
         # Generate answer
-        answer = generate_answer(context, query, agent_type)
+        answer = generate_answer(context, query, agent_type, self.deadline, self.quality)
 
         return {
             "answer": answer,
@@ -81,23 +153,24 @@ class RAGPlanner:
     def _execute_complex_query(self, original_query: str, sub_queries: List[str], retriever: Retriever) -> Dict[str, Any]:
         """Execute a complex query by coordinating multiple agents."""
         sub_answers = []
-        all_sources = []
+        workspace = RetrievalWorkspace(retriever)
+        workspace.embed(sub_queries)
 
         for i, sub_query in enumerate(sub_queries):
             logger.info(f"Processing sub-query {i+1}/{len(sub_queries)}: {sub_query}")
 
             # Route each sub-query to appropriate agent
-            agent_type = self.router.route_query(sub_query)
+            with metrics.timer("planner.route"):
+                agent_type = self.router.route_query(sub_query)
 
-            # Retrieve documents for this sub-query
-            docs = retriever.retrieve(sub_query)
-            all_sources.extend(docs)
+            # Retrieve documents for this sub-query, sharing work and evidence with the others
+            docs = workspace.retrieve(sub_query)
 
             # Compress context
             context = self.context_compressor.compress_context(sub_query, docs)
 
             # Generate answer for sub-query
-            sub_answer = generate_answer(context, sub_query, agent_type)
+            sub_answer = generate_answer(context, sub_query, agent_type, self.deadline, self.quality)
 
             sub_answers.append({
                 "sub_query": sub_query,
@@ -106,34 +179,39 @@ class RAGPlanner:
                 "sources": docs
             })
 
-        # Synthesize final answer
-        final_answer = self._synthesize_answers(original_query, sub_answers)
+        # Synthesize final answer from the sub-answers and the deduplicated evidence
+        with metrics.timer("planner.synthesis"):
+            evidence = self.context_compressor.compress_context(original_query, workspace.evidence)
+            final_answer = self._synthesize_answers(original_query, sub_answers, evidence)
+        metrics.incr("planner.sub_queries", len(sub_queries))
 
         return {
             "answer": final_answer,
             "agent_used": "multi_agent_planner",
-            "sources": all_sources,
+            "sources": workspace.evidence,
             "query_type": "complex",
             "sub_queries": len(sub_queries),
             "sub_answers": sub_answers
         }
 
-    def _synthesize_answers(self, original_query: str, sub_answers: List[Dict[str, Any]]) -> str:
-        """Synthesize a coherent answer from multiple sub-answers."""
+    def _synthesize_answers(self, original_query: str, sub_answers: List[Dict[str, Any]], evidence: str = "") -> str:
+        """Synthesize a coherent answer from multiple sub-answers, checked against the shared evidence."""
         try:
-            # Create synthesis prompt
+            # Create synthesis prompt (joined outside the f-string: no backslashes in expressions before 3.12)
+            sub_answer_text = "".join([f"Sub-query: {sa['sub_query']}\nAnswer: {sa['answer']}\n\n" for sa in sub_answers])
             synthesis_prompt = f"""
             Original Query: {original_query}
 
-            I have gathered information from multiple specialized agents. Please synthesize a coherent, comprehensive answer:
+            I have gathered information from multiple specialized agents. Please synthesize a coherent, comprehensive answer,
+            using the context to resolve gaps or conflicts between them:
 
-            {"".join([f"Sub-query: {sa['sub_query']}\nAnswer: {sa['answer']}\n\n" for sa in sub_answers])}
+            {sub_answer_text}
 
             Provide a unified answer that addresses the original query comprehensively:
             """
 
             # Use general QA agent for synthesis
-            synthesized = generate_answer("", synthesis_prompt, AgentType.GENERAL_QA)
+            synthesized = generate_answer(evidence, synthesis_prompt, AgentType.GENERAL_QA, self.deadline, self.quality)
             return synthesized
 
         except Exception as e:
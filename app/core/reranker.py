@@ -1,19 +1,59 @@
-from sentence_transformers import CrossEncoder
-from typing import List, Dict, Any
-from app.config import RERANKING_MODEL
+import copy
+import numpy as np
+from typing import List, Dict, Any, Optional
+from app.config import (
+    RERANKING_MODEL, RERANK_FIRST_STAGE, RERANK_FIRST_STAGE_KEEP,
+    RERANK_BATCHING, RERANK_BATCH_MAX, RERANK_BATCH_WINDOW_MS
+)
+from app.core.inference import load_cross_encoder
+from app.core.residency import residency, module_bytes
+from app.utils.batcher import MicroBatcher
 from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+class _ResidentCrossEncoder:
+    """A cross-encoder the residency manager can unload while idle and reload on demand."""
+
+    def __init__(self, name: str, model_name: str):
+        self.name = name
+        self.model_name = model_name
+        self.model = None
+        residency.register(name, self)
+
+    @property
+    def loaded(self) -> bool:
+        return self.model is not None
+
+    def load(self):
+        self.model = load_cross_encoder(self.model_name)
+
+    def unload(self):
+        self.model = None
+
+    def memory_bytes(self) -> int:
+        return module_bytes(self.model) if self.model is not None else 0
+
+    def predict(self, pairs):
+        with residency.use(self.name):
+            return self.model.predict(pairs)
 
 class Reranker:
     def __init__(self):
         try:
-            self.model = CrossEncoder(RERANKING_MODEL)
+            self.model = _ResidentCrossEncoder("reranker", RERANKING_MODEL)
             logger.info(f"Initialized reranker with model: {RERANKING_MODEL}")
         except Exception as e:
             logger.warning(f"Failed to initialize reranker: {e}. Using fallback.")
             self.model = None
 
-    def rerank(self, query: str, documents: List[Dict[str, Any]], top_k: int = 5) -> List[Dict[str, Any]]:
-        """Rerank documents based on relevance to query."""
+        # Optionally merge pairs from concurrent rerank calls into one predict call
+        self.batcher = MicroBatcher(
+            "rerank", self._predict_batches, RERANK_BATCH_MAX, RERANK_BATCH_WINDOW_MS / 1000
+        ) if RERANK_BATCHING and self.model else None
+
+    def rerank(self, query: str, documents: List[Dict[str, Any]], top_k: int = 5,
+               query_vector: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """Rerank documents based on relevance to query. query_vector is only used by cascades."""
         if not self.model or not documents:
             return documents[:top_k]
 
@@ -22,7 +62,7 @@ class Reranker:
             pairs = [[query, doc.get("text", "")] for doc in documents]
 
             # Get relevance scores
-            scores = self.model.predict(pairs)
+            scores = self.batcher(pairs) if self.batcher is not None else self.model.predict(pairs)
 
             # Sort documents by score (higher is better for cross-encoder)
             scored_docs = list(zip(documents, scores))
@@ -35,4 +75,74 @@ class Reranker:
 
         except Exception as e:
             logger.error(f"Error during reranking: {e}. Returning original documents.")
-            return documents[:top_k]
\ No newline at end of file
+            return documents[:top_k]
+
+    def _predict_batches(self, pair_lists: List[List[List[str]]]) -> List[np.ndarray]:
+        """Score the pairs of several requests in one call and split the scores back out."""
+        scores = np.asarray(self.model.predict([pair for pairs in pair_lists for pair in pairs]))
+        bounds = np.cumsum([len(pairs) for pairs in pair_lists])[:-1]
+        return np.split(scores, bounds)
+
+class CascadeReranker:
+    """Two-stage reranker: a cheap scorer prunes candidates before the full cross-encoder.
+
+    The first stage is either a dot product between the query embedding and the
+    candidates' stored embeddings ("embedding"), or a small cross-encoder model.
+    Only the best RERANK_FIRST_STAGE_KEEP candidates reach the expensive model.
+    """
+
+    def __init__(self, reranker: Reranker, vector_store=None, first_stage: str = RERANK_FIRST_STAGE,
+                 keep: int = RERANK_FIRST_STAGE_KEEP):
+        self.reranker = reranker
+        self.model = reranker.model
+        self.vector_store = vector_store
+        self.keep = keep
+        self.first_stage_model = None
+        if first_stage != "embedding":
+            try:
+                self.first_stage_model = _ResidentCrossEncoder("first_stage_reranker", first_stage)
+                logger.info(f"Initialized first-stage reranker with model: {first_stage}")
+            except Exception as e:
+                logger.warning(f"Failed to initialize first-stage reranker {first_stage}: {e}. Using embeddings.")
+
+    def for_store(self, vector_store) -> "CascadeReranker":
+        """The same models, reading first-stage embeddings from another collection's store."""
+        cascade = copy.copy(self)
+        cascade.vector_store = vector_store
+        return cascade
+
+    def rerank(self, query: str, documents: List[Dict[str, Any]], top_k: int = 5,
+               query_vector: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """Prune with the cheap scorer, then rerank the survivors with the full cross-encoder."""
+        survivors_k = max(self.keep, top_k)
+        if len(documents) <= survivors_k:
+            return self.reranker.rerank(query, documents, top_k)
+
+        try:
+            with metrics.timer("rerank.first_stage"):
+                scores = self._first_stage_scores(query, documents, query_vector)
+            order = np.argsort(-scores, kind="stable")[:survivors_k]
+            survivors = [documents[i] for i in order]
+        except Exception as e:
+            logger.error(f"First-stage reranking failed: {e}. Reranking all candidates.")
+            survivors = documents
+
+        metrics.incr("rerank.pruned", len(documents) - len(survivors))
+        with metrics.timer("rerank.final_stage"):
+            return self.reranker.rerank(query, survivors, top_k)
+
+    def _first_stage_scores(self, query: str, documents: List[Dict[str, Any]],
+                            query_vector: Optional[np.ndarray]) -> np.ndarray:
+        if self.first_stage_model is not None:
+            pairs = [[query, doc.get("text", "")] for doc in documents]
+            return np.asarray(self.first_stage_model.predict(pairs), dtype="float32")
+
+        # Reuse embeddings computed at ingest time instead of running any model
+        full_vectors = getattr(self.vector_store, "full_vectors", None)
+        chunk_ids = [doc.get("chunk_id") for doc in documents]
+        if query_vector is not None and full_vectors is not None and None not in chunk_ids:
+            doc_vectors = np.asarray(full_vectors[np.asarray(chunk_ids, dtype="int64")], dtype="float32")
+            return doc_vectors @ np.asarray(query_vector, dtype="float32")
+
+        # No stored vectors to compare against: fall back to the fused retrieval score
+        return np.asarray([doc.get("hybrid_score", 0.0) for doc in documents], dtype="float32")
@@ -0,0 +1,249 @@
+import gc
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+from app.config import MODEL_MEMORY_BUDGET_MB, MODEL_IDLE_UNLOAD_SECONDS, MODEL_PINNED
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+MB = 1024 * 1024
+
+def module_bytes(model: Any) -> int:
+    """Parameter and buffer bytes of a torch-backed model; 0 when unknown (e.g. ONNX)."""
+    target = model if hasattr(model, "parameters") else getattr(model, "model", None)
+    if target is None or not hasattr(target, "parameters"):
+        return 0
+    tensors = list(target.parameters()) + list(target.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+class _Entry:
+    def __init__(self, name: str, component: Any, pinned: bool):
+        self.name = name
+        self.component = component
+        self.pinned = pinned
+        self.bytes = 0
+        self.in_use = 0
+        self.last_used = time.monotonic()
+        self.loads = 0
+        self.unloads = 0
+        self.load_lock = threading.Lock()
+
+class _Fixed:
+    """Adapter for components that are accounted for but never unloaded (e.g. the index)."""
+
+    loaded = True
+
+    def __init__(self, memory_fn: Callable[[], int]):
+        self.memory_bytes = memory_fn
+
+    def load(self):
+        pass
+
+    def unload(self):
+        pass
+
+class ResidencyManager:
+    """Keeps loaded models and indexes within a memory budget.
+
+    Components expose load(), unload(), a `loaded` flag and memory_bytes().
+    Callers wrap work in `use(name)`, which reloads the component on demand
+    and protects it from eviction while in use. Loading past the budget evicts
+    the least recently used unpinned idle components first, and a background
+    sweep unloads anything idle for longer than the idle timeout.
+    """
+
+    def __init__(self, budget_mb: float = MODEL_MEMORY_BUDGET_MB,
+                 idle_timeout: float = MODEL_IDLE_UNLOAD_SECONDS, pinned: str = MODEL_PINNED,
+                 prefix: str = "residency"):
+        self.prefix = prefix
+        self.budget = int(budget_mb * MB)
+        self.idle_timeout = idle_timeout
+        self.pinned = {name.strip() for name in pinned.split(",") if name.strip()}
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self._sweeper: Optional[threading.Thread] = None
+
+    def register(self, name: str, component: Any, pinned: Optional[bool] = None):
+        """Load a component (measuring its footprint) and start tracking it.
+
+        Nothing is registered if the load fails, so callers can fall back.
+        """
+        entry = _Entry(name, component, name in self.pinned if pinned is None else pinned)
+        with self._lock:
+            self._entries[name] = entry
+        try:
+            if component.loaded:
+                entry.bytes = component.memory_bytes()
+                self._make_room(exclude=name)
+            else:
+                self._load(entry)
+        except Exception:
+            with self._lock:
+                del self._entries[name]
+            raise
+        self._start_sweeper()
+
+    def track(self, name: str, memory_fn: Callable[[], int]):
+        """Count a component that stays resident against the budget without ever evicting it."""
+        self.register(name, _Fixed(memory_fn), pinned=True)
+
+    @contextmanager
+    def use(self, name: str):
+        """Ensure a component is loaded and keep it resident for the duration of the block."""
+        entry = self._entries.get(name)
+        if entry is None:
+            yield None
+            return
+
+        with self._lock:
+            entry.in_use += 1
+        try:
+            if not entry.component.loaded:
+                self._load(entry)
+            yield entry.component
+        finally:
+            with self._lock:
+                entry.in_use -= 1
+                entry.last_used = time.monotonic()
+
+    def unload(self, name: str) -> bool:
+        entry = self._entries.get(name)
+        if entry is None:
+            return False
+        # A component that is busy loading isn't a candidate; not waiting for it
+        # also keeps two loads that evict each other from deadlocking
+        if not entry.load_lock.acquire(blocking=False):
+            return False
+        try:
+            # Held across the check and the unload so a concurrent use() either
+            # blocks eviction or sees the component unloaded and reloads it
+            with self._lock:
+                if entry.in_use or not entry.component.loaded:
+                    return False
+                entry.component.unload()
+                entry.unloads += 1
+        finally:
+            entry.load_lock.release()
+        gc.collect()
+        metrics.incr(f"{self.prefix}.{name}.unloads")
+        logger.info(f"Unloaded {name} ({entry.bytes / MB:.1f} MB)")
+        return True
+
+    def sweep(self):
+        """Unload unpinned components idle for longer than the idle timeout."""
+        if self.idle_timeout <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            idle = [e.name for e in self._entries.values()
+                    if not e.pinned and not e.in_use and e.component.loaded
+                    and now - e.last_used >= self.idle_timeout]
+        for name in idle:
+            self.unload(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._entries
+
+    def get(self, name: str) -> Optional[Any]:
+        entry = self._entries.get(name)
+        return entry.component if entry is not None else None
+
+    def names(self):
+        with self._lock:
+            return list(self._entries)
+
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return sum(e.bytes for e in self._entries.values() if e.component.loaded)
+
+    def refresh(self, name: str):
+        """Re-measure a component whose footprint changes while loaded (e.g. a growing index)."""
+        entry = self._entries.get(name)
+        if entry is not None and entry.component.loaded:
+            entry.bytes = entry.component.memory_bytes()
+            self._make_room(exclude=name)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            components = {
+                e.name: {
+                    "resident": bool(e.component.loaded),
+                    "mb": round(e.bytes / MB, 1),
+                    "pinned": e.pinned,
+                    "in_use": e.in_use,
+                    "idle_seconds": round(now - e.last_used, 1),
+                    "loads": e.loads,
+                    "unloads": e.unloads,
+                }
+                for e in self._entries.values()
+            }
+        return {
+            "budget_mb": round(self.budget / MB, 1) if self.budget else None,
+            "resident_mb": round(self.resident_bytes() / MB, 1),
+            "idle_timeout_seconds": self.idle_timeout or None,
+            "components": components,
+        }
+
+    def _load(self, entry: _Entry):
+        with entry.load_lock:
+            if entry.component.loaded:
+                return
+            self._make_room(exclude=entry.name, incoming=entry.bytes)
+            started = time.perf_counter_ns()
+            rss_before = _rss_bytes()
+            entry.component.load()
+            metrics.observe(f"{self.prefix}.{entry.name}.load", time.perf_counter_ns() - started)
+            # Fall back to the RSS delta for backends that don't expose their tensors
+            entry.bytes = entry.component.memory_bytes() or max(_rss_bytes() - rss_before, 0)
+            entry.loads += 1
+        metrics.incr(f"{self.prefix}.{entry.name}.loads")
+        logger.info(f"Loaded {entry.name} ({entry.bytes / MB:.1f} MB)")
+        # The size of a first load is only known afterwards
+        self._make_room(exclude=entry.name)
+
+    def _make_room(self, exclude: str, incoming: int = 0):
+        """Evict least recently used, unpinned, idle components until incoming fits the budget."""
+        if not self.budget:
+            return
+        while self.resident_bytes() + incoming > self.budget:
+            with self._lock:
+                candidates = sorted(
+                    (e for e in self._entries.values()
+                     if e.name != exclude and not e.pinned and not e.in_use and e.component.loaded),
+                    key=lambda e: e.last_used
+                )
+            if not candidates:
+                # Everything left is pinned or busy; run over budget rather than block
+                metrics.incr(f"{self.prefix}.over_budget")
+                return
+            if not self.unload(candidates[0].name):
+                return
+
+    def _start_sweeper(self):
+        if self.idle_timeout <= 0 or (self._sweeper is not None and self._sweeper.is_alive()):
+            return
+        interval = min(max(self.idle_timeout / 2, 1.0), 30.0)
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.sweep()
+                except Exception as e:
+                    logger.error(f"Residency sweep failed: {e}")
+
+        self._sweeper = threading.Thread(target=run, name=f"{self.prefix}-sweeper", daemon=True)
+        self._sweeper.start()
+
+# Global residency manager
+residency = ResidencyManager()
@@ -0,0 +1,178 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict
+from app.config import (
+    PIPELINE_WORKERS, LLM_MAX_RETRIES, LLM_RETRY_BASE_DELAY, LLM_HEDGING, LLM_HEDGE_MIN_DELAY,
+    BREAKER_WINDOW, BREAKER_ERROR_RATE, BREAKER_LATENCY_P95, BREAKER_COOLDOWN
+)
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+class CircuitBreaker:
+    """Trips when a model's recent error rate or p95 latency degrades.
+
+    closed -> open when the rolling window breaches a threshold; open -> half_open
+    after the cooldown, letting a single probe through; the probe's outcome closes
+    or re-opens the breaker.
+    """
+
+    def __init__(self, name: str, window: int = BREAKER_WINDOW, error_rate: float = BREAKER_ERROR_RATE,
+                 latency_p95: float = BREAKER_LATENCY_P95, cooldown: float = BREAKER_COOLDOWN):
+        self.name = name
+        self.error_rate = error_rate
+        self.latency_p95 = latency_p95
+        self.cooldown = cooldown
+        self.state = "closed"
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = "half_open"
+                self._probe_in_flight = False
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record(self, ok: bool, latency: float):
+        with self._lock:
+            if self.state == "half_open":
+                if ok and latency < self.latency_p95:
+                    self.state = "closed"
+                    self._outcomes.clear()
+                    logger.info(f"Circuit breaker for {self.name} closed")
+                else:
+                    self._trip()
+                return
+            if self.state == "open":
+                # Stragglers from before the trip don't count towards the next window
+                return
+
+            self._outcomes.append((ok, latency))
+            if self.state == "closed" and len(self._outcomes) >= max(self._outcomes.maxlen // 2, 1):
+                errors = sum(1 for success, _ in self._outcomes if not success)
+                latencies = sorted(lat for _, lat in self._outcomes)
+                p95 = latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+                if errors / len(self._outcomes) >= self.error_rate or p95 >= self.latency_p95:
+                    self._trip()
+
+    def _trip(self):
+        self.state = "open"
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        metrics.incr(f"breaker.{self.name}.opened")
+        logger.warning(f"Circuit breaker for {self.name} opened")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self.state, "recent_calls": len(self._outcomes)}
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+# Hedged requests run both attempts here; room for a primary and a hedge per pipeline worker,
+# so hedging never caps LLM concurrency below what the pipeline can issue
+_hedge_pool = ThreadPoolExecutor(max_workers=2 * PIPELINE_WORKERS, thread_name_prefix="llm-hedge")
+
+def get_breaker(model: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if model not in _breakers:
+            _breakers[model] = CircuitBreaker(model)
+        return _breakers[model]
+
+def breaker_stats() -> Dict[str, Any]:
+    with _breakers_lock:
+        return {model: breaker.stats() for model, breaker in _breakers.items()}
+
+def is_retryable(error: Exception) -> bool:
+    """Retry timeouts, connection errors, rate limits and server errors only."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        return True
+    return status in (408, 409, 429) or status >= 500
+
+def _remaining(deadline: float) -> float:
+    return deadline - time.monotonic()
+
+def _attempt(model: str, call: Callable[[float], Any], deadline: float) -> Any:
+    """One request with the remaining time as its timeout, feeding the breaker."""
+    remaining = _remaining(deadline)
+    if remaining <= 0:
+        raise DeadlineExceeded(f"Deadline exceeded before calling {model}")
+
+    started = time.monotonic()
+    try:
+        result = call(remaining)
+    except Exception:
+        get_breaker(model).record(False, time.monotonic() - started)
+        raise
+    get_breaker(model).record(True, time.monotonic() - started)
+    return result
+
+def _hedged_attempt(model: str, call: Callable[[float], Any], deadline: float) -> Any:
+    """Send a second request if the first is slower than the model's recent p95."""
+    p95 = metrics.percentile(f"llm.model.{model}", 95) / 1000
+    started = threading.Event()
+
+    def run_primary():
+        started.set()
+        return _attempt(model, call, deadline)
+
+    primary = _hedge_pool.submit(run_primary)
+    # The hedge delay counts from when the request is sent, not time spent queued for a thread
+    if not started.wait(max(_remaining(deadline), 0)):
+        primary.cancel()
+        raise DeadlineExceeded(f"Deadline exceeded before calling {model}")
+    hedge_delay = min(max(p95, LLM_HEDGE_MIN_DELAY), max(_remaining(deadline), 0))
+    done, _ = wait([primary], timeout=hedge_delay)
+    if done:
+        return primary.result()
+
+    metrics.incr("llm.hedges")
+    hedge = _hedge_pool.submit(_attempt, model, call, deadline)
+    pending = {primary, hedge}
+    error = None
+    while pending:
+        done, pending = wait(pending, timeout=max(_remaining(deadline), 0), return_when=FIRST_COMPLETED)
+        if not done:
+            raise DeadlineExceeded(f"Deadline exceeded waiting for {model}")
+        for future in done:
+            if future.exception() is None:
+                if future is hedge:
+                    metrics.incr("llm.hedge_wins")
+                return future.result()
+            error = future.exception()
+    raise error
+
+def call_with_retries(model: str, call: Callable[[float], Any], deadline: float,
+                      hedge: bool = LLM_HEDGING, max_retries: int = LLM_MAX_RETRIES) -> Any:
+    """Call `call(timeout)` with jittered exponential backoff until it succeeds or the deadline passes."""
+    for attempt in range(max_retries + 1):
+        try:
+            if hedge:
+                return _hedged_attempt(model, call, deadline)
+            return _attempt(model, call, deadline)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            # Full jitter keeps retries from synchronising across clients
+            delay = random.uniform(0, LLM_RETRY_BASE_DELAY * (2 ** attempt))
+            if delay >= _remaining(deadline):
+                raise
+            metrics.incr("llm.retries")
+            logger.warning(f"LLM call to {model} failed ({e}), retrying in {delay:.2f}s")
+            time.sleep(delay)
@@ -1,13 +1,29 @@
 from app.core.embeddings import EmbeddingModel
 from app.core.vector_store import VectorStore
 from app.core.hybrid_search import HybridSearch
+from app.core.reranker import Reranker
+from app.core.small_to_big import has_parents, expand_to_parents
 from app.config import TOP_K
+from app.utils.metrics import metrics
+from typing import Optional
 
 class Retriever:
-    def __init__(self, vector_store: VectorStore):
+    def __init__(self, vector_store: VectorStore, embedder: Optional[EmbeddingModel] = None,
+                 reranker: Optional[Reranker] = None):
         self.vector_store = vector_store
-        self.hybrid_search = HybridSearch(vector_store)
+        self.hybrid_search = HybridSearch(vector_store, embedder, reranker)
 
-    def retrieve(self, query: str):
+    def retrieve(self, query: str, query_vector=None):
         """Retrieve documents using hybrid search (BM25 + Vector + Rerank)."""
-        return self.hybrid_search.search(query, TOP_K)
+        return self._expand(self.hybrid_search.search(query, TOP_K, query_vector))
+
+    async def retrieve_async(self, query: str, query_vector=None):
+        """Async variant of retrieve."""
+        return self._expand(await self.hybrid_search.search_async(query, TOP_K, query_vector))
+
+    def _expand(self, docs):
+        """Widen small-to-big child hits into parent windows within the context budget."""
+        if not has_parents(docs):
+            return docs
+        with metrics.timer("context.expand"), self.vector_store.pin() as snapshot:
+            return expand_to_parents(docs, snapshot.metadata)
@@ -1,6 +1,12 @@
 from enum import Enum
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
+from app.config import EMBEDDING_MODEL, MODEL_CACHE_DIR, ROUTER_MODE, ROUTER_CENTROID_MARGIN
+from app.core.model_selection import choose_model
 from app.utils.logger import logger
+import numpy as np
+import re
+import threading
+import time
 
 class AgentType(Enum):
     GENERAL_QA = "general_qa"
@@ -9,76 +15,176 @@ class AgentType(Enum):
     CODE = "code"
     MATH = "math"
 
+# Keywords per agent; a keyword also matches longer words it starts ("program" -> "programming")
+AGENT_KEYWORDS = {
+    AgentType.GENERAL_QA: [
+        "what", "who", "when", "where", "why", "how",
+        "explain", "describe", "tell me about"
+    ],
+    AgentType.TECHNICAL: [
+        "api", "database", "server", "network", "security",
+        "algorithm", "framework", "library", "protocol",
+        "architecture", "infrastructure", "deployment"
+    ],
+    AgentType.CREATIVE: [
+        "design", "create", "imagine", "brainstorm",
+        "innovative", "creative", "story", "poem",
+        "artwork", "music", "fiction"
+    ],
+    AgentType.CODE: [
+        "code", "program", "function", "class", "variable",
+        "python", "javascript", "java", "c++", "sql",
+        "debug", "error", "exception", "syntax"
+    ],
+    AgentType.MATH: [
+        "calculate", "compute", "solve", "equation",
+        "formula", "theorem", "proof", "integral",
+        "derivative", "matrix", "probability"
+    ],
+}
+
+# Operators only count as math between operands, so hyphenated words don't route to math
+MATH_SYMBOL_PATTERN = r"\d\s*[-+*/^]\s*\d|[\w)]\s*=\s*[\w(]|[√∑∫]"
+
+# Weight of one keyword hit; question words are weak evidence compared to domain terms
+AGENT_WEIGHTS = {
+    AgentType.GENERAL_QA: 0.5,
+    AgentType.TECHNICAL: 1.0,
+    AgentType.CREATIVE: 1.0,
+    AgentType.CODE: 1.0,
+    AgentType.MATH: 1.0,
+}
+
+# Tie-break order when two agents score the same (higher wins)
+AGENT_PRIORITY = {
+    AgentType.CODE: 5,
+    AgentType.MATH: 4,
+    AgentType.TECHNICAL: 3,
+    AgentType.CREATIVE: 2,
+    AgentType.GENERAL_QA: 1,
+}
+
+# Example queries used to build per-agent embedding centroids
+AGENT_EXEMPLARS = {
+    AgentType.GENERAL_QA: [
+        "What is the capital of France?", "Who wrote this report?",
+        "Explain what this document is about", "When was the company founded?",
+    ],
+    AgentType.TECHNICAL: [
+        "How is the API authenticated?", "Describe the deployment architecture",
+        "Which database does the service use?", "How does the network protocol handle retries?",
+    ],
+    AgentType.CREATIVE: [
+        "Brainstorm names for a new product", "Write a short story about a robot",
+        "Imagine a new logo design", "Compose a poem about the ocean",
+    ],
+    AgentType.CODE: [
+        "Why does this Python function raise an exception?", "Write a SQL query to join two tables",
+        "How do I fix this syntax error in JavaScript?", "Refactor this class to remove the global variable",
+    ],
+    AgentType.MATH: [
+        "Solve the equation 2x + 3 = 7", "Calculate the probability of rolling two sixes",
+        "What is the derivative of x^2?", "Compute the determinant of this matrix",
+    ],
+}
+
+def _compile_router_pattern():
+    """Compile every agent's keywords into a single alternation with one named group per agent."""
+    groups = []
+    for agent_type, keywords in AGENT_KEYWORDS.items():
+        # Longest first so "javascript" wins over "java"
+        alternatives = "|".join(re.escape(k) for k in sorted(keywords, key=len, reverse=True))
+        groups.append(f"(?P<{agent_type.value}>{alternatives})")
+    return re.compile(
+        rf"(?<!\w)(?:{'|'.join(groups)})\w*|(?P<math_symbol>{MATH_SYMBOL_PATTERN})"
+    )
+
+ROUTER_PATTERN = _compile_router_pattern()
+
+def score_query(query: str) -> Dict[AgentType, float]:
+    """Score all agent types in a single pass over the query."""
+    scores: Dict[AgentType, float] = {}
+    for match in ROUTER_PATTERN.finditer(query.lower()):
+        group = match.lastgroup
+        agent_type = AgentType.MATH if group == "math_symbol" else AgentType(group)
+        scores[agent_type] = scores.get(agent_type, 0.0) + AGENT_WEIGHTS[agent_type]
+    return scores
+
+class CentroidClassifier:
+    """Nearest-centroid agent classifier over query embeddings.
+
+    Centroids are the normalised mean embedding of each agent's exemplars. They are
+    computed once per embedding model and cached on disk, so classifying a query whose
+    embedding is already known is a single small matrix-vector product.
+    """
+
+    _cache: Dict[str, Any] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, embedder):
+        self.agent_types = list(AGENT_EXEMPLARS.keys())
+        self.centroids = self._load_centroids(embedder)
+
+    def _load_centroids(self, embedder) -> np.ndarray:
+        with self._lock:
+            if EMBEDDING_MODEL in self._cache:
+                return self._cache[EMBEDDING_MODEL]
+
+            path = MODEL_CACHE_DIR / "router_centroids" / f"{EMBEDDING_MODEL.replace('/', '__')}.npy"
+            if path.exists():
+                centroids = np.load(path)
+            else:
+                centroids = []
+                for agent_type in self.agent_types:
+                    vectors = np.asarray(embedder.embed_documents(AGENT_EXEMPLARS[agent_type]), dtype="float32")
+                    centroid = vectors.mean(axis=0)
+                    centroids.append(centroid / (np.linalg.norm(centroid) or 1.0))
+                centroids = np.stack(centroids)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                np.save(path, centroids)
+
+            self._cache[EMBEDDING_MODEL] = centroids
+            return centroids
+
+    def classify(self, query_vector: np.ndarray) -> Tuple[AgentType, float]:
+        """Return the closest agent and its cosine margin over the runner-up."""
+        query = np.asarray(query_vector, dtype="float32")
+        sims = self.centroids @ (query / (np.linalg.norm(query) or 1.0))
+        order = np.argsort(sims)[::-1]
+        margin = float(sims[order[0]] - sims[order[1]]) if len(order) > 1 else float(sims[order[0]])
+        return self.agent_types[int(order[0])], margin
+
 class QueryRouter:
-    def __init__(self):
-        self.routing_rules = {
-            AgentType.GENERAL_QA: self._is_general_qa,
-            AgentType.TECHNICAL: self._is_technical,
-            AgentType.CREATIVE: self._is_creative,
-            AgentType.CODE: self._is_code,
-            AgentType.MATH: self._is_math,
-        }
+    def __init__(self, embedder=None, mode: Optional[str] = None):
+        self.mode = mode or ROUTER_MODE
+        self.classifier = CentroidClassifier(embedder) if embedder is not None and self.mode != "rules" else None
+
+    @property
+    def uses_embeddings(self) -> bool:
+        """Whether route_query benefits from being given the query embedding."""
+        return self.classifier is not None
 
-    def route_query(self, query: str) -> AgentType:
+    def route_query(self, query: str, query_vector: Optional[np.ndarray] = None) -> AgentType:
         """Route a query to the most appropriate agent."""
-        query_lower = query.lower()
+        scores = score_query(query)
+        specific = {agent: score for agent, score in scores.items() if agent != AgentType.GENERAL_QA}
 
-        for agent_type, rule_func in self.routing_rules.items():
-            if rule_func(query_lower):
-                logger.info(f"Routed query to {agent_type.value}: {query[:50]}...")
+        # Domain keywords are a strong signal; otherwise let the embedding classifier decide
+        if self.classifier is not None and query_vector is not None and (self.mode == "centroid" or not specific):
+            agent_type, margin = self.classifier.classify(query_vector)
+            if margin >= ROUTER_CENTROID_MARGIN or self.mode == "centroid":
+                logger.info(f"Routed query to {agent_type.value} by centroid (margin {margin:.3f}): {query[:50]}...")
                 return agent_type
 
+        if scores:
+            agent_type = max(scores, key=lambda agent: (scores[agent], AGENT_PRIORITY[agent]))
+            logger.info(f"Routed query to {agent_type.value}: {query[:50]}...")
+            return agent_type
+
         # Default to general QA
         logger.info(f"Default routing to general_qa: {query[:50]}...")
         return AgentType.GENERAL_QA
 
-    def _is_general_qa(self, query: str) -> bool:
-        """Check if query is general question-answering."""
-        general_keywords = [
-            "what", "who", "when", "where", "why", "how",
-            "explain", "describe", "tell me about"
-        ]
-        return any(keyword in query for keyword in general_keywords)
-
-    def _is_technical(self, query: str) -> bool:
-        """Check if query is technical."""
-        technical_keywords = [
-            "api", "database", "server", "network", "security",
-            "algorithm", "framework", "library", "protocol",
-            "architecture", "infrastructure", "deployment"
-        ]
-        return any(keyword in query for keyword in technical_keywords)
-
-    def _is_creative(self, query: str) -> bool:
-        """Check if query requires creative thinking."""
-        creative_keywords = [
-            "design", "create", "imagine", "brainstorm",
-            "innovative", "creative", "story", "poem",
-            "artwork", "music", "fiction"
-        ]
-        return any(keyword in query for keyword in creative_keywords)
-
-    def _is_code(self, query: str) -> bool:
-        """Check if query is about programming/code."""
-        code_keywords = [
-            "code", "program", "function", "class", "variable",
-            "python", "javascript", "java", "c++", "sql",
-            "debug", "error", "exception", "syntax"
-        ]
-        return any(keyword in query for keyword in code_keywords)
-
-    def _is_math(self, query: str) -> bool:
-        """Check if query is mathematical."""
-        math_keywords = [
-            "calculate", "compute", "solve", "equation",
-            "formula", "theorem", "proof", "integral",
-            "derivative", "matrix", "probability"
-        ]
-        math_symbols = ["=", "+", "-", "*", "/", "^", "√", "∑", "∫"]
-        has_math_symbols = any(symbol in query for symbol in math_symbols)
-
-        return any(keyword in query for keyword in math_keywords) or has_math_symbols
-
 class AgentConfig:
     """Configuration for different agents."""
 
@@ -90,31 +196,53 @@ class AgentConfig:
                 "model": "llama3-8b-8192",
                 "temperature": 0.2,
                 "max_tokens": 1000,
+                "timeout": 15,
                 "system_prompt": "You are a helpful assistant. Answer questions based on the provided context."
             },
             AgentType.TECHNICAL: {
                 "model": "llama3-70b-8192",
                 "temperature": 0.1,
                 "max_tokens": 1500,
+                "timeout": 30,
                 "system_prompt": "You are a technical expert. Provide detailed, accurate technical information."
             },
             AgentType.CREATIVE: {
                 "model": "llama3-70b-8192",
                 "temperature": 0.8,
                 "max_tokens": 1200,
+                "timeout": 30,
                 "system_prompt": "You are a creative assistant. Be imaginative and help with creative tasks."
             },
             AgentType.CODE: {
                 "model": "llama3-70b-8192",
                 "temperature": 0.1,
                 "max_tokens": 2000,
+                "timeout": 45,
                 "system_prompt": "You are a programming expert. Provide accurate code solutions and explanations."
             },
             AgentType.MATH: {
                 "model": "llama3-70b-8192",
                 "temperature": 0.0,
                 "max_tokens": 1000,
+                "timeout": 30,
                 "system_prompt": "You are a mathematics expert. Solve problems step by step with clear explanations."
             }
         }
-        return configs.get(agent_type, configs[AgentType.GENERAL_QA])
\ No newline at end of file
+        return configs.get(agent_type, configs[AgentType.GENERAL_QA])
+
+    @staticmethod
+    def for_request(agent_type: AgentType, deadline: Optional[float] = None,
+                    quality: Optional[str] = None) -> Dict[str, Any]:
+        """Agent config with the model and max_tokens fitted to a request's deadline and quality tier.
+
+        The agent's model is the default choice; `deadline` (time.monotonic()) and
+        `quality` ("fast", "balanced", "best") may move it along LLM_MODEL_LADDER.
+        """
+        config = dict(AgentConfig.get_agent_config(agent_type))
+        config["model"], config["max_tokens"] = choose_model(
+            config["model"], config["max_tokens"], deadline, quality
+        )
+        if deadline is not None:
+            # Past the deadline still allow one short attempt rather than failing outright
+            config["timeout"] = min(config["timeout"], max(deadline - time.monotonic(), 1.0))
+        return config
\ No newline at end of file
@@ -0,0 +1,72 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, Sequence
+from app.config import CONTEXT_TOKEN_BUDGET
+from app.utils.metrics import metrics
+from app.utils.tokens import estimate_tokens
+
+def has_parents(docs: List[Dict[str, Any]]) -> bool:
+    return any("parent_id" in doc and "chunk_id" in doc for doc in docs)
+
+def _join(metadata: Sequence[Dict[str, Any]], rows: List[int]) -> str:
+    """Concatenate child rows, marking gaps between non-adjacent children."""
+    parts = []
+    for i, row in enumerate(rows):
+        if i and row != rows[i - 1] + 1:
+            parts.append("...")
+        parts.append(metadata[row].get("text", ""))
+    return " ".join(parts)
+
+def expand_to_parents(docs: List[Dict[str, Any]], metadata: Sequence[Dict[str, Any]],
+                      token_budget: int = CONTEXT_TOKEN_BUDGET) -> List[Dict[str, Any]]:
+    """Replace matched child chunks with windows of their parent sections.
+
+    Hits are grouped by parent in rank order. A parent is served whole if it
+    fits the remaining budget, otherwise as the hit children plus their direct
+    neighbours, otherwise as the hits alone. Windows are assembled from the
+    children's metadata rows, so nothing is re-embedded or re-retrieved.
+    """
+    groups: "OrderedDict[Any, List[Dict[str, Any]]]" = OrderedDict()
+    for doc in docs:
+        if "parent_id" in doc and "chunk_id" in doc:
+            key = (doc["parent_id"], doc["chunk_id"] - doc.get("child_index", 0))
+        else:
+            key = ("chunk", len(groups))
+        groups.setdefault(key, []).append(doc)
+
+    expanded = []
+    remaining = token_budget
+    for hits in groups.values():
+        best = hits[0]
+        if "parent_id" not in best or "chunk_id" not in best:
+            expanded.append(best)
+            remaining -= estimate_tokens(best.get("text", ""))
+            continue
+
+        first_row = best["chunk_id"] - best.get("child_index", 0)
+        count = best.get("child_count", 1)
+        positions = sorted({hit.get("child_index", 0) for hit in hits})
+        neighbours = sorted({p + d for p in positions for d in (-1, 0, 1) if 0 <= p + d < count})
+        windows = [
+            ("parent", list(range(count))),
+            ("neighbours", neighbours),
+            ("hits", positions),
+        ]
+
+        for kind, window in windows:
+            rows = [first_row + p for p in window]
+            text = _join(metadata, rows)
+            tokens = estimate_tokens(text)
+            if tokens <= remaining:
+                break
+        else:
+            if expanded:
+                # Doesn't fit even as bare hits; skip it rather than cut text mid-sentence
+                continue
+
+        remaining -= tokens
+        metrics.incr(f"context.window.{kind}")
+        window_doc = dict(best)
+        window_doc.update(text=text, chunk_ids=rows, window=kind)
+        expanded.append(window_doc)
+
+    return expanded
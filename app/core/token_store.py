@@ -0,0 +1,111 @@
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple
+import numpy as np
+from app.core.analyzer import Vocabulary, analyzer
+
+def encode_corpus(texts: List[str], vocabulary: Vocabulary) -> Tuple[np.ndarray, np.ndarray]:
+    """Encode texts into one flat uint32 id array plus each row's start offset."""
+    encoded = [analyzer.encode(text, vocabulary) for text in texts]
+    lengths = [len(ids) for ids in encoded]
+    starts = np.cumsum([0] + lengths[:-1], dtype="int64") if encoded else np.zeros(0, dtype="int64")
+    flat = np.concatenate(encoded) if encoded else np.zeros(0, dtype="uint32")
+    return flat.astype("uint32", copy=False), starts
+
+class TokenStore:
+    """Analyzed chunk text: uint32 term ids, per-row offsets and the vocabulary.
+
+    Like MetadataStore the files are append-only and memory-mapped, with
+    `count` and `vocab_size` limiting what is visible to what the manifest
+    published. The vocabulary is a text file with one term per line, its line
+    number being the term id.
+    """
+
+    def __init__(self, path: Path, count: Optional[int] = None, vocab_size: Optional[int] = None):
+        self.path = path
+        self.offsets_path = path.with_suffix(".offsets")
+        self.vocab_path = path.with_name("vocab.txt")
+        self._count = 0
+        self._ids = np.zeros(0, dtype="uint32")
+        self._starts = np.zeros(0, dtype="int64")
+        self.vocabulary = Vocabulary()
+        self._open(count, vocab_size)
+
+    def _open(self, count: Optional[int] = None, vocab_size: Optional[int] = None):
+        self._count = 0
+        self._ids = np.zeros(0, dtype="uint32")
+        self._starts = np.zeros(0, dtype="int64")
+        self.vocabulary = Vocabulary()
+        if not self.offsets_path.exists():
+            return
+
+        available = self.offsets_path.stat().st_size // 8
+        self._count = available if count is None else min(count, available)
+        if self._count == 0:
+            return
+        starts = np.memmap(self.offsets_path, dtype="int64", mode="r", shape=(available,))
+        end = int(starts[self._count]) if self._count < available else self.path.stat().st_size // 4
+        self._starts = starts[:self._count]
+        if end:
+            self._ids = np.memmap(self.path, dtype="uint32", mode="r", shape=(end,))
+
+        with open(self.vocab_path, encoding="utf-8") as f:
+            terms = f.read().split("\n")[1:-1]
+        self.vocabulary = Vocabulary(terms if vocab_size is None else terms[:vocab_size - 1])
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, idx: int) -> np.ndarray:
+        if idx < 0:
+            idx += self._count
+        if not 0 <= idx < self._count:
+            raise IndexError(f"token row {idx} out of range")
+        start = int(self._starts[idx])
+        end = int(self._starts[idx + 1]) if idx + 1 < self._count else len(self._ids)
+        return self._ids[start:end]
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """The flat id array and row start offsets of every visible row."""
+        return self._ids, self._starts
+
+    def append(self, texts: List[str]):
+        """Analyze and append rows, extending the vocabulary with any new terms."""
+        # Drop rows and terms past the published counts left behind by an interrupted write
+        self._truncate()
+
+        known = len(self.vocabulary)
+        flat, starts = encode_corpus(texts, self.vocabulary)
+        starts += len(self._ids)
+        with open(self.path, "ab") as f:
+            f.write(flat.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.vocab_path, "a", encoding="utf-8") as f:
+            if known == 1:
+                f.write(self.vocabulary.terms[0] + "\n")
+            f.writelines(term + "\n" for term in self.vocabulary.terms[known:])
+        with open(self.offsets_path, "ab") as f:
+            f.write(starts.tobytes())
+        self._open()
+
+    def _truncate(self):
+        ids_bytes = len(self._ids) * 4
+        for path, size in ((self.path, ids_bytes), (self.offsets_path, self._count * 8)):
+            if path.exists() and path.stat().st_size > size:
+                os.truncate(path, size)
+        if self.vocab_path.exists():
+            vocab_bytes = sum(len(term.encode("utf-8")) + 1 for term in self.vocabulary.terms) if self._count else 0
+            if self.vocab_path.stat().st_size > vocab_bytes:
+                os.truncate(self.vocab_path, vocab_bytes)
+
+    @classmethod
+    def create(cls, path: Path, texts: List[str]) -> "TokenStore":
+        """Write a fresh store, e.g. for an index built before token arrays were kept."""
+        for stale in (path, path.with_suffix(".offsets"), path.with_name("vocab.txt")):
+            if stale.exists():
+                stale.unlink()
+        store = cls(path)
+        if texts:
+            store.append(texts)
+        return store
@@ -1,16 +1,26 @@
 from typing import List, Dict, Any, Optional, Callable
-from app.core.llm import generate_answer, client
+from app.core.llm import generate_answer, get_client
 from app.core.router import AgentType
+from app.core.resilience import call_with_retries
+from app.core.collection import DEFAULT_COLLECTION
+from app.core.conversation import ConversationHistory
+from app.config import LLM_TIMEOUT, TOP_K, TOOL_MAX_CONCURRENCY, TOOL_RESULT_MAX_TOKENS
 from app.tools.health import health_check
 from app.tools.ingest import ingest_documents
 from app.tools.search import search_knowledge
 from app.tools.answer import answer_question
 from app.utils.logger import logger
+from app.utils.metrics import metrics
+from app.utils.tokens import compact_json, estimate_tokens, to_jsonable
+from concurrent.futures import ThreadPoolExecutor
 import json
 import re
+import time
 
 class ToolCallingAgent:
-    def __init__(self):
+    def __init__(self, collection: str = DEFAULT_COLLECTION):
+        # Every tool call works on the collection the agent was started for
+        self.collection = collection
         self.available_tools = {
             "health_check": {
                 "function": health_check,
@@ -25,7 +35,7 @@ class ToolCallingAgent:
                 }
             },
             "search_knowledge": {
-                "function": search_knowledge,
+                "function": self._search_wrapper,
                 "description": "Search the knowledge base for relevant documents",
                 "parameters": {
                     "query": "Search query string",
@@ -40,41 +50,42 @@ class ToolCallingAgent:
                 }
             }
         }
+        # Built once so the tool schemas sent each turn are identical
+        self.tools = self._get_available_tools()
 
     def _ingest_wrapper(self, documents: List[str]) -> Dict[str, Any]:
         """Wrapper for ingest_documents tool."""
-        return ingest_documents(documents)
+        return ingest_documents(documents, self.collection)
+
+    def _search_wrapper(self, query: str, top_k: Any = TOP_K) -> Dict[str, Any]:
+        """Wrapper for search_knowledge tool; tool arguments arrive as strings."""
+        return search_knowledge(query, int(top_k), self.collection)
 
     def _answer_wrapper(self, question: str) -> Dict[str, Any]:
         """Wrapper for answer_question tool."""
-        return answer_question(question)
+        return answer_question(question, collection=self.collection)
 
     def execute_with_tools(self, user_query: str, max_iterations: int = 5) -> Dict[str, Any]:
         """Execute a query using tool calling capabilities."""
-        messages = [
-            {
-                "role": "system",
-                "content": self._get_system_prompt()
-            },
-            {
-                "role": "user",
-                "content": user_query
-            }
-        ]
+        history = ConversationHistory(self._get_system_prompt())
+        history.add({"role": "user", "content": user_query})
 
         for iteration in range(max_iterations):
             logger.info(f"Tool-calling iteration {iteration + 1}")
 
             try:
-                # Get available tools for this turn
-                tools = self._get_available_tools()
-
-                response = client.chat.completions.create(
-                    model="llama3-70b-8192",  # Use more capable model for tool calling
-                    messages=messages,
-                    tools=tools,
-                    tool_choice="auto",
-                    temperature=0.1
+                metrics.incr("agent.prompt_tokens_estimated", history.tokens)
+                response = call_with_retries(
+                    "llama3-70b-8192",
+                    lambda timeout: get_client().chat.completions.create(
+                        model="llama3-70b-8192",  # Use more capable model for tool calling
+                        messages=history.messages,
+                        tools=self.tools,
+                        tool_choice="auto",
+                        temperature=0.1,
+                        timeout=timeout
+                    ),
+                    time.monotonic() + LLM_TIMEOUT
                 )
 
                 message = response.choices[0].message
@@ -84,16 +95,22 @@ class ToolCallingAgent:
                     # Execute tool calls
                     tool_results = self._execute_tool_calls(message.tool_calls)
 
-                    # Add assistant message with tool calls
-                    messages.append({
+                    # Record the round; older tool outputs are compacted to stay within budget
+                    history.add_tool_round({
                         "role": "assistant",
                         "content": message.content,
-                        "tool_calls": message.tool_calls
-                    })
-
-                    # Add tool results
-                    for result in tool_results:
-                        messages.append(result)
+                        "tool_calls": [
+                            {
+                                "id": tool_call.id,
+                                "type": "function",
+                                "function": {
+                                    "name": tool_call.function.name,
+                                    "arguments": tool_call.function.arguments
+                                }
+                            }
+                            for tool_call in message.tool_calls
+                        ]
+                    }, tool_results)
 
                 else:
                     # Final answer
@@ -108,9 +125,9 @@ class ToolCallingAgent:
             except Exception as e:
                 logger.error(f"Tool-calling iteration {iteration + 1} failed: {e}")
                 # Fallback to regular RAG
-                fallback_result = answer_question(user_query)
+                fallback_result = answer_question(user_query, collection=self.collection)
                 return {
-                    "answer": fallback_result.get("answer", "Error occurred"),
+                    "answer": fallback_result.answer,
                     "tool_calls_made": 0,
                     "agent_type": "fallback_rag",
                     "error": str(e)
@@ -172,38 +189,48 @@ Always be helpful and accurate."""
         return tools
 
     def _execute_tool_calls(self, tool_calls) -> List[Dict[str, Any]]:
-        """Execute the tool calls and return results."""
-        results = []
-
-        for tool_call in tool_calls:
-            try:
-                function_name = tool_call.function.name
-                function_args = json.loads(tool_call.function.arguments)
+        """Execute the tool calls concurrently and return results in call order."""
+        if len(tool_calls) == 1:
+            return [self._execute_tool_call(tool_calls[0])]
+
+        workers = min(TOOL_MAX_CONCURRENCY, len(tool_calls))
+        with metrics.timer("agent.tool_batch"):
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tool-call") as pool:
+                return list(pool.map(self._execute_tool_call, tool_calls))
+
+    def _execute_tool_call(self, tool_call) -> Dict[str, Any]:
+        """Execute one tool call, returning a tool message sized to the result token budget."""
+        try:
+            function_name = tool_call.function.name
+            function_args = json.loads(tool_call.function.arguments)
+
+            logger.info(f"Executing tool: {function_name} with args: {function_args}")
+
+            if function_name in self.available_tools:
+                tool_func = self.available_tools[function_name]["function"]
+                with metrics.timer(f"agent.tool.{function_name}"):
+                    result = tool_func(**function_args)
+                content = self._format_tool_result(result)
+            else:
+                content = json.dumps({"error": f"Unknown tool: {function_name}"})
 
-                logger.info(f"Executing tool: {function_name} with args: {function_args}")
+        except Exception as e:
+            logger.error(f"Tool execution failed: {e}")
+            content = json.dumps({"error": str(e)})
 
-                if function_name in self.available_tools:
-                    tool_func = self.available_tools[function_name]["function"]
-                    result = tool_func(**function_args)
+        return {
+            "role": "tool",
+            "tool_call_id": tool_call.id,
+            "content": content
+        }
 
-                    results.append({
-                        "role": "tool",
-                        "tool_call_id": tool_call.id,
-                        "content": json.dumps(result)
-                    })
-                else:
-                    results.append({
-                        "role": "tool",
-                        "tool_call_id": tool_call.id,
-                        "content": json.dumps({"error": f"Unknown tool: {function_name}"})
-                    })
+    def _format_tool_result(self, result: Any) -> str:
+        """Serialize a tool result, compacting it to TOOL_RESULT_MAX_TOKENS if needed."""
+        content = json.dumps(to_jsonable(result), default=str)
+        if estimate_tokens(content) <= TOOL_RESULT_MAX_TOKENS:
+            return content
 
-            except Exception as e:
-                logger.error(f"Tool execution failed: {e}")
-                results.append({
-                    "role": "tool",
-                    "tool_call_id": tool_call.id,
-                    "content": json.dumps({"error": str(e)})
-                })
-
-        return results
\ No newline at end of file
+        metrics.incr("agent.tool_results_compacted")
+        compacted = compact_json(result, TOOL_RESULT_MAX_TOKENS)
+        logger.info(f"Compacted tool result: ~{estimate_tokens(content)} -> ~{estimate_tokens(compacted)} tokens")
+        return compacted
@@ -1,34 +1,546 @@
-import faiss
 import numpy as np
 import json
-from app.config import INDEX_DIR
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Dict, Any, Tuple, Optional, Callable
+from app.config import INDEX_DIR, VECTOR_STORAGE, VECTOR_RESCORE, RESCORE_FACTOR, INDEX_KEEP_VERSIONS
+from app.core import quantization
+from app.core.analyzer import ANALYZER_VERSION
+from app.core.metadata_store import MetadataStore
+from app.core.token_store import TokenStore
+from app.utils.logger import logger
+from app.utils.lazy import lazy_import
+from app.utils.ytils import load_json_file, write_json_atomic
+
+faiss = lazy_import("faiss")
+
+INDEX_FILE = "faiss.index"
+VECTORS_FILE = "vectors.f32"
+MANIFEST_FILE = "manifest.json"
+METADATA_FILE = "metadata.jsonl"
+TOKENS_FILE = "tokens.u32"
+STATS_FILE = "stats.json"
+VERSIONS_DIR = "versions"
+CURRENT_FILE = "CURRENT"
+
+# Files of the un-versioned layout written before snapshots existed
+LEGACY_FILES = (INDEX_FILE, "metadata.json", METADATA_FILE, "metadata.offsets", VECTORS_FILE, MANIFEST_FILE)
+
+def current_version_dir(index_dir: Path = INDEX_DIR) -> Optional[Path]:
+    """Directory of the published index version, following the CURRENT pointer."""
+    pointer = index_dir / CURRENT_FILE
+    if pointer.exists():
+        return index_dir / VERSIONS_DIR / pointer.read_text().strip()
+    if (index_dir / INDEX_FILE).exists():
+        return index_dir
+    return None
+
+def load_full_vectors(index_dir: Optional[Path] = None, manifest: Optional[Dict[str, Any]] = None) -> Optional[np.ndarray]:
+    """Memory-map the full-precision vectors kept alongside the index."""
+    index_dir = index_dir or current_version_dir()
+    if index_dir is None:
+        return None
+    manifest_path = index_dir / MANIFEST_FILE
+    vectors_path = index_dir / VECTORS_FILE
+    if manifest is None:
+        if not manifest_path.exists():
+            return None
+        manifest = json.loads(manifest_path.read_text())
+    if not vectors_path.exists():
+        return None
+
+    dim = manifest.get("dim", 0)
+    count = manifest.get("count", 0)
+    if not dim or not count:
+        return None
+    return np.memmap(vectors_path, dtype="float32", mode="r", shape=(count, dim))
+
+def ann_factory(ann: Optional[Dict[str, Any]]) -> Optional[str]:
+    """FAISS factory string of a tuned ANN config; None for exact search."""
+    factory = (ann or {}).get("factory")
+    return None if factory in (None, "", "Flat") else factory
+
+class IndexSnapshot:
+    """One published, immutable version of the index, metadata, token ids and full vectors.
+
+    Readers pin a snapshot for the duration of a search; the store holds one
+    reference to whichever snapshot is current. When the count drops to zero
+    the snapshot is released and its version directory can be reclaimed.
+    """
+
+    def __init__(self, version: int, path: Optional[Path], storage: str, dim: int, index,
+                 metadata, full_vectors: Optional[np.ndarray], trained_on: int = 0,
+                 tokens: Optional[TokenStore] = None, index_factory: Optional[str] = None,
+                 ann: Optional[Dict[str, Any]] = None):
+        self.version = version
+        self.path = path
+        self.storage = storage
+        self.dim = dim
+        self.index = index
+        self.metadata = metadata
+        self.tokens = tokens
+        self.full_vectors = full_vectors
+        self.trained_on = trained_on
+        # The ANN factory the index was built with, and the tuned config it should have
+        self.index_factory = index_factory
+        self.ann = ann or {}
+        self.on_release: Optional[Callable[["IndexSnapshot"], None]] = None
+        self._refs = 0
+        self._lock = threading.Lock()
+
+    @property
+    def rows(self) -> int:
+        return len(self.metadata)
+
+    def acquire(self):
+        with self._lock:
+            self._refs += 1
+
+    def release(self):
+        with self._lock:
+            self._refs -= 1
+            released = self._refs == 0
+        if released and self.on_release is not None:
+            self.on_release(self)
+
+    @classmethod
+    def empty(cls, storage: str, dim: int) -> "IndexSnapshot":
+        return cls(0, None, storage, dim, quantization.create_index(storage, dim), [], None)
+
+    @classmethod
+    def load(cls, path: Path, dim: int, mmap: bool = False) -> "IndexSnapshot":
+        """Open a version directory (or the legacy flat layout) as of its manifest."""
+        manifest = load_json_file(path / MANIFEST_FILE)
+        storage = manifest.get("storage", "float32")
+        index = quantization.read_index(storage, str(path / INDEX_FILE), mmap=mmap)
+        rows = manifest.get("rows", index.ntotal)
+
+        if (path / METADATA_FILE).exists():
+            metadata = MetadataStore(path / METADATA_FILE, count=rows)
+        else:
+            # Legacy metadata.json; converted when the writer publishes its first version
+            metadata = json.loads((path / "metadata.json").read_text())[:rows]
+
+        # Indexes written before token arrays were kept, or by an older analyzer, get them
+        # when the writer next opens them
+        tokens = TokenStore(path / TOKENS_FILE, count=rows, vocab_size=manifest.get("vocab_size")) \
+            if (path / TOKENS_FILE).exists() and manifest.get("analyzer", 1) == ANALYZER_VERSION else None
+
+        # A tuned config for another index type applies once the writer has rebuilt the index
+        index_factory = manifest.get("index_factory")
+        ann = manifest.get("ann") or {}
+        if index_factory is not None and ann_factory(ann) == index_factory:
+            quantization.set_search_params(index, ann.get("params"))
+
+        return cls(manifest.get("version", 0), path, storage, dim, index, metadata,
+                   load_full_vectors(path, manifest), manifest.get("trained_on", 0), tokens,
+                   index_factory, ann)
 
 class VectorStore:
-    def __init__(self, dim: int):
-        self.index_path = INDEX_DIR / "faiss.index"
-        self.meta_path = INDEX_DIR / "metadata.json"
-        self.index = faiss.IndexFlatL2(dim)
-        self.metadata = []
+    """FAISS index with copy-on-write versions.
+
+    Every change builds the next version off to the side in
+    `versions/v<N>` and publishes it by atomically replacing the CURRENT
+    pointer, so searches never see a half-written index or metadata that
+    doesn't match the index rows, and never wait for an ingest.
+    """
+
+    def __init__(self, dim: int, storage: str = VECTOR_STORAGE, read_only: bool = False,
+                 index_dir: Path = INDEX_DIR):
+        self.index_dir = index_dir
+        self.versions_dir = index_dir / VERSIONS_DIR
+        self.pointer_path = index_dir / CURRENT_FILE
+        self.stats_path = index_dir / STATS_FILE
+        self.dim = dim
+        self.read_only = read_only
+        self.stats = {"chunks": 0, "documents": 0, "text_bytes": 0, "last_ingest_at": None}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._reclaim_lock = threading.Lock()
+        self._open_versions: Dict[int, int] = {}
+        self._pointer_mtime_ns = None
+        self._current = None
+
+        configured_storage = quantization.validate_storage(storage)
+        path = current_version_dir(index_dir)
+        if path is not None and self.pointer_path.exists():
+            self._pointer_mtime_ns = self.pointer_path.stat().st_mtime_ns
+        self._install(IndexSnapshot.load(path, dim, mmap=read_only) if path is not None
+                      else IndexSnapshot.empty(configured_storage, dim))
+        if read_only or path is None:
+            return
+
+        self.stats = load_json_file(self.stats_path)
+        legacy = path == index_dir
+        missing_vectors = self.full_vectors is None and self.index.ntotal > 0
+        missing_tokens = self.tokens is None and len(self.metadata) > 0
+        ann_pending = configured_storage == "float32" and ann_factory(self._current.ann) != self._current.index_factory
+        if legacy or missing_vectors or missing_tokens or ann_pending or configured_storage != self.storage:
+            if configured_storage != self.storage:
+                logger.info(f"Rebuilding index from {self.storage} to {configured_storage} storage")
+            elif ann_pending:
+                logger.info(f"Rebuilding index as tuned ANN index {ann_factory(self._current.ann) or 'Flat'}")
+            with self._write_lock:
+                with self.pin() as base:
+                    snapshot = self._build_next(base, storage=configured_storage)
+                self._publish(snapshot)
+            if legacy:
+                self._remove_legacy_files()
+
+        if self.stats.get("chunks") != len(self.metadata):
+            # Missing or stale sidecar: count once from the metadata we already loaded. Sources
+            # restart in every batch, so a document total cannot be recovered from them; keep the
+            # running one, or record it as unknown if there is none
+            counted = self._count_stats(list(self.metadata))
+            documents = self.stats.get("documents") if self.stats else None
+            self.stats = {**counted, "documents": 0 if not counted["chunks"] else documents,
+                          "last_ingest_at": self.stats.get("last_ingest_at")}
+            self._write_stats()
+
+    # Attributes of the current snapshot. Rows are append-only, so ids read from
+    # one version stay valid in later ones; pin() when several must agree.
+    @property
+    def version(self) -> int:
+        return self._current.version
+
+    @property
+    def storage(self) -> str:
+        return self._current.storage
+
+    @property
+    def index(self):
+        return self._current.index
+
+    @property
+    def metadata(self):
+        return self._current.metadata
+
+    @property
+    def full_vectors(self) -> Optional[np.ndarray]:
+        return self._current.full_vectors
+
+    @property
+    def tokens(self) -> Optional[TokenStore]:
+        return self._current.tokens
+
+    @property
+    def trained_on(self) -> int:
+        return self._current.trained_on
+
+    @contextmanager
+    def pin(self):
+        """Hold the current snapshot so it stays consistent while it is in use."""
+        with self._lock:
+            snapshot = self._current
+            snapshot.acquire()
+        try:
+            yield snapshot
+        finally:
+            snapshot.release()
 
-        if self.index_path.exists():
-            self.index = faiss.read_index(str(self.index_path))
-            self.metadata = json.loads(self.meta_path.read_text())
+    def add(self, vectors: np.ndarray, metadatas: list[dict], documents: int):
+        """Append a batch; `documents` is how many input documents it came from.
 
-    def add(self, vectors: np.ndarray, metadatas: list[dict]):
-        self.index.add(vectors)
-        self.metadata.extend(metadatas)
-        self._persist()
+        Chunk sources are numbered per ingest batch, so they cannot be used to
+        count documents across batches and the caller passes the count.
+        """
+        if self.read_only:
+            raise RuntimeError("Cannot add to a read-only vector store")
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+
+        with self._write_lock:
+            with self.pin() as base:
+                snapshot = self._build_next(base, vectors, metadatas)
+
+            added = self._count_stats(metadatas)
+            self.stats["chunks"] = self.stats.get("chunks", 0) + added["chunks"]
+            # None: the total was lost with the sidecar and stays unknown
+            if self.stats.get("documents", 0) is not None:
+                self.stats["documents"] = self.stats.get("documents", 0) + documents
+            self.stats["text_bytes"] = self.stats.get("text_bytes", 0) + added["text_bytes"]
+            self.stats["last_ingest_at"] = time.time()
+            self._publish(snapshot)
+
+    def reload_if_changed(self) -> bool:
+        """Pick up an index version published by the writer process; True if it changed."""
+        try:
+            mtime_ns = self.pointer_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime_ns == self._pointer_mtime_ns:
+            return False
+
+        previous = self.version
+        for _ in range(2):
+            path = current_version_dir(self.index_dir)
+            if path == self._current.path:
+                self._pointer_mtime_ns = mtime_ns
+                return False
+            try:
+                snapshot = IndexSnapshot.load(path, self.dim, mmap=self.read_only)
+                break
+            except (FileNotFoundError, RuntimeError) as e:
+                # The version was reclaimed between reading the pointer and opening it
+                logger.warning(f"Index version {path.name} disappeared while loading, retrying: {e}")
+        else:
+            return False
+
+        self._pointer_mtime_ns = mtime_ns
+        self._install(snapshot)
+        logger.info(f"Reloaded index version {previous} -> {self.version} ({snapshot.rows} chunks)")
+        return True
 
     def search(self, query_vector: np.ndarray, top_k: int):
-        D, I = self.index.search(
-            np.array([query_vector]), top_k
-        )
-        results = []
-        for idx in I[0]:
-            if idx < len(self.metadata):
-                results.append(self.metadata[idx])
-        return results
-
-    def _persist(self):
-        faiss.write_index(self.index, str(self.index_path))
-        self.meta_path.write_text(json.dumps(self.metadata, indent=2))
+        with self.pin() as snapshot:
+            return [snapshot.metadata[idx] for idx, _ in self._search(snapshot, query_vector, top_k)]
+
+    def search_with_scores(self, query_vector: np.ndarray, top_k: int) -> List[Tuple[int, float]]:
+        """Search the index and return (doc_index, distance) pairs, lower is closer."""
+        with self.pin() as snapshot:
+            return self._search(snapshot, query_vector, top_k)
+
+    def memory_bytes(self) -> int:
+        """Approximate resident size of the compressed vector codes."""
+        snapshot = self._current
+        if snapshot.index_factory is not None and snapshot.path is not None:
+            # Inverted lists, graphs and codebooks vary too much by type to estimate; the file is close
+            return (snapshot.path / INDEX_FILE).stat().st_size
+        return int(quantization.bytes_per_vector(snapshot.storage, self.dim) * snapshot.index.ntotal)
+
+    def _search(self, snapshot: IndexSnapshot, query_vector: np.ndarray, top_k: int) -> List[Tuple[int, float]]:
+        rescore_factor = RESCORE_FACTOR if self._should_rescore(snapshot) else 1
+        results = quantization.search_index(
+            snapshot.storage, snapshot.index, np.array([query_vector]), top_k,
+            full_vectors=snapshot.full_vectors if rescore_factor > 1 else None,
+            rescore_factor=rescore_factor
+        )[0]
+        return [(idx, distance) for idx, distance in results if idx < snapshot.rows]
+
+    @staticmethod
+    def _should_rescore(snapshot: IndexSnapshot) -> bool:
+        lossy = snapshot.storage != "float32" or quantization.is_lossy(snapshot.index_factory)
+        return VECTOR_RESCORE and lossy and snapshot.full_vectors is not None
+
+    @staticmethod
+    def _needs_training(snapshot: IndexSnapshot, storage: str, total: int, factory: Optional[str] = None) -> bool:
+        if factory is not None:
+            # IVF centroids and PQ codebooks drift from the data as it grows, like int8 ranges
+            return quantization.needs_training(factory) and total >= snapshot.trained_on * 2
+        if storage != "int8":
+            return False
+        # Retrain the quantiser once the corpus has doubled so its ranges track the data
+        return storage != snapshot.storage or not snapshot.index.is_trained or total >= snapshot.trained_on * 2
+
+    def _build_next(self, base: IndexSnapshot, vectors: Optional[np.ndarray] = None,
+                    metadatas: Optional[list] = None, storage: Optional[str] = None) -> IndexSnapshot:
+        """Write version N+1 next to the live one; base is only read, never modified."""
+        metadatas = metadatas or []
+        version = base.version + 1
+        path = self.versions_dir / f"v{version}"
+        if path.exists():
+            # Left behind by a write that never got published
+            shutil.rmtree(path)
+        path.mkdir(parents=True)
+
+        full_vectors = self._extend_vectors(base, path, vectors)
+        metadata = self._extend_metadata(base, path, metadatas)
+        tokens = self._extend_tokens(base, path, metadatas)
+
+        storage = storage or base.storage
+        ann = self._tuned_ann(base)
+        factory = ann_factory(ann) if storage == "float32" else None
+        if full_vectors is None and (storage != base.storage or factory != base.index_factory):
+            logger.warning(f"Index stored as {base.storage} but no full vectors to convert; keeping it")
+            storage, factory = base.storage, base.index_factory
+
+        total = len(full_vectors) if full_vectors is not None else 0
+        if full_vectors is not None and (storage != base.storage or factory != base.index_factory
+                                         or self._needs_training(base, storage, total, factory)):
+            index, built = self._build_index(storage, np.asarray(full_vectors, dtype="float32"), factory)
+            if built != factory:
+                # Drop the config rather than retry the failing build on every open
+                ann, factory = {}, built
+            trained_on = total if storage == "int8" or quantization.needs_training(factory) else 0
+        else:
+            index = quantization.clone_index(storage, base.index)
+            if vectors is not None and len(vectors):
+                index.add(quantization.encode(storage, vectors))
+            trained_on = base.trained_on
+        if factory is not None and ann_factory(ann) == factory:
+            quantization.set_search_params(index, ann.get("params"))
+
+        quantization.write_index(storage, index, str(path / INDEX_FILE))
+        write_json_atomic(path / MANIFEST_FILE, {
+            "version": version,
+            "storage": storage,
+            "dim": self.dim,
+            "count": total,
+            "rows": len(metadata),
+            "vocab_size": len(tokens.vocabulary),
+            "analyzer": ANALYZER_VERSION,
+            "trained_on": trained_on,
+            "index_factory": factory,
+            **({"ann": ann} if ann else {})
+        })
+        return IndexSnapshot(version, path, storage, self.dim, index, metadata, full_vectors, trained_on, tokens,
+                             factory, ann)
+
+    @staticmethod
+    def _tuned_ann(base: IndexSnapshot) -> Dict[str, Any]:
+        """The ANN config to carry forward, re-read in case the tuner wrote it after this version loaded."""
+        if base.path is not None and (base.path / MANIFEST_FILE).exists():
+            return load_json_file(base.path / MANIFEST_FILE).get("ann") or {}
+        return base.ann
+
+    @staticmethod
+    def _build_index(storage: str, vectors: np.ndarray, factory: Optional[str]) -> Tuple[Any, Optional[str]]:
+        """Build the index, falling back to exact search if the ANN index can't be trained on this corpus."""
+        if factory is not None:
+            try:
+                return quantization.build_index(storage, vectors, factory), factory
+            except RuntimeError as e:
+                logger.warning(f"Cannot build ANN index {factory} on {len(vectors)} vectors, using exact search: {e}")
+        return quantization.build_index(storage, vectors), None
+
+    def _extend_vectors(self, base: IndexSnapshot, path: Path, vectors: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        """Share the base's vectors file via a hard link and append the new rows to it.
+
+        Older versions only map their own row count, so appending past it is invisible to them.
+        """
+        count = len(base.full_vectors) if base.full_vectors is not None else 0
+        target = path / VECTORS_FILE
+        parts = []
+        if count:
+            self._link_or_copy(base.path / VECTORS_FILE, target)
+            os.truncate(target, count * self.dim * 4)
+        elif base.index.ntotal > 0:
+            try:
+                # Recover vectors from an index written before they were kept on disk
+                parts.append(base.index.reconstruct_n(0, base.index.ntotal))
+            except RuntimeError as e:
+                logger.warning(f"Cannot recover full vectors from existing index, rescoring disabled: {e}")
+                return None
+        if vectors is not None and len(vectors):
+            parts.append(vectors)
+
+        added = 0
+        with open(target, "ab") as f:
+            for part in parts:
+                part = np.ascontiguousarray(part, dtype="float32")
+                f.write(part.tobytes())
+                added += len(part)
+        if count + added == 0:
+            return None
+        return np.memmap(target, dtype="float32", mode="r", shape=(count + added, self.dim))
+
+    def _extend_metadata(self, base: IndexSnapshot, path: Path, metadatas: list) -> MetadataStore:
+        target = path / METADATA_FILE
+        if isinstance(base.metadata, MetadataStore) and base.rows:
+            self._link_or_copy(base.metadata.path, target)
+            self._link_or_copy(base.metadata.offsets_path, target.with_suffix(".offsets"))
+            metadata = MetadataStore(target, count=base.rows)
+            if metadatas:
+                metadata.append(metadatas)
+            return metadata
+        return MetadataStore.create(target, list(base.metadata) + metadatas)
+
+    def _extend_tokens(self, base: IndexSnapshot, path: Path, metadatas: list) -> TokenStore:
+        """Analyze only the new chunks; earlier rows and the vocabulary are linked from the base."""
+        target = path / TOKENS_FILE
+        texts = [m.get("text", "") for m in metadatas]
+        if base.tokens is not None and base.rows:
+            for source in (base.tokens.path, base.tokens.offsets_path, base.tokens.vocab_path):
+                self._link_or_copy(source, path / source.name)
+            tokens = TokenStore(target, count=base.rows, vocab_size=len(base.tokens.vocabulary))
+            if texts:
+                tokens.append(texts)
+            return tokens
+        return TokenStore.create(target, [m.get("text", "") for m in base.metadata] + texts)
+
+    @staticmethod
+    def _link_or_copy(source: Path, target: Path):
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copyfile(source, target)
+
+    def _publish(self, snapshot: IndexSnapshot):
+        """Atomically point CURRENT at a fully written version and start serving it."""
+        tmp_path = self.pointer_path.with_name(f".{CURRENT_FILE}.{os.getpid()}.tmp")
+        tmp_path.write_text(snapshot.path.name)
+        os.replace(tmp_path, self.pointer_path)
+        self._pointer_mtime_ns = self.pointer_path.stat().st_mtime_ns
+        self._install(snapshot)
+        self._write_stats()
+
+    def _install(self, snapshot: IndexSnapshot):
+        snapshot.on_release = self._on_release
+        snapshot.acquire()
+        with self._lock:
+            previous, self._current = self._current, snapshot
+            self._open_versions[snapshot.version] = self._open_versions.get(snapshot.version, 0) + 1
+        if previous is not None:
+            previous.release()
+
+    def _on_release(self, snapshot: IndexSnapshot):
+        with self._lock:
+            remaining = self._open_versions.get(snapshot.version, 1) - 1
+            if remaining:
+                self._open_versions[snapshot.version] = remaining
+            else:
+                self._open_versions.pop(snapshot.version, None)
+        if not self.read_only:
+            self._reclaim()
+
+    def _reclaim(self):
+        """Delete version directories that are neither recent nor pinned by this process.
+
+        Other processes that still map files of a deleted version keep reading
+        them; the data is only freed once they reload.
+        """
+        if not self.versions_dir.exists():
+            return
+        with self._reclaim_lock:
+            with self._lock:
+                keep_from = self._current.version - INDEX_KEEP_VERSIONS + 1
+                in_use = set(self._open_versions)
+            for path in self.versions_dir.iterdir():
+                try:
+                    version = int(path.name.lstrip("v"))
+                except ValueError:
+                    continue
+                if version < keep_from and version not in in_use:
+                    shutil.rmtree(path, ignore_errors=True)
+                    logger.info(f"Reclaimed index version {version}")
+
+    def _remove_legacy_files(self):
+        for name in LEGACY_FILES:
+            legacy_path = self.index_dir / name
+            if legacy_path.exists():
+                legacy_path.unlink()
+        logger.info("Migrated index to versioned snapshots")
+
+    @staticmethod
+    def _count_stats(metadatas: list) -> Dict[str, Any]:
+        return {
+            "chunks": len(metadatas),
+            "text_bytes": sum(len(m.get("text", "").encode("utf-8")) for m in metadatas),
+        }
+
+    def _write_stats(self):
+        """Write the stats sidecar read by health checks instead of parsing metadata.json."""
+        index_path = self._current.path / INDEX_FILE if self._current.path is not None else None
+        self.stats.update({
+            "storage": self.storage,
+            "index_factory": self._current.index_factory,
+            "dim": self.dim,
+            "version": self.version,
+            "index_bytes": index_path.stat().st_size if index_path is not None and index_path.exists() else 0,
+            "vector_bytes": self.memory_bytes(),
+            "updated_at": time.time(),
+        })
+        write_json_atomic(self.stats_path, self.stats)
@@ -0,0 +1,70 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import get_context
+from typing import Any, Callable, Dict, List
+from app.config import SERVING_WORKERS
+from app.utils.logger import logger
+
+def _init_worker():
+    """Runs once in each worker: open the index read-only and load models."""
+    from app.core import components
+
+    components.use_read_only_index()
+    components.warm_up()
+
+def _call(fn: Callable, args: tuple, kwargs: Dict[str, Any]) -> Any:
+    from app.core.components import sync_index
+
+    sync_index()
+    return fn(*args, **kwargs)
+
+def _describe() -> Dict[str, Any]:
+    from app.core.components import get_vector_store, readiness
+
+    store = get_vector_store()
+    return {
+        "pid": os.getpid(),
+        "status": readiness()["status"],
+        "index_version": store.version,
+        "chunks": len(store.metadata),
+    }
+
+class WorkerPool:
+    """Worker processes serving search and answer calls behind the MCP front end.
+
+    Each worker has its own models and GIL but opens the persisted index with
+    FAISS mmap/read-only flags and the metadata through memory-mapped files, so
+    the page cache is shared instead of the index being copied per process. The
+    MCP process stays the single writer; before each call a worker checks the
+    manifest and switches to a newly published index version.
+    """
+
+    def __init__(self, workers: int = SERVING_WORKERS):
+        self.workers = workers
+        # Split cores between workers unless the thread counts were set explicitly
+        threads = max((os.cpu_count() or 1) // workers, 1)
+        os.environ.setdefault("INFERENCE_INTRA_OP_THREADS", str(threads))
+        os.environ.setdefault("OMP_NUM_THREADS", str(threads))
+        # spawn: forking a process that may have loaded torch or faiss is not safe
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=get_context("spawn"), initializer=_init_worker
+        )
+
+    def warm_up(self) -> List[Dict[str, Any]]:
+        """Start every worker and wait until its models and index are loaded."""
+        futures = [self._executor.submit(_describe) for _ in range(self.workers)]
+        wait(futures)
+        workers = [future.result() for future in futures]
+        logger.info(f"{self.workers} serving workers ready: {workers}")
+        return workers
+
+    def submit(self, fn: Callable, *args, **kwargs):
+        return self._executor.submit(_call, fn, args, kwargs)
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a module-level function in a worker and await its (picklable) result."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
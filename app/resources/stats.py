@@ -1,44 +1,109 @@
 import os
+import threading
+import time
 from pathlib import Path
-from app.config import INDEX_DIR, PROCESSED_DIR, RAW_DIR
+from typing import Any, Dict, Optional
+from app.config import INDEX_DIR, PROCESSED_DIR, RAW_DIR, DATA_STATS_TTL
+from app.core.residency import residency
+from app.core.vector_store import STATS_FILE
 from app.utils.ytils import load_json_file
+from app.utils.metrics import metrics
 
-def get_index_stats():
-    """Get statistics about the vector index."""
-    index_path = INDEX_DIR / "faiss.index"
-    meta_path = INDEX_DIR / "metadata.json"
+_lock = threading.Lock()
+# Stats sidecar path -> (mtime_ns, stats)
+_sidecar_cache: Dict[Path, tuple] = {}
+_data_cache: Dict[str, Any] = {"at": 0.0, "stats": None}
 
-    stats = {
-        "index_exists": index_path.exists(),
-        "metadata_exists": meta_path.exists(),
-        "index_size_mb": 0,
-        "total_documents": 0
+def load_index_stats(index_dir: Path = INDEX_DIR) -> Dict[str, Any]:
+    """Counters from a collection's stats sidecar, re-read only when the file changes."""
+    stats_path = index_dir / STATS_FILE
+    try:
+        mtime_ns = stats_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return {}
+
+    with _lock:
+        cached = _sidecar_cache.get(stats_path)
+        if cached is None or cached[0] != mtime_ns:
+            cached = _sidecar_cache[stats_path] = (mtime_ns, load_json_file(stats_path))
+        return dict(cached[1])
+
+def get_index_stats(index_dir: Path = INDEX_DIR):
+    """Get statistics about a collection's vector index (the default collection unless given)."""
+    sidecar = load_index_stats(index_dir)
+
+    return {
+        "index_exists": bool(sidecar) or (index_dir / "faiss.index").exists(),
+        "index_size_mb": sidecar.get("index_bytes", 0) / (1024 * 1024),
+        "index_type": sidecar.get("storage"),
+        "vector_memory_mb": sidecar.get("vector_bytes", 0) / (1024 * 1024),
+        # Number of indexed chunks, kept under its historical name
+        "total_documents": sidecar.get("chunks", 0),
+        "chunks": sidecar.get("chunks", 0),
+        # None when the sidecar was rebuilt without a running total
+        "documents": sidecar.get("documents", 0),
+        "text_mb": sidecar.get("text_bytes", 0) / (1024 * 1024),
+        "last_ingest_at": sidecar.get("last_ingest_at"),
     }
 
-    if index_path.exists():
-        stats["index_size_mb"] = index_path.stat().st_size / (1024 * 1024)
+def get_collections_stats() -> Dict[str, Any]:
+    """Per-collection index stats, read from each collection's sidecar without loading it."""
+    from app.core.collection import collection_dir, list_collections
 
-    if meta_path.exists():
-        metadata = load_json_file(meta_path)
-        stats["total_documents"] = len(metadata)
+    return {name: get_index_stats(collection_dir(name)) for name in list_collections()}
 
-    return stats
+def _scan_dir(path: Path) -> tuple:
+    count = 0
+    size = 0
+    if path.exists():
+        with os.scandir(path) as entries:
+            for entry in entries:
+                count += 1
+                size += entry.stat().st_size
+    return count, size
 
-def get_data_stats():
-    """Get statistics about the data directories."""
-    raw_files = list(RAW_DIR.glob("*"))
-    processed_files = list(PROCESSED_DIR.glob("*"))
+def get_data_stats(max_age: Optional[float] = None):
+    """Get statistics about the data directories, rescanned at most every DATA_STATS_TTL seconds."""
+    max_age = DATA_STATS_TTL if max_age is None else max_age
+    with _lock:
+        if _data_cache["stats"] is not None and time.monotonic() - _data_cache["at"] < max_age:
+            return dict(_data_cache["stats"])
 
-    return {
-        "raw_files_count": len(raw_files),
-        "processed_files_count": len(processed_files),
-        "raw_dir_size_mb": sum(f.stat().st_size for f in raw_files) / (1024 * 1024) if raw_files else 0,
-        "processed_dir_size_mb": sum(f.stat().st_size for f in processed_files) / (1024 * 1024) if processed_files else 0
+    raw_count, raw_size = _scan_dir(RAW_DIR)
+    processed_count, processed_size = _scan_dir(PROCESSED_DIR)
+    stats = {
+        "raw_files_count": raw_count,
+        "processed_files_count": processed_count,
+        "raw_dir_size_mb": raw_size / (1024 * 1024),
+        "processed_dir_size_mb": processed_size / (1024 * 1024)
     }
+    with _lock:
+        _data_cache.update(at=time.monotonic(), stats=stats)
+    return dict(stats)
+
+def get_metrics_stats():
+    """Get rolling per-stage latency histograms and counters."""
+    from app.core.llm import answer_flight
+    from app.core.resilience import breaker_stats
+    from app.core.model_selection import latency_stats
+    from app.core.ingest_queue import get_ingest_queue
+    from app.core.components import batcher_stats, collection_stats
+
+    snapshot = metrics.snapshot()
+    snapshot["singleflight"] = {"llm": answer_flight.stats()}
+    snapshot["circuit_breakers"] = breaker_stats()
+    snapshot["model_latency"] = latency_stats()
+    snapshot["ingest_queue"] = get_ingest_queue().stats()
+    snapshot["batchers"] = batcher_stats()
+    snapshot["residency"] = residency.stats()
+    snapshot["collections"] = collection_stats()
+    return snapshot
 
 def get_system_stats():
     """Get overall system statistics."""
     return {
         "index": get_index_stats(),
-        "data": get_data_stats()
+        "collections": get_collections_stats(),
+        "data": get_data_stats(),
+        "metrics": get_metrics_stats()
     }
\ No newline at end of file
@@ -1,8 +1,11 @@
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 class AnswerRequest(BaseModel):
     question: str
+    collection: str = "default"
+    latency_budget_ms: Optional[float] = None
+    quality: Optional[str] = None  # fast | balanced | best
 
 class SourceDocument(BaseModel):
     text: str
@@ -1,10 +1,23 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 class IngestRequest(BaseModel):
     documents: List[str]
+    collection: str = "default"
 
 class IngestResponse(BaseModel):
     documents: int
     chunks: int
-    status: str = "success"
\ No newline at end of file
+    collection: str = "default"
+    status: str = "success"
+
+class IngestJobResponse(BaseModel):
+    job_id: str
+    collection: str = "default"
+    status: str  # queued | running | done | failed | unknown
+    documents: int = 0
+    chunks: int = 0
+    batch_size: int = 0  # Documents committed together with this job
+    error: Optional[str] = None
+    submitted_at: Optional[float] = None
+    finished_at: Optional[float] = None
@@ -4,6 +4,7 @@ from typing import List, Dict, Any
 class SearchRequest(BaseModel):
     query: str
     top_k: int = 5
+    collection: str = "default"
 
 class SearchResult(BaseModel):
     text: str
@@ -12,4 +13,5 @@ class SearchResult(BaseModel):
 
 class SearchResponse(BaseModel):
     results: List[SearchResult]
-    query: str
\ No newline at end of file
+    query: str
+    collection: str = "default"
\ No newline at end of file
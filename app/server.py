@@ -1,17 +1,30 @@
 import asyncio
-from mcp import Tool
-from mcp.server import Server
-from mcp.types import TextContent, PromptMessage
-import mcp.server.stdio
-from app.tools.health import health_check
-from app.tools.ingest import ingest_documents
+import json
+from typing import Optional
+from mcp.server.fastmcp import FastMCP
+from mcp.types import TextContent
+from app.tools.health import health_check, liveness_check, readiness_check
+from app.tools.ingest import ingest_documents, submit_ingest, get_ingest_status
 from app.tools.search import search_knowledge
 from app.tools.answer import answer_question
 from app.schemas.ingest import IngestRequest
 from app.schemas.search import SearchRequest
 from app.schemas.answer import AnswerRequest
+from app.core.components import warm_up
+from app.core.workers import WorkerPool
+from app.config import SERVING_WORKERS
+from app.resources.stats import get_system_stats, get_metrics_stats
+from app.utils.logger import logger
 
-server = Server("rag-mcp")
+server = FastMCP("rag-mcp")
+# Created in main(): spawned workers import this module too and must not start pools of their own
+pool: Optional[WorkerPool] = None
+
+async def _run(fn, *args):
+    """Run a blocking tool function in a serving worker, or a thread when there are none."""
+    if pool is not None:
+        return await pool.run(fn, *args)
+    return await asyncio.to_thread(fn, *args)
 
 @server.tool()
 async def health() -> list[TextContent]:
@@ -20,50 +33,99 @@ async def health() -> list[TextContent]:
     return [TextContent(type="text", text=str(result))]
 
 @server.tool()
-async def ingest(documents: str) -> list[TextContent]:
-    """Ingest documents into the vector store. Documents should be a JSON array of strings."""
-    import json
+async def live() -> list[TextContent]:
+    """Constant-time liveness check."""
+    return [TextContent(type="text", text=json.dumps(liveness_check()))]
+
+@server.tool()
+async def ready() -> list[TextContent]:
+    """Report whether models and the index are loaded."""
+    return [TextContent(type="text", text=json.dumps(readiness_check(), default=str))]
+
+@server.tool()
+async def ingest(documents: str, wait: bool = False, collection: str = "default") -> list[TextContent]:
+    """Ingest documents into a collection. Documents should be a JSON array of strings.
+    Returns a job id immediately; poll ingest_status, or pass wait=true to block until committed.
+    Collections are created on first ingest.
+    """
     try:
         docs = json.loads(documents)
-        result = ingest_documents(docs)
+        if wait:
+            result = await asyncio.to_thread(ingest_documents, docs, collection)
+        else:
+            result = submit_ingest(docs, collection)
         return [TextContent(type="text", text=str(result))]
     except Exception as e:
         return [TextContent(type="text", text=f"Error: {str(e)}")]
 
 @server.tool()
-async def search(query: str, top_k: int = 5) -> list[TextContent]:
-    """Search the knowledge base for relevant documents."""
+async def ingest_status(job_id: str) -> list[TextContent]:
+    """Get the status of an ingest job returned by the ingest tool."""
+    return [TextContent(type="text", text=str(get_ingest_status(job_id)))]
+
+@server.tool()
+async def search(query: str, top_k: int = 5, collection: str = "default") -> list[TextContent]:
+    """Search a collection of the knowledge base for relevant documents."""
     try:
-        results = search_knowledge(query)
+        results = await _run(search_knowledge, query, top_k, collection)
         return [TextContent(type="text", text=str(results))]
     except Exception as e:
         return [TextContent(type="text", text=f"Error: {str(e)}")]
 
 @server.tool()
-async def answer(question: str, use_planner: bool = False, use_tool_calling: bool = False, stream: bool = False) -> list[TextContent]:
+async def answer(question: str, use_planner: bool = False, use_tool_calling: bool = False, stream: bool = False,
+                 collection: str = "default", latency_budget_ms: float = 0,
+                 quality: str = "balanced") -> list[TextContent]:
     """Answer a question using advanced RAG features.
     - use_planner: Use multi-agent planner for complex queries
     - use_tool_calling: Use tool-calling agent for dynamic tool usage
     - stream: Enable streaming response (async)
+    - collection: Named collection to answer from
+    - latency_budget_ms: End-to-end budget; picks the largest model expected to finish in time (0 = none)
+    - quality: Model tier cap: fast, balanced (the agent's model) or best
     """
     try:
         if stream:
             # For streaming, we'd need async handling - not supported in current MCP setup
-            result = answer_question(question, use_planner, use_tool_calling, stream=False)
+            result = await _run(answer_question, question, use_planner, use_tool_calling, False, collection,
+                                latency_budget_ms, quality)
             return [TextContent(type="text", text=f"Streaming not supported in MCP. Answer: {result.answer}")]
         else:
-            result = answer_question(question, use_planner, use_tool_calling, stream)
+            result = await _run(answer_question, question, use_planner, use_tool_calling, stream, collection,
+                                latency_budget_ms, quality)
             return [TextContent(type="text", text=str(result))]
     except Exception as e:
         return [TextContent(type="text", text=f"Error: {str(e)}")]
 
+@server.resource("stats://system", mime_type="application/json")
+async def system_stats() -> str:
+    """Index, data directory and per-stage latency statistics."""
+    return json.dumps(get_system_stats(), indent=2, default=str)
+
+@server.resource("stats://metrics", mime_type="application/json")
+async def metrics_stats() -> str:
+    """Rolling per-stage latency histograms and counters."""
+    return json.dumps(get_metrics_stats(), indent=2)
+
+def _log_warm_up_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Warm-up task failed: {task.exception()}")
+
 async def main():
-    async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
-        await server.run(
-            read_stream,
-            write_stream,
-            server.create_initialization_options()
-        )
+    global pool
+    if SERVING_WORKERS > 0:
+        pool = WorkerPool(SERVING_WORKERS)
+
+    # Load models and the index in the background so the handshake isn't blocked
+    warm_up_task = asyncio.create_task(asyncio.to_thread(warm_up, pool))
+    warm_up_task.add_done_callback(_log_warm_up_failure)
+    try:
+        await server.run_stdio_async()
+    finally:
+        # Stop waiting on a warm-up still running at shutdown; its thread finishes on its own
+        warm_up_task.cancel()
+        if pool is not None:
+            pool.shutdown()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
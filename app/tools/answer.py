@@ -1,30 +1,65 @@
-from app.core.retriever import Retriever
-from app.core.vector_store import VectorStore
-from app.core.llm import generate_answer, generate_answer_stream
-from app.core.embeddings import EmbeddingModel
-from app.core.router import QueryRouter, AgentType
+from app.core.collection import DEFAULT_COLLECTION
+from app.core.components import get_collection_retriever, get_router
+from app.core.llm import generate_answer, generate_answer_stream, warm_client
+from app.core.pipeline import Pipeline
+from app.core.router import AgentType
 from app.core.rag_planner import RAGPlanner
-from app.core.tool_calling_agent import ToolCallingAgent
 from app.core.context_compressor import ContextCompressor
 from app.schemas.answer import AnswerRequest, AnswerResponse, SourceDocument
 from app.utils.logger import logger
+from app.utils.metrics import metrics
 import asyncio
-
-def answer_question(question: str, use_planner: bool = False, use_tool_calling: bool = False, stream: bool = False) -> AnswerResponse:
-    """Answer a question using advanced RAG features."""
+import time
+from typing import Optional
+
+def _deadline(latency_budget_ms: Optional[float]) -> Optional[float]:
+    """Absolute time.monotonic() deadline for a request's latency budget."""
+    return time.monotonic() + latency_budget_ms / 1000 if latency_budget_ms else None
+
+def _answer_pipeline(question: str, retriever, context_compressor: ContextCompressor) -> Pipeline:
+    """Route, retrieve and compress as concurrent stages, opening the LLM connection meanwhile.
+
+    The query is embedded once up front if the router can use it, and retrieval
+    reuses the vector; otherwise retrieval embeds it while BM25 runs. Routing
+    then overlaps retrieval instead of preceding it.
+    """
+    router = get_router()
+    embedder = retriever.hybrid_search.embedder
+
+    def route(query_vector):
+        with metrics.timer("route"):
+            return router.route_query(question, query_vector)
+
+    pipeline = Pipeline("answer")
+    pipeline.stage("embed", lambda: embedder.embed_query(question) if router.uses_embeddings else None)
+    pipeline.stage("route", route, "embed")
+    pipeline.stage("warm_llm", warm_client)
+    pipeline.stage("retrieve", lambda query_vector: retriever.retrieve(question, query_vector), "embed")
+    pipeline.stage("compress", lambda docs: context_compressor.compress_context(question, docs), "retrieve")
+    return pipeline
+
+@metrics.timed("answer.total")
+def answer_question(question: str, use_planner: bool = False, use_tool_calling: bool = False, stream: bool = False,
+                    collection: str = DEFAULT_COLLECTION, latency_budget_ms: Optional[float] = None,
+                    quality: Optional[str] = None) -> AnswerResponse:
+    """Answer a question from one collection using advanced RAG features.
+
+    With latency_budget_ms the LLM and its max_tokens are chosen to finish within
+    whatever of the budget retrieval leaves; quality caps the model tier.
+    """
     try:
         logger.info(f"Answering question: {question}")
+        deadline = _deadline(latency_budget_ms)
 
-        # Initialize components
-        embedder = EmbeddingModel()
-        vector_dim = len(embedder.embed_query("test"))
-        store = VectorStore(vector_dim)
-        retriever = Retriever(store)
-        context_compressor = ContextCompressor()
+        # Reuse the shared models and the collection's already-loaded index
+        retriever = get_collection_retriever(collection)
+        context_compressor = ContextCompressor(vector_store=retriever.vector_store)
 
         # Use tool-calling agent if requested
         if use_tool_calling:
-            agent = ToolCallingAgent()
+            # Imported here: the agent module itself imports this one
+            from app.core.tool_calling_agent import ToolCallingAgent
+            agent = ToolCallingAgent(collection)
             result = agent.execute_with_tools(question)
             return AnswerResponse(
                 answer=result["answer"],
@@ -35,7 +70,7 @@ def answer_question(question: str, use_planner: bool = False, use_tool_calling:
 
         # Use planner for complex queries if requested
         if use_planner:
-            planner = RAGPlanner()
+            planner = RAGPlanner(retriever.vector_store, deadline, quality)
             result = planner.plan_and_execute(question, retriever)
             return AnswerResponse(
                 answer=result["answer"],
@@ -44,21 +79,18 @@ def answer_question(question: str, use_planner: bool = False, use_tool_calling:
                 agent_used="multi_agent_planner"
             )
 
-        # Standard RAG pipeline
-        agent_type = QueryRouter().route_query(question)
-
-        # Retrieve documents
-        docs = retriever.retrieve(question)
-
-        # Compress context if needed
-        context = context_compressor.compress_context(question, docs)
+        # Standard RAG pipeline, with generation starting once routing and compression are both done
+        pipeline = _answer_pipeline(question, retriever, context_compressor)
+        pipeline.stage("generate",
+                       lambda agent_type, context, _: generate_answer(context, question, agent_type, deadline, quality),
+                       "route", "compress", "warm_llm")
+        run = pipeline.run()
+        agent_type, docs, answer = run.results["route"], run.results["retrieve"], run.results["generate"]
 
-        # Generate answer (streaming not supported in sync response)
+        # Streaming not supported in sync response
         if stream:
             # For streaming, we'd need async handling - return note about streaming
-            answer = generate_answer(context, question, agent_type) + " [Note: Streaming requested but not available in sync mode]"
-        else:
-            answer = generate_answer(context, question, agent_type)
+            answer += " [Note: Streaming requested but not available in sync mode]"
 
         # Format sources
         sources = [
@@ -80,43 +112,40 @@ def answer_question(question: str, use_planner: bool = False, use_tool_calling:
         logger.error(f"Error answering question: {str(e)}")
         raise
 
-async def answer_question_stream(question: str, use_planner: bool = False, use_tool_calling: bool = False) -> str:
+async def answer_question_stream(question: str, use_planner: bool = False, use_tool_calling: bool = False,
+                                 collection: str = DEFAULT_COLLECTION, latency_budget_ms: Optional[float] = None,
+                                 quality: Optional[str] = None) -> str:
     """Answer a question with streaming response."""
     try:
         logger.info(f"Streaming answer for question: {question}")
+        deadline = _deadline(latency_budget_ms)
 
-        # Initialize components
-        embedder = EmbeddingModel()
-        vector_dim = len(embedder.embed_query("test"))
-        store = VectorStore(vector_dim)
-        retriever = Retriever(store)
-        context_compressor = ContextCompressor()
+        # Reuse the shared models and the collection's already-loaded index
+        retriever = get_collection_retriever(collection)
+        context_compressor = ContextCompressor(vector_store=retriever.vector_store)
 
         # Use tool-calling agent if requested (streaming not supported)
         if use_tool_calling:
-            agent = ToolCallingAgent()
+            # Imported here: the agent module itself imports this one
+            from app.core.tool_calling_agent import ToolCallingAgent
+            agent = ToolCallingAgent(collection)
             result = agent.execute_with_tools(question)
             yield result["answer"]
             return
 
         # Use planner for complex queries if requested
         if use_planner:
-            planner = RAGPlanner()
+            planner = RAGPlanner(retriever.vector_store, deadline, quality)
             result = planner.plan_and_execute(question, retriever)
             yield result["answer"]
             return
 
-        # Standard streaming RAG pipeline
-        agent_type = QueryRouter().route_query(question)
-
-        # Retrieve documents
-        docs = retriever.retrieve(question)
-
-        # Compress context if needed
-        context = context_compressor.compress_context(question, docs)
+        # Standard streaming RAG pipeline: everything up to generation runs as stages off the event loop
+        run = await asyncio.to_thread(_answer_pipeline(question, retriever, context_compressor).run)
+        agent_type, context = run.results["route"], run.results["compress"]
 
         # Stream the answer
-        async for chunk in generate_answer_stream(context, question, agent_type):
+        async for chunk in generate_answer_stream(context, question, agent_type, deadline, quality):
             yield chunk
 
     except Exception as e:
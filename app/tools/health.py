@@ -1,4 +1,5 @@
 from app.resources.stats import get_system_stats
+from app.core.components import liveness, readiness
 from app.utils.logger import logger
 
 def health_check():
@@ -7,6 +8,7 @@ def health_check():
         stats = get_system_stats()
         return {
             "status": "healthy",
+            "readiness": readiness(),
             "stats": stats
         }
     except Exception as e:
@@ -15,3 +17,11 @@ def health_check():
             "status": "unhealthy",
             "error": str(e)
         }
+
+def liveness_check():
+    """Cheap check that the server process is responsive."""
+    return liveness()
+
+def readiness_check():
+    """Check whether models and the index are loaded and ready to serve queries."""
+    return readiness()
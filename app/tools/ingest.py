@@ -1,34 +1,39 @@
-from app.core.chunking import chunk_text
-from app.core.embeddings import EmbeddingModel
-from app.core.vector_store import VectorStore
-from app.config import CHUNK_SIZE, CHUNK_OVERLAP
-from app.schemas.ingest import IngestRequest, IngestResponse
+from app.core.chunking import chunk_documents
+from app.core.collection import DEFAULT_COLLECTION
+from app.core.components import get_embedder, use_collection, notify_index_updated
+from app.core.ingest_queue import get_ingest_queue
+from app.config import CHUNK_SIZE, CHUNK_OVERLAP, CHILD_CHUNK_SIZE, SMALL_TO_BIG
+from app.schemas.ingest import IngestRequest, IngestResponse, IngestJobResponse
 from app.utils.logger import logger
 
-def ingest_documents(texts: list[str]) -> IngestResponse:
-    """Ingest documents into the vector store."""
+def ingest_documents(texts: list[str], collection: str = DEFAULT_COLLECTION) -> IngestResponse:
+    """Ingest documents into a collection's vector store."""
     try:
-        logger.info(f"Ingesting {len(texts)} documents")
-        embedder = EmbeddingModel()
-        chunks = []
-        metadatas = []
-
-        for i, text in enumerate(texts):
-            text_chunks = chunk_text(text, CHUNK_SIZE, CHUNK_OVERLAP)
-            for chunk in text_chunks:
-                chunks.append(chunk)
-                metadatas.append({"source": f"doc_{i}", "text": chunk})
+        logger.info(f"Ingesting {len(texts)} documents into collection {collection}")
+        chunks, metadatas = chunk_documents(
+            texts, CHUNK_SIZE, CHUNK_OVERLAP, CHILD_CHUNK_SIZE if SMALL_TO_BIG else 0
+        )
 
         if chunks:
-            vectors = embedder.embed_documents(chunks)
-            store = VectorStore(vectors.shape[1])
-            store.add(vectors, metadatas)
+            vectors = get_embedder().embed_documents(chunks)
+            with use_collection(collection) as target:
+                target.vector_store.add(vectors, metadatas, documents=len(texts))
+            notify_index_updated(target.name)
             logger.info(f"Successfully ingested {len(chunks)} chunks from {len(texts)} documents")
 
         return IngestResponse(
             documents=len(texts),
-            chunks=len(chunks)
+            chunks=len(chunks),
+            collection=collection
         )
     except Exception as e:
         logger.error(f"Error ingesting documents: {str(e)}")
         raise
+
+def submit_ingest(texts: list[str], collection: str = DEFAULT_COLLECTION) -> IngestJobResponse:
+    """Queue documents for ingestion and return a job id without waiting for it."""
+    return get_ingest_queue().submit(texts, collection)
+
+def get_ingest_status(job_id: str) -> IngestJobResponse:
+    """Report the progress of a queued ingest job."""
+    return get_ingest_queue().status(job_id)
@@ -1,30 +1,30 @@
-from app.core.vector_store import VectorStore
-from app.core.embeddings import EmbeddingModel
+from app.core.collection import DEFAULT_COLLECTION
+from app.core.components import get_embedder, use_collection
 from app.config import TOP_K
 from app.schemas.search import SearchRequest, SearchResponse, SearchResult
 from app.utils.logger import logger
 
-def search_knowledge(query: str, top_k: int = TOP_K) -> SearchResponse:
-    """Search the knowledge base for relevant documents."""
+def search_knowledge(query: str, top_k: int = TOP_K, collection: str = DEFAULT_COLLECTION) -> SearchResponse:
+    """Search a collection of the knowledge base for relevant documents."""
     try:
-        logger.info(f"Searching for: {query}")
-        embedder = EmbeddingModel()
-        vector = embedder.embed_query(query)
+        logger.info(f"Searching collection {collection} for: {query}")
+        vector = get_embedder().embed_query(query)
 
-        store = VectorStore(len(vector))
-        raw_results = store.search(vector, top_k)
+        with use_collection(collection) as target:
+            store = target.vector_store
+            raw_results = store.search_with_scores(vector, top_k)
 
-        results = [
-            SearchResult(
-                text=result.get("text", ""),
-                source=result.get("source", ""),
-                score=0.0  # FAISS doesn't return scores in this implementation
-            )
-            for result in raw_results
-        ]
+            results = [
+                SearchResult(
+                    text=store.metadata[idx].get("text", ""),
+                    source=store.metadata[idx].get("source", ""),
+                    score=1.0 / (1.0 + distance)  # Map L2/Hamming distance into (0, 1]
+                )
+                for idx, distance in raw_results
+            ]
 
         logger.info(f"Found {len(results)} results")
-        return SearchResponse(results=results, query=query)
+        return SearchResponse(results=results, query=query, collection=target.name)
     except Exception as e:
         logger.error(f"Error searching knowledge base: {str(e)}")
         raise
@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, List, Tuple
+from app.utils.metrics import metrics
+
+class MicroBatcher:
+    """Gathers concurrent single-item calls into one batched call.
+
+    Callers submit an item and wait on a future. A worker thread takes the
+    first waiting item, keeps collecting for up to `window` seconds or until
+    `max_batch` items are queued, runs `fn` once on the whole batch and hands
+    each caller its own result. With a single caller the cost is at most one
+    window of extra latency; under load the window fills and batches grow.
+    """
+
+    def __init__(self, name: str, fn: Callable[[List[Any]], List[Any]], max_batch: int, window: float):
+        self.name = name
+        self.fn = fn
+        self.max_batch = max(max_batch, 1)
+        self.window = window
+        self._queue: Deque[Tuple[Any, Future, int]] = deque()
+        self._cond = threading.Condition()
+        self._worker = None
+        self.batches = 0
+        self.items = 0
+        self.max_depth = 0
+
+    def submit(self, item: Any) -> Future:
+        future = Future()
+        with self._cond:
+            self._queue.append((item, future, time.perf_counter_ns()))
+            self.max_depth = max(self.max_depth, len(self._queue))
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name=f"batcher-{self.name}", daemon=True)
+                self._worker.start()
+            self._cond.notify()
+        return future
+
+    def __call__(self, item: Any) -> Any:
+        return self.submit(item).result()
+
+    def _next_batch(self) -> List[Tuple[Any, Future, int]]:
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            deadline = time.monotonic() + self.window
+            while len(self._queue) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return [self._queue.popleft() for _ in range(min(self.max_batch, len(self._queue)))]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            started = time.perf_counter_ns()
+            for _, _, enqueued in batch:
+                metrics.observe(f"batcher.{self.name}.wait", started - enqueued)
+
+            try:
+                with metrics.timer(f"batcher.{self.name}.batch"):
+                    results = self.fn([item for item, _, _ in batch])
+                # zip() would leave the unmatched callers waiting forever
+                if len(results) != len(batch):
+                    raise ValueError(f"Batcher {self.name}: {len(results)} results for {len(batch)} items")
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+
+            self.batches += 1
+            self.items += len(batch)
+            metrics.incr(f"batcher.{self.name}.batches")
+            metrics.incr(f"batcher.{self.name}.items", len(batch))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            depth = len(self._queue)
+        return {
+            "queue_depth": depth,
+            "max_queue_depth": self.max_depth,
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
@@ -0,0 +1,26 @@
+import importlib
+from types import ModuleType
+from typing import Any, Optional
+
+class LazyModule:
+    """Module proxy that defers the real import until an attribute is first used."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[ModuleType] = None
+
+    def _load(self) -> ModuleType:
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+def lazy_import(name: str) -> LazyModule:
+    """Return a proxy for a heavy module that is only imported on first use."""
+    return LazyModule(name)
@@ -6,8 +6,8 @@ def setup_logger(name: str = "rag-mcp", level: int = logging.INFO) -> logging.Lo
     logger = logging.getLogger(name)
     logger.setLevel(level)
 
-    # Create console handler
-    console_handler = logging.StreamHandler(sys.stdout)
+    # Create console handler on stderr; stdout carries the MCP stdio protocol
+    console_handler = logging.StreamHandler(sys.stderr)
     console_handler.setLevel(level)
 
     # Create formatter
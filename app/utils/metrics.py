@@ -0,0 +1,114 @@
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Any, Callable
+from app.config import METRICS_ENABLED, METRICS_WINDOW
+
+class RollingHistogram:
+    """Keeps the most recent latency samples (nanoseconds) in a fixed-size ring buffer."""
+
+    def __init__(self, size: int = METRICS_WINDOW):
+        self._samples = array("q", [0] * size)
+        self._size = size
+        self._next = 0
+        self._filled = 0
+        self.count = 0
+        self.total_ns = 0
+
+    def record(self, value_ns: int):
+        self._samples[self._next] = value_ns
+        self._next = (self._next + 1) % self._size
+        self._filled = min(self._filled + 1, self._size)
+        self.count += 1
+        self.total_ns += value_ns
+
+    def percentile(self, q: float) -> float:
+        """Percentile in milliseconds over the current window."""
+        if not self._filled:
+            return 0.0
+        window = sorted(self._samples[:self._filled])
+        idx = min(int(q / 100 * self._filled), self._filled - 1)
+        return window[idx] / 1e6
+
+    def snapshot(self) -> Dict[str, Any]:
+        if not self._filled:
+            return {"count": self.count}
+        window = sorted(self._samples[:self._filled])
+        n = len(window)
+        return {
+            "count": self.count,
+            "mean_ms": round(sum(window) / n / 1e6, 3),
+            "p50_ms": round(window[min(n // 2, n - 1)] / 1e6, 3),
+            "p95_ms": round(window[min(int(n * 0.95), n - 1)] / 1e6, 3),
+            "p99_ms": round(window[min(int(n * 0.99), n - 1)] / 1e6, 3),
+            "max_ms": round(window[-1] / 1e6, 3),
+        }
+
+class Metrics:
+    """In-process registry of stage timers and counters."""
+
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self._histograms: Dict[str, RollingHistogram] = {}
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._started = time.time()
+
+    def observe(self, name: str, value_ns: int):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = RollingHistogram()
+            histogram.record(value_ns)
+
+    def incr(self, name: str, value: int = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    @contextmanager
+    def timer(self, name: str):
+        """Time a block with perf_counter_ns and record it under `name`."""
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter_ns() - start)
+
+    def timed(self, name: str) -> Callable:
+        """Decorator form of timer()."""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def percentile(self, name: str, q: float) -> float:
+        with self._lock:
+            histogram = self._histograms.get(name)
+            return histogram.percentile(q) if histogram else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "window": METRICS_WINDOW,
+                "uptime_seconds": round(time.time() - self._started, 1),
+                "stages": {name: h.snapshot() for name, h in sorted(self._histograms.items())},
+                "counters": dict(sorted(self._counters.items())),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+# Global metrics registry
+metrics = Metrics()
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable
+from app.utils.metrics import metrics
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it is
+    in flight wait for and share its result (or exception). Sync callers block
+    on the shared future, async callers await it without blocking the loop.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self.executed = 0
+        self.saved = 0
+
+    def _join(self, key: Hashable):
+        """Return (future, is_leader) for a key."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.saved += 1
+                metrics.incr(f"singleflight.{self.name}.saved")
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self.executed += 1
+            return future, True
+
+    def _finish(self, key: Hashable, future: Future, fn: Callable[[], Any]) -> Any:
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Run fn once for all concurrent callers using the same key."""
+        future, leader = self._join(key)
+        if leader:
+            return self._finish(key, future, fn)
+        return future.result()
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Async variant: the leader runs the blocking fn in a worker thread."""
+        future, leader = self._join(key)
+        if leader:
+            return await asyncio.to_thread(self._finish, key, future, fn)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight = len(self._calls)
+        return {"executed": self.executed, "saved": self.saved, "in_flight": in_flight}
+
+def normalize_key(text: str) -> str:
+    """Case- and whitespace-insensitive form of a prompt or query."""
+    return " ".join(text.lower().split())
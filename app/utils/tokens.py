@@ -0,0 +1,49 @@
+import json
+from typing import Any
+
+# Rough average for English text with LLaMA-style tokenizers
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate used for prompt budgeting."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def truncate_to_tokens(text: str, max_tokens: int, marker: str = "...[truncated]") -> str:
+    """Cut text to roughly max_tokens, marking that it was shortened."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    return text[:max(max_chars - len(marker), 0)] + marker
+
+def _shorten_strings(obj: Any, limit: int) -> Any:
+    if isinstance(obj, str):
+        return obj if len(obj) <= limit else obj[:limit] + "...[truncated]"
+    if isinstance(obj, dict):
+        return {key: _shorten_strings(value, limit) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_shorten_strings(value, limit) for value in obj]
+    return obj
+
+def to_jsonable(obj: Any) -> Any:
+    """Convert pydantic models (and containers of them) into plain JSON-compatible data."""
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    if isinstance(obj, dict):
+        return {key: to_jsonable(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_jsonable(value) for value in obj]
+    return obj
+
+def compact_json(obj: Any, max_tokens: int) -> str:
+    """Serialize obj as JSON within a token budget, keeping its structure.
+
+    Long string fields are shortened progressively before falling back to
+    truncating the serialized text itself.
+    """
+    data = to_jsonable(obj)
+    content = json.dumps(data, default=str)
+    limit = 2000
+    while estimate_tokens(content) > max_tokens and limit >= 50:
+        content = json.dumps(_shorten_strings(data, limit), default=str)
+        limit //= 2
+    return truncate_to_tokens(content, max_tokens)
@@ -31,4 +31,12 @@ def write_text_file(file_path: Path, content: str) -> None:
 
 def ensure_directory(path: Path) -> None:
     """Ensure a directory exists."""
-    path.mkdir(parents=True, exist_ok=True)
\ No newline at end of file
+    path.mkdir(parents=True, exist_ok=True)
+
+def write_json_atomic(file_path: Path, data: Dict[str, Any]) -> None:
+    """Write JSON via a temp file and rename so readers never see a partial file."""
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = file_path.with_name(f".{file_path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, file_path)
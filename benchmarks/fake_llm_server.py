@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Local fake of the Groq chat-completions endpoint for exercising timeouts, hedging and breakers.
+
+Point the app at it with GROQ_BASE_URL:
+
+    python benchmarks/fake_llm_server.py --port 8089 --latency-ms 200 --slow-rate 0.05 --slow-ms 5000
+    GROQ_BASE_URL=http://127.0.0.1:8089 GROQ_API_KEY=fake python benchmarks/pipeline.py ...
+
+Per-model behaviour can be degraded with --degrade-model, e.g. to trip the
+circuit breaker for the 70B model while the 8B fallback stays healthy.
+"""
+
+import argparse
+import json
+import random
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    options: argparse.Namespace = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.options.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _behaviour(self, model: str):
+        """Return (latency_seconds, error_rate) for a model."""
+        opts = self.options
+        latency = opts.latency_ms + random.uniform(0, opts.jitter_ms)
+        error_rate = opts.error_rate
+        if random.random() < opts.slow_rate:
+            latency = opts.slow_ms
+        if model in (opts.degrade_model or []):
+            latency = max(latency, opts.slow_ms)
+            error_rate = max(error_rate, opts.degraded_error_rate)
+        return latency / 1000, error_rate
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        model = request.get("model", "unknown")
+        latency, error_rate = self._behaviour(model)
+        time.sleep(latency)
+
+        if random.random() < error_rate:
+            self._send_json(503, {"error": {"message": "fake upstream overloaded", "type": "server_error"}})
+            return
+
+        prompt = request.get("messages", [{}])[-1].get("content", "") or ""
+        content = f"[fake:{model}] {prompt[:120]}"
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        if request.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for word in content.split(" "):
+                chunk = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+            return
+
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": len(prompt) // 4,
+                "completion_tokens": len(content) // 4,
+                "total_tokens": (len(prompt) + len(content)) // 4,
+            },
+        })
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Groq chat-completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="Base response latency")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="Uniform extra latency")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of requests that take --slow-ms")
+    parser.add_argument("--slow-ms", type=float, default=5000.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--degrade-model", action="append", help="Model that is always slow and error-prone")
+    parser.add_argument("--degraded-error-rate", type=float, default=0.5)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    FakeLLMHandler.options = args
+    server = ThreadingHTTPServer((args.host, args.port), FakeLLMHandler)
+    print(f"Fake LLM server listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
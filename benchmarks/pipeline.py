@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""Offline benchmark for ingest throughput, per-stage retrieval latency and recall.
+
+Generates a synthetic corpus, ingests it into a throwaway DATA_DIR, then replays a
+query set through each retrieval stage and the full answer_question pipeline with a
+local stub in place of Groq. Results are printed (or written) as JSON so runs can be
+compared:
+
+    python benchmarks/pipeline.py --docs 500 --queries 100 --output run.json
+    python benchmarks/pipeline.py --docs 500 --queries 100 --compare run.json
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import List, Dict, Any, Callable
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+TOPICS = [
+    "database", "network", "security", "python", "design", "matrix",
+    "deployment", "protocol", "music", "probability", "compiler", "storage",
+]
+
+class StubLLMClient:
+    """Stands in for the Groq client: returns a canned answer after a fixed delay."""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model: str, messages: List[Dict[str, Any]], **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        prompt = messages[-1].get("content", "") if messages else ""
+        message = SimpleNamespace(content=f"[stub:{model}] {prompt[:80]}", tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)],
+                               usage=SimpleNamespace(prompt_tokens=len(prompt) // 4, completion_tokens=16))
+
+def make_corpus(num_docs: int, words_per_doc: int, seed: int) -> List[str]:
+    """Build documents that each lean towards one topic so queries have a known answer."""
+    rng = random.Random(seed)
+    vocabulary = [f"w{i}" for i in range(5000)]
+    docs = []
+    for i in range(num_docs):
+        topic = TOPICS[i % len(TOPICS)]
+        words = rng.choices(vocabulary, k=words_per_doc)
+        for pos in rng.sample(range(words_per_doc), k=max(words_per_doc // 20, 1)):
+            words[pos] = topic
+        words[0] = f"doc{i}"
+        docs.append(" ".join(words))
+    return docs
+
+def make_queries(docs: List[str], num_queries: int, seed: int) -> List[str]:
+    rng = random.Random(seed + 1)
+    queries = []
+    for _ in range(num_queries):
+        words = rng.choice(docs).split()
+        start = rng.randrange(max(len(words) - 8, 1))
+        queries.append("what about " + " ".join(words[start:start + 8]))
+    return queries
+
+def percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    import numpy as np
+    if not samples_ms:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "mean_ms": 0.0, "n": 0}
+    arr = np.asarray(samples_ms)
+    return {
+        "p50_ms": round(float(np.percentile(arr, 50)), 3),
+        "p95_ms": round(float(np.percentile(arr, 95)), 3),
+        "p99_ms": round(float(np.percentile(arr, 99)), 3),
+        "mean_ms": round(float(arr.mean()), 3),
+        "n": len(samples_ms),
+    }
+
+def timed(fn: Callable, samples: List[float]):
+    start = time.perf_counter_ns()
+    result = fn()
+    samples.append((time.perf_counter_ns() - start) / 1e6)
+    return result
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024, 1)
+
+def run(args) -> Dict[str, Any]:
+    import numpy as np
+    import faiss
+    from app.config import (
+        CHUNK_SIZE, CHUNK_OVERLAP, CHILD_CHUNK_SIZE, SMALL_TO_BIG, VECTOR_STORAGE, INFERENCE_BACKEND
+    )
+    from app.core import llm
+    from app.core.chunking import chunk_documents
+    from app.core.components import get_embedder, get_vector_store, get_retriever, notify_index_updated
+    from app.core.context_compressor import ContextCompressor
+    from app.tools.answer import answer_question
+    from app.utils.metrics import metrics
+
+    llm._client = StubLLMClient(args.llm_latency_ms)
+
+    docs = make_corpus(args.docs, args.words_per_doc, args.seed)
+    queries = make_queries(docs, args.queries, args.seed)
+    report: Dict[str, Any] = {
+        "config": {
+            "docs": args.docs, "words_per_doc": args.words_per_doc, "queries": args.queries,
+            "k": args.k, "vector_storage": VECTOR_STORAGE, "inference_backend": INFERENCE_BACKEND,
+            "chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP,
+            "small_to_big": SMALL_TO_BIG, "child_chunk_size": CHILD_CHUNK_SIZE if SMALL_TO_BIG else 0,
+        },
+        "ingest": {},
+        "stages": {},
+    }
+
+    # Ingest: chunking, embedding and store commit measured separately, chunked as the ingest tool does
+    start = time.perf_counter()
+    chunks, metadatas = chunk_documents(docs, CHUNK_SIZE, CHUNK_OVERLAP, CHILD_CHUNK_SIZE if SMALL_TO_BIG else 0)
+    chunk_seconds = time.perf_counter() - start
+
+    embedder = get_embedder()
+    start = time.perf_counter()
+    vectors = embedder.embed_documents(chunks)
+    embed_seconds = time.perf_counter() - start
+
+    store = get_vector_store()
+    start = time.perf_counter()
+    store.add(vectors, metadatas, documents=len(docs))
+    notify_index_updated()
+    commit_seconds = time.perf_counter() - start
+
+    report["ingest"] = {
+        "chunks": len(chunks),
+        "chunks_per_s": round(len(chunks) / max(chunk_seconds, 1e-9), 1),
+        "embeddings_per_s": round(len(chunks) / max(embed_seconds, 1e-9), 1),
+        "commit_seconds": round(commit_seconds, 3),
+    }
+
+    # Per-stage retrieval latency
+    retriever = get_retriever()
+    hybrid = retriever.hybrid_search
+    # Compress from the token ids stored at ingest, as the answer path does
+    compressor = ContextCompressor(vector_store=store)
+    stage_samples: Dict[str, List[float]] = {name: [] for name in
+        ["embed_query", "bm25", "vector", "fusion", "rerank", "expand", "compress", "hybrid_search", "answer"]}
+    search_k = max(args.k * 3, 15)
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(np.ascontiguousarray(vectors, dtype="float32"))
+    recalls = []
+
+    for query in queries:
+        query_vector = timed(lambda: embedder.embed_query(query), stage_samples["embed_query"])
+        bm25_results = timed(lambda: hybrid._bm25_search(query, search_k), stage_samples["bm25"])
+        vector_results = timed(lambda: store.search_with_scores(query_vector, search_k), stage_samples["vector"])
+        fused = timed(lambda: hybrid._combine_scores(bm25_results, [(i, -d) for i, d in vector_results]),
+                      stage_samples["fusion"])
+        candidates = hybrid._candidate_docs(fused[:search_k])
+        reranked = timed(lambda: hybrid.reranker.rerank(query, candidates, args.k, query_vector=query_vector),
+                         stage_samples["rerank"])
+        # Small-to-big: child hits widened into parent windows
+        expanded = timed(lambda: retriever._expand(reranked), stage_samples["expand"])
+        timed(lambda: compressor.compress_context(query, expanded), stage_samples["compress"])
+        timed(lambda: hybrid.search(query, args.k), stage_samples["hybrid_search"])
+
+        _, truth = exact.search(np.asarray([query_vector], dtype="float32"), args.k)
+        truth_ids = {int(i) for i in truth[0] if i >= 0}
+        found = {idx for idx, _ in store.search_with_scores(query_vector, args.k)}
+        recalls.append(len(truth_ids & found) / max(len(truth_ids), 1))
+
+    for query in queries[:args.answer_queries]:
+        timed(lambda: answer_question(query), stage_samples["answer"])
+
+    report["stages"] = {name: percentiles(samples) for name, samples in stage_samples.items()}
+    report[f"recall@{args.k}"] = round(float(np.mean(recalls)), 4) if recalls else 0.0
+    report["vector_memory_mb"] = round(store.memory_bytes() / (1024 * 1024), 3)
+    report["peak_rss_mb"] = peak_rss_mb()
+    report["metrics"] = metrics.snapshot()
+    return report
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Any]:
+    """Percentage change of the headline numbers versus a previous run."""
+    def change(new, old):
+        return round((new - old) / old * 100, 1) if old else None
+
+    diff = {"ingest": {}, "stages": {}}
+    for key in ("chunks_per_s", "embeddings_per_s", "commit_seconds"):
+        if key in baseline.get("ingest", {}):
+            diff["ingest"][key + "_pct"] = change(current["ingest"][key], baseline["ingest"][key])
+    for stage, stats in current["stages"].items():
+        old = baseline.get("stages", {}).get(stage)
+        if old:
+            diff["stages"][stage] = {p + "_pct": change(stats[p], old[p]) for p in ("p50_ms", "p95_ms", "p99_ms")}
+    for key in current:
+        if key.startswith("recall@") and key in baseline:
+            diff[key + "_delta"] = round(current[key] - baseline[key], 4)
+    diff["peak_rss_mb_pct"] = change(current["peak_rss_mb"], baseline.get("peak_rss_mb", 0))
+    return diff
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingest throughput, stage latency and recall")
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--words-per-doc", type=int, default=400)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--answer-queries", type=int, default=10, help="Queries replayed through answer_question")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated stub LLM latency")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", help="Reuse a data directory instead of a temporary one")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--compare", help="Baseline JSON report to diff against")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="rag-bench-") as tmp:
+        # Must be set before app.config is imported
+        os.environ["DATA_DIR"] = args.data_dir or tmp
+        report = run(args)
+
+    if args.compare:
+        report["compare"] = compare(report, json.loads(Path(args.compare).read_text()))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    print(output)
+
+if __name__ == "__main__":
+    main()
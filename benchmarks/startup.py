@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Startup-time benchmark: importing the MCP server must stay fast and must not load heavy deps.
+
+Usage:
+    python benchmarks/startup.py [--runs 5] [--max-seconds 1.5] [--json]
+
+Exits non-zero if the median import time exceeds the budget or if a heavy
+module (torch, sentence_transformers, faiss, groq) is imported eagerly.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+HEAVY_MODULES = ["torch", "sentence_transformers", "faiss", "groq", "onnxruntime"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app.server
+elapsed = time.perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"seconds": elapsed, "heavy_modules": heavy}}))
+"""
+
+def measure_once() -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(heavy=HEAVY_MODULES)],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure app.server import time")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=1.5, help="Budget for the median import time")
+    parser.add_argument("--json", action="store_true", help="Print a machine-readable report")
+    args = parser.parse_args()
+
+    samples = [measure_once() for _ in range(args.runs)]
+    times = [s["seconds"] for s in samples]
+    heavy = sorted({m for s in samples for m in s["heavy_modules"]})
+
+    report = {
+        "benchmark": "startup",
+        "runs": args.runs,
+        "median_seconds": round(statistics.median(times), 4),
+        "max_seconds": round(max(times), 4),
+        "budget_seconds": args.max_seconds,
+        "eager_heavy_modules": heavy,
+    }
+    report["passed"] = report["median_seconds"] <= args.max_seconds and not heavy
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"app.server import: median {report['median_seconds']}s, max {report['max_seconds']}s "
+              f"(budget {args.max_seconds}s)")
+        if heavy:
+            print(f"Heavy modules imported eagerly: {', '.join(heavy)}")
+        print("PASS" if report["passed"] else "FAIL")
+
+    sys.exit(0 if report["passed"] else 1)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """RAG MCP Server - Main entry point."""
 
+import asyncio
 import sys
 import os
 from pathlib import Path
@@ -12,4 +13,4 @@ sys.path.insert(0, str(app_dir))
 from app.server import main
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())